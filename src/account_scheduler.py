@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+class _AccountState:
+    def __init__(self):
+        self.recent = deque()  # Start times of requests within the rate window
+        self.inflight = 0
+        self.cooldown_until = 0.0
+        self.consecutive_429s = 0
+        self.last_used = 0.0
+
+class AccountScheduler:
+    """
+    Chooses which Gemini account serves the next request.
+    Tracks each account's recent request rate, in-flight requests and 429s, and
+    sends each request to the valid account with the most headroom. An account
+    that was rate limited gets no traffic until its cool-down window ends; the
+    window doubles with each consecutive 429.
+    """
+
+    def __init__(self, auth_service, window_seconds: float = 60.0, requests_per_window: Optional[int] = None,
+                 base_cooldown: float = 30.0, max_cooldown: float = 300.0):
+        self.auth_service = auth_service
+        self.window_seconds = window_seconds
+        # Optional soft cap; an account at the cap is only used once the others are too
+        self.requests_per_window = requests_per_window
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._states: Dict[str, _AccountState] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, auth_service, config):
+        """Builds a scheduler using the 'api_account_*' settings from config."""
+        rpm = config.get("api_account_rpm")
+        return cls(
+            auth_service,
+            requests_per_window=int(rpm) if rpm else None,
+            base_cooldown=float(config.get("api_rate_limit_cooldown", 30.0)),
+            max_cooldown=float(config.get("api_rate_limit_max_cooldown", 300.0)),
+        )
+
+    def _state(self, email: str) -> _AccountState:
+        state = self._states.get(email)
+        if state is None:
+            state = self._states[email] = _AccountState()
+        return state
+
+    def _prune(self, state: _AccountState, now: float):
+        while state.recent and now - state.recent[0] > self.window_seconds:
+            state.recent.popleft()
+
+    def _valid_accounts(self):
+        return [acc for acc in self.auth_service.accounts if acc.get("status") == "valid"]
+
+    def has_accounts(self) -> bool:
+        return bool(self._valid_accounts())
+
+    def next_account(self, exclude: Iterable[str] = ()):
+        """
+        Returns the valid account with the most headroom, or None if every
+        candidate is cooling down. Accounts in exclude are skipped unless no
+        other account is left.
+        """
+        accounts = self._valid_accounts()
+        excluded = set(exclude)
+        candidates = [acc for acc in accounts if acc.get("email") not in excluded] or accounts
+        now = time.time()
+        with self._lock:
+            best, best_score = None, None
+            for acc in candidates:
+                state = self._state(acc.get("email") or "unknown")
+                if state.cooldown_until > now:
+                    continue
+                self._prune(state, now)
+                over_cap = self.requests_per_window is not None and len(state.recent) >= self.requests_per_window
+                # Lower is better: under the cap first, then fewest in flight,
+                # then fewest recent requests, then least recently used
+                score = (over_cap, state.inflight, len(state.recent), state.last_used)
+                if best_score is None or score < best_score:
+                    best, best_score = acc, score
+            if best is not None:
+                state = self._state(best.get("email") or "unknown")
+                state.recent.append(now)
+                state.last_used = now
+            return best
+
+    def seconds_until_available(self) -> float:
+        """Returns how long until the first cooling-down account recovers."""
+        now = time.time()
+        with self._lock:
+            waits = [
+                max(0.0, self._state(acc.get("email") or "unknown").cooldown_until - now)
+                for acc in self._valid_accounts()
+            ]
+        return min(waits) if waits else 0.0
+
+    async def acquire(self, exclude: Iterable[str] = ()):
+        """Returns the best account, waiting while every account is cooling down."""
+        while True:
+            if not self.has_accounts():
+                return None
+            account = self.next_account(exclude)
+            if account is not None:
+                return account
+            wait = self.seconds_until_available()
+            logger.warning(f"All Gemini accounts are rate limited. Waiting {wait:.0f}s for the first to recover...")
+            await asyncio.sleep(min(max(wait, 0.05), 5.0))
+
+    def request_started(self, email: str):
+        with self._lock:
+            self._state(email).inflight += 1
+
+    def request_finished(self, email: str):
+        with self._lock:
+            state = self._state(email)
+            state.inflight = max(0, state.inflight - 1)
+
+    def record_success(self, email: str):
+        with self._lock:
+            self._state(email).consecutive_429s = 0
+
+    def record_rate_limited(self, email: str, retry_after: Optional[float] = None) -> float:
+        """Starts a cool-down for the account and returns its length in seconds."""
+        with self._lock:
+            state = self._state(email)
+            if retry_after is not None:
+                cooldown = min(float(retry_after), self.max_cooldown)
+            else:
+                cooldown = min(self.base_cooldown * (2 ** state.consecutive_429s), self.max_cooldown)
+            state.consecutive_429s += 1
+            state.cooldown_until = max(state.cooldown_until, time.time() + cooldown)
+        logger.warning(f"Rate limit (429) for {email}. No traffic to it for {cooldown:.0f}s.")
+        return cooldown
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Returns the current per-account scheduling state (for status displays)."""
+        now = time.time()
+        with self._lock:
+            result = {}
+            for email, state in self._states.items():
+                self._prune(state, now)
+                result[email] = {
+                    "recent_requests": len(state.recent),
+                    "inflight": state.inflight,
+                    "cooldown_remaining": max(0.0, state.cooldown_until - now),
+                    "consecutive_429s": state.consecutive_429s,
+                }
+            return result
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+logger = logging.getLogger(__name__)
+
+class AsyncLoopRunner:
+    """
+    Runs coroutines on a single persistent event loop owned by a background thread.
+    Lets synchronous code call async APIs without paying for a new loop per call,
+    and keeps loop-bound resources (connection pools, in-flight refreshes) alive.
+    """
+
+    def __init__(self, name: str = "zaknotes-async"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Returns the runner's event loop, starting the background thread if needed."""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run_forever():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run_forever, name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedules a coroutine on the loop and returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Runs a coroutine on the loop and blocks until it finishes."""
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("AsyncLoopRunner.run() cannot block from inside its own event loop. Await the coroutine instead.")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+    def stop(self):
+        """Stops the loop and waits for the background thread to exit."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = None
+            self._thread = None
+        if loop is None or loop.is_closed():
+            return
+
+        async def shutdown():
+            await loop.shutdown_asyncgens()
+            loop.stop()
+
+        loop.call_soon_threadsafe(lambda: loop.create_task(shutdown()))
+        if thread is not None:
+            thread.join(timeout=5)
+        if not loop.is_running():
+            loop.close()
+
+
+_shared_runner: Optional[AsyncLoopRunner] = None
+_shared_runner_lock = threading.Lock()
+
+def get_shared_runner() -> AsyncLoopRunner:
+    """Returns the process-wide runner used by the synchronous API wrappers."""
+    global _shared_runner
+    with _shared_runner_lock:
+        if _shared_runner is None:
+            _shared_runner = AsyncLoopRunner()
+        return _shared_runner
@@ -2,7 +2,8 @@ import os
 import shutil
 import subprocess
 import base64
-from typing import List
+import mmap
+from typing import List, Iterator
 
 class AudioProcessor:
     @staticmethod
@@ -25,6 +26,28 @@ class AudioProcessor:
         with open(file_path, "rb") as f:
             return base64.b64encode(f.read()).decode("utf-8")
 
+    # Raw bytes encoded per block; a multiple of 3 so blocks concatenate without padding.
+    BASE64_BLOCK_SIZE = 3 * 64 * 1024
+
+    @staticmethod
+    def base64_size(raw_size: int) -> int:
+        """Returns the length of the base64 encoding of raw_size bytes."""
+        return 4 * ((raw_size + 2) // 3)
+
+    @staticmethod
+    def iter_base64_chunks(file_path: str, block_size: int = BASE64_BLOCK_SIZE) -> Iterator[bytes]:
+        """
+        Yields the base64 encoding of a file in fixed-size blocks.
+        The file is memory-mapped, so peak memory stays at about one block.
+        """
+        block_size = max(3, block_size - block_size % 3)
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset in range(0, len(mm), block_size):
+                    yield base64.b64encode(mm[offset:offset + block_size])
+
     @staticmethod
     def get_duration(file_path: str) -> float:
         """Returns the duration of the audio file in seconds."""
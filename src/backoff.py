@@ -0,0 +1,122 @@
+import asyncio
+import email.utils
+import logging
+import random
+import re
+import time
+from typing import Any, Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Error classes with their own retry policies
+RATE_LIMIT = "rate_limit"
+SERVER_ERROR = "server_error"
+TIMEOUT = "timeout"
+EMPTY_RESPONSE = "empty_response"
+
+JITTER_MODES = ("none", "full", "decorrelated")
+
+_DURATION_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)s\s*$")
+_RETRY_IN_RE = re.compile(r"retry in (\d+(?:\.\d+)?)\s*(ms|s)\b", re.IGNORECASE)
+
+def parse_retry_after(headers: Optional[Mapping[str, str]] = None, payload: Any = None) -> Optional[float]:
+    """
+    Returns the server's requested retry delay in seconds, or None if it gave none.
+    Reads the Retry-After header (seconds or HTTP date), a google.rpc.RetryInfo
+    'retryDelay' in an error payload, or a "retry in Ns" hint in its message.
+    """
+    if headers:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if isinstance(value, str) and value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                try:
+                    return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+
+    if isinstance(payload, list) and payload:
+        payload = payload[0]
+    error = payload.get("error") if isinstance(payload, dict) else None
+    if not isinstance(error, dict):
+        return None
+    for detail in error.get("details") or []:
+        if isinstance(detail, dict) and "retryDelay" in detail:
+            match = _DURATION_RE.match(str(detail["retryDelay"]))
+            if match:
+                return float(match.group(1))
+    match = _RETRY_IN_RE.search(str(error.get("message", "")))
+    if match:
+        seconds = float(match.group(1))
+        return seconds / 1000 if match.group(2).lower() == "ms" else seconds
+    return None
+
+class BackoffManager:
+    """
+    Manages exponential backoff for API retries and delays.
+
+    jitter spreads out retries from concurrent workers: "full" sleeps a random
+    time up to the exponential delay, "decorrelated" a random time between
+    initial_delay and three times the previous delay of the same retry
+    sequence (passed as previous_delay; the sleeps return it). A retry_after
+    hint from the server replaces the computed delay. policies optionally
+    overrides initial_delay, max_delay, factor or jitter per error class.
+    """
+    def __init__(self, initial_delay: float = 10.0, max_delay: float = 60.0, factor: float = 2.0,
+                 jitter: str = "none", policies: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter if jitter in JITTER_MODES else "none"
+        self.policies = policies or {}
+
+    def _setting(self, name: str, error_class: Optional[str]):
+        policy = self.policies.get(error_class) or {}
+        return policy.get(name, getattr(self, name))
+
+    def get_delay(self, attempt: int, retry_after: Optional[float] = None, error_class: Optional[str] = None,
+                  previous_delay: Optional[float] = None) -> float:
+        """Calculates the delay for a given attempt number."""
+        if retry_after is not None:
+            return max(0.0, float(retry_after))
+        initial = self._setting("initial_delay", error_class)
+        max_delay = self._setting("max_delay", error_class)
+        factor = self._setting("factor", error_class)
+        jitter = self._setting("jitter", error_class)
+
+        delay = min(initial * (factor ** attempt), max_delay)
+        if jitter == "full":
+            return random.uniform(0, delay)
+        if jitter == "decorrelated":
+            previous = previous_delay if previous_delay else initial
+            return min(max_delay, random.uniform(initial, max(initial, previous) * 3))
+        return delay
+
+    async def async_sleep(self, attempt: int, retry_after: Optional[float] = None, error_class: Optional[str] = None,
+                          previous_delay: Optional[float] = None) -> float:
+        """Asynchronously sleeps for the delay calculated for the given attempt and returns it."""
+        delay = self.get_delay(attempt, retry_after, error_class, previous_delay)
+        logger.debug(f"Async backoff sleep: {delay}s (Attempt {attempt})")
+        await asyncio.sleep(delay)
+        return delay
+
+    def sync_sleep(self, attempt: int, retry_after: Optional[float] = None, error_class: Optional[str] = None,
+                   previous_delay: Optional[float] = None) -> float:
+        """Synchronously sleeps for the delay calculated for the given attempt and returns it."""
+        delay = self.get_delay(attempt, retry_after, error_class, previous_delay)
+        logger.debug(f"Sync backoff sleep: {delay}s (Attempt {attempt})")
+        time.sleep(delay)
+        return delay
+
+    @classmethod
+    def from_config(cls, config, initial_delay: float, max_delay: float):
+        """Builds a manager with the 'api_backoff_jitter' mode and 'api_backoff_policies' from config."""
+        jitter = config.get("api_backoff_jitter", "full")
+        policies = config.get("api_backoff_policies") or {}
+        return cls(
+            initial_delay=initial_delay,
+            max_delay=max_delay,
+            jitter=jitter if isinstance(jitter, str) else "full",
+            policies=policies if isinstance(policies, dict) else {},
+        )
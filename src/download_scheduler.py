@@ -0,0 +1,129 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Per-site limits, keyed by the downloader's site profile. "connections" caps
+# the fragment connections open to that site across all its downloads.
+DEFAULT_HOST_LIMITS = {
+    "youtube": {"downloads": 1, "connections": 4},
+    "vimeo": {"downloads": 2, "connections": 16},
+    "mediadelivery": {"downloads": 2, "connections": 16},
+    "facebook": {"downloads": 2, "connections": 16},
+    "fallback": {"downloads": 2, "connections": 16},
+}
+
+class DownloadLease:
+    """A granted download slot: how many fragment connections to open and the rate cap."""
+
+    def __init__(self, host: str, connections: int, rate_limit: Optional[int]):
+        self.host = host
+        self.connections = connections
+        # Bytes per second, or None for no cap
+        self.rate_limit = rate_limit
+
+class DownloadScheduler:
+    """
+    Admits concurrent downloads within a global budget (downloads, fragment
+    connections and bandwidth) and per-host budgets (downloads and connections),
+    so a batch can fill the uplink without hammering any single CDN.
+    A download waits until its host and the global budget have room, then gets
+    as many of its requested connections as are free. With a bandwidth budget,
+    each download is capped at budget / max_downloads, so the running downloads
+    together can never exceed it.
+    """
+
+    def __init__(self, max_downloads: int = 3, max_connections: int = 32, max_bandwidth: Optional[float] = None,
+                 host_limits: Optional[Dict[str, Dict[str, int]]] = None):
+        self.max_downloads = max(1, int(max_downloads))
+        self.max_connections = max(1, int(max_connections))
+        # Bytes per second across all downloads, or None for no cap
+        self.max_bandwidth = max_bandwidth
+        self.host_limits = {host: dict(limits) for host, limits in DEFAULT_HOST_LIMITS.items()}
+        for host, limits in (host_limits or {}).items():
+            self.host_limits.setdefault(host, {}).update(limits)
+        self._active: Dict[str, Dict[str, int]] = {}
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds a scheduler using the 'download_*' settings from config."""
+        mbps = config.get("download_max_bandwidth_mbps")
+        host_limits = config.get("download_host_limits")
+        return cls(
+            max_downloads=int(config.get("download_max_concurrent", 3)),
+            max_connections=int(config.get("download_max_connections", 32)),
+            max_bandwidth=float(mbps) * 1_000_000 / 8 if mbps else None,
+            host_limits=host_limits if isinstance(host_limits, dict) else None,
+        )
+
+    def _limits(self, host: str) -> Dict[str, int]:
+        limits = self.host_limits.get(host) or self.host_limits["fallback"]
+        return {"downloads": max(1, int(limits.get("downloads", 1))), "connections": max(1, int(limits.get("connections", 1)))}
+
+    def _totals(self):
+        downloads = sum(a["downloads"] for a in self._active.values())
+        connections = sum(a["connections"] for a in self._active.values())
+        return downloads, connections
+
+    def _has_room(self, host: str) -> bool:
+        limits = self._limits(host)
+        active = self._active.get(host, {"downloads": 0, "connections": 0})
+        downloads, connections = self._totals()
+        return (downloads < self.max_downloads and connections < self.max_connections
+                and active["downloads"] < limits["downloads"] and active["connections"] < limits["connections"])
+
+    def acquire(self, host: str, requested_connections: int) -> DownloadLease:
+        """Waits for room for a download from host and reserves it."""
+        with self._cond:
+            if not self._has_room(host):
+                logger.info(f"Download for {host} queued: connection budget in use.")
+            self._cond.wait_for(lambda: self._has_room(host))
+            limits = self._limits(host)
+            active = self._active.setdefault(host, {"downloads": 0, "connections": 0})
+            _, connections = self._totals()
+            granted = max(1, min(
+                int(requested_connections),
+                self.max_connections - connections,
+                limits["connections"] - active["connections"],
+            ))
+            active["downloads"] += 1
+            active["connections"] += granted
+            rate_limit = int(self.max_bandwidth / self.max_downloads) if self.max_bandwidth else None
+            return DownloadLease(host, granted, rate_limit)
+
+    def release(self, lease: DownloadLease):
+        with self._cond:
+            active = self._active.get(lease.host)
+            if active is not None:
+                active["downloads"] = max(0, active["downloads"] - 1)
+                active["connections"] = max(0, active["connections"] - lease.connections)
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self, host: str, requested_connections: int):
+        """Context manager around acquire/release."""
+        lease = self.acquire(host, requested_connections)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the downloads and connections currently in use per host."""
+        with self._cond:
+            return {host: dict(active) for host, active in self._active.items() if active["downloads"]}
+
+
+_shared_scheduler = None
+_shared_scheduler_lock = threading.Lock()
+
+def get_download_scheduler(config) -> DownloadScheduler:
+    """Returns the process-wide download scheduler, creating it from config on first use."""
+    global _shared_scheduler
+    with _shared_scheduler_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = DownloadScheduler.from_config(config)
+        return _shared_scheduler
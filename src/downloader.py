@@ -1,10 +1,11 @@
 import os
-import subprocess
 import shlex
-import sys
 from typing import List
-from urllib.parse import urlparse
 from src.config_manager import ConfigManager
+from src.download_scheduler import get_download_scheduler
+from src.link_extractor import get_extractor_service, resolve_links
+from src.result_cache import ResultCache
+from src.ytdlp_engine import get_shared_engine
 
 # CONFIGURATION
 DOWNLOAD_DIR = "downloads"
@@ -18,9 +19,6 @@ SMART_FORMAT = "best[height=240]/best[height=360]/best[height=480]/best[height=5
 # CONCURRENCY SETTING
 CONCURRENCY = "-N 16"
 
-# Ensure we use the VENV yt-dlp
-YT_DLP_BASE = f'"{sys.executable}" -m yt_dlp'
-
 # EJS Configuration for YouTube
 EJS_ARGS = '--js-runtime node'
 
@@ -37,20 +35,132 @@ def get_cookie_path(client_id="default"):
         return DEFAULT_COOKIE
     return None
 
-def run_command(cmd_args: List[str]):
-    print(f"Executing: {' '.join(shlex.quote(arg) for arg in cmd_args)}")
-    process = subprocess.run(cmd_args, capture_output=True, text=True)
-    if process.returncode != 0:
-        print(f"❌ Error: {process.stderr}")
-        raise Exception(process.stderr)
-    return process.stdout.strip()
+def apply_download_lease(args: List[str], lease):
+    """
+    Returns args with the fragment concurrency (-N) set to the connections the
+    lease granted and, when a bandwidth budget is set, the lease's rate cap.
+    """
+    args = list(args)
+    if "-N" in args:
+        args[args.index("-N") + 1] = str(lease.connections)
+    if lease.rate_limit:
+        args = ["--limit-rate", str(lease.rate_limit)] + args
+    return args
+
+def run_ytdlp(args: List[str], profile="fallback", on_progress=None):
+    """
+    Runs yt-dlp in-process with command-line style args on the shared engine.
+    Waits for a slot from the download scheduler first; the -N value in args is
+    the most connections the download will be given.
+    """
+    requested = int(args[args.index("-N") + 1]) if "-N" in args else 1
+    with get_download_scheduler(ConfigManager()).lease(profile, requested) as lease:
+        args = apply_download_lease(args, lease)
+        print(f"Executing: yt-dlp {' '.join(shlex.quote(arg) for arg in args)}")
+        try:
+            get_shared_engine().run(args, profile, on_progress)
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            raise
+
+def get_resolved_url_cache(config):
+    """Returns the cache of page URL -> media URL resolutions, or None if disabled."""
+    return ResultCache.from_config(config, "resolved_url_cache", "cache/resolved_urls", max_size_mb=5, ttl_hours=168)
+
+def resolved_url_key(url):
+    return ResultCache.make_key("resolved_url", url)
+
+def resolve_media_url(url, cookie_file, ua, cache=None, refresh=False):
+    """
+    Returns the media URL embedded in a scraper page, using the cached resolution
+    unless refresh is set. Returns (media_url, from_cache).
+    """
+    key = resolved_url_key(url)
+    if cache is not None and not refresh:
+        cached = cache.get(key)
+        if cached:
+            return cached, True
+
+    # Runs in-process on the shared, already-warm browser
+    media_url = get_extractor_service().extract(url, cookie_file, ua)
+    if not media_url:
+        raise Exception(f"No media link found on {url}")
+    if cache is not None:
+        cache.put(key, media_url)
+    return media_url, False
+
+def is_scraper_page(url):
+    """True if download_audio has to scrape url for its media link (EdgeCourseBD pages)."""
+    return "edgecoursebd" in url and not any(x in url for x in [
+        "facebook.com", "fb.watch", "youtube.com", "youtu.be", "youtube-nocookie.com",
+        "mediadelivery.net", "player.vimeo.com",
+    ])
+
+def prefetch_media_urls(jobs, manager=None, config=None):
+    """
+    Resolves the media links of every scraper page in jobs up front, several
+    pages at a time in one browser, and stores them on the jobs as
+    'resolved_url' (and in the resolved-URL cache) so downloads do not wait on
+    a browser. Jobs that already carry a resolved_url keep it. Pages with
+    several players are left for download_audio to resolve. Returns the
+    number of jobs resolved.
+    """
+    pending = [
+        job for job in jobs
+        if is_scraper_page(job.get('url', '')) and not job.get('resolved_url')
+        and not os.path.exists(get_expected_audio_path(job))
+    ]
+    if not pending:
+        return 0
+
+    config = config or ConfigManager()
+    url_cache = get_resolved_url_cache(config)
+    resolved = {}
+    if url_cache is not None:
+        for job in pending:
+            cached = url_cache.get(resolved_url_key(job['url']))
+            if cached:
+                resolved[job['url']] = cached
+
+    to_scrape = list(dict.fromkeys(job['url'] for job in pending if job['url'] not in resolved))
+    if to_scrape:
+        concurrency = int(config.get("link_prefetch_concurrency", 4))
+        print(f"🔎 Resolving {len(to_scrape)} page links ({concurrency} at a time)...")
+        try:
+            found = resolve_links(to_scrape, get_cookie_path(), config.get("user_agent"), concurrency)
+        except Exception as e:
+            print(f"⚠️ Link pre-resolution failed ({e}). Links will be resolved during download.")
+            found = {}
+        for url, links in found.items():
+            if len(links) == 1:
+                resolved[url] = links[0]
+                if url_cache is not None:
+                    url_cache.put(resolved_url_key(url), links[0])
+
+    count = 0
+    for job in pending:
+        link = resolved.get(job['url'])
+        if not link:
+            continue
+        job['resolved_url'] = link
+        if manager is not None:
+            manager.update_job_fields(job['id'], {'resolved_url': link})
+        count += 1
+    print(f"   Resolved {count}/{len(pending)} page links.")
+    return count
 
 def get_expected_audio_path(job):
     name = job['name']
     safe_name = name.replace(" ", "_").replace("/", "-")
     return os.path.join(DOWNLOAD_DIR, f"{safe_name}.mp3")
 
-def download_audio(job):
+def download_audio(job, on_progress=None):
+    """
+    Downloads a job's audio as MP3 into DOWNLOAD_DIR and returns its path.
+    on_progress, if given, receives yt-dlp progress dicts (status, downloaded_bytes,
+    total_bytes, speed, eta, ...). If a pre-resolved 'resolved_url' turns out to
+    be stale, it is replaced on the job (or removed if re-resolving fails).
+    """
     url = job['url']
     name = job['name']
     
@@ -65,10 +175,6 @@ def download_audio(job):
 
     print(f"\n⬇️  Starting Download: {name}")
     
-    # Base command as a list
-    # Use sys.executable -m yt_dlp to ensure we use the venv's version
-    base_cmd = [sys.executable, "-m", "yt_dlp"]
-    
     common_args = [
         "--js-runtime", "node",
         "--no-cache-dir",
@@ -88,49 +194,49 @@ def download_audio(job):
     # 1. FACEBOOK
     if any(x in url for x in ["facebook.com", "fb.watch"]):
         print(">> Mode: Facebook")
-        cmd = base_cmd + ["-N", "16", "--no-part", "--no-keep-fragments"] + common_args + [
+        cmd = ["-N", "16", "--no-part", "--no-keep-fragments"] + common_args + [
             "-x", "--audio-format", "mp3", url
         ]
-        run_command(cmd)
+        run_ytdlp(cmd, "facebook", on_progress)
         match_found = True
 
     # 2. YOUTUBE
     elif any(x in url for x in ["youtube.com", "youtu.be", "youtube-nocookie.com"]):
         print(">> Mode: YouTube")
-        cmd = base_cmd + ["-N", "4"] + common_args + [
+        cmd = ["-N", "4"] + common_args + [
             "--extract-audio", "--audio-format", "mp3", "--audio-quality", "0", # 0 is best
             "--continue",
             "--add-header", "Referer: https://www.youtube.com/",
             "--add-header", f"User-Agent: {ua}",
             url
         ]
-        run_command(cmd)
+        run_ytdlp(cmd, "youtube", on_progress)
         match_found = True
 
     # 3. MEDIADELIVERY (Apar's Classroom)
     elif "mediadelivery.net" in url:
         print(">> Mode: MediaDelivery")
-        cmd = base_cmd + ["-N", "16", "--no-part", "--no-keep-fragments", "--no-playlist"] + common_args + [
+        cmd = ["-N", "16", "--no-part", "--no-keep-fragments", "--no-playlist"] + common_args + [
             "-x", "--audio-format", "mp3",
             "--add-header", "Referer: https://academic.aparsclassroom.com/",
             "--add-header", "Origin: https://academic.aparsclassroom.com",
             "--add-header", f"User-Agent: {ua}",
             url
         ]
-        run_command(cmd)
+        run_ytdlp(cmd, "mediadelivery", on_progress)
         match_found = True
 
     # 3. Vimeo (EdgeCourseBD vimeo_url directly)
     elif "player.vimeo.com" in url:
         print(">> Mode: Vimeo Url (Direct)")
-        cmd = base_cmd + ["-N", "16", "--no-part", "--no-keep-fragments", "--no-playlist"] + common_args + [
+        cmd = ["-N", "16", "--no-part", "--no-keep-fragments", "--no-playlist"] + common_args + [
             "-x", "--audio-format", "mp3",
             "--add-header", "Referer: https://edgecoursebd.com/",
             "--add-header", "Origin: https://edgecoursebd.com/",
             "--add-header", f"User-Agent: {ua}",
             url
         ]
-        run_command(cmd)
+        run_ytdlp(cmd, "vimeo", on_progress)
         match_found = True
 
 
@@ -138,30 +244,44 @@ def download_audio(job):
     elif "edgecoursebd" in url:
         print(">> Mode: EdgeCourseBD (Running Scraper...)")
         
-        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "link_extractor.py")
-        scraper_cmd = [sys.executable, script_path, "--url", url]
-        if cookie_file:
-            scraper_cmd.extend(["--cookies", cookie_file])
-        if ua:
-            scraper_cmd.extend(["--user-agent", ua])
-            
+        url_cache = get_resolved_url_cache(config)
         try:
-            vimeo_url = run_command(scraper_cmd)
-            print(f"   Found Vimeo URL: {vimeo_url}")
-            
-            cmd = base_cmd + ["-N", "16", "--no-part", "--no-keep-fragments", "--downloader", "ffmpeg", "--hls-use-mpegts", "--referer", url] + common_args + [
-                "-x", "--audio-format", "mp3", vimeo_url
-            ]
-            run_command(cmd)
-            match_found = True
+            if job.get('resolved_url'):
+                # Pre-resolved for the whole batch by prefetch_media_urls
+                vimeo_url, from_cache = job['resolved_url'], True
+            else:
+                vimeo_url, from_cache = resolve_media_url(url, cookie_file, ua, url_cache)
+            print(f"   Found Vimeo URL: {vimeo_url}" + (" (cached)" if from_cache else ""))
         except Exception as e:
             print(f"❌ Scraper failed: {e}")
             raise e
 
+        def edge_cmd(media_url):
+            return ["-N", "16", "--no-part", "--no-keep-fragments", "--downloader", "ffmpeg", "--hls-use-mpegts", "--referer", url] + common_args + [
+                "-x", "--audio-format", "mp3", media_url
+            ]
+
+        while True:
+            try:
+                run_ytdlp(edge_cmd(vimeo_url), "vimeo", on_progress)
+                break
+            except Exception:
+                # The resolution may be stale: drop it so retries resolve the page again
+                if url_cache is not None:
+                    url_cache.invalidate(resolved_url_key(url))
+                if not from_cache:
+                    raise
+                print("   Cached Vimeo URL failed. Re-running scraper...")
+                job.pop('resolved_url', None)
+                vimeo_url, from_cache = resolve_media_url(url, cookie_file, ua, url_cache, refresh=True)
+                # The caller persists the change, so later retries skip the dead URL
+                job['resolved_url'] = vimeo_url
+        match_found = True
+
     # 5. FALLBACK
     if not match_found:
         print(">> Mode: Default/Fallback")
-        cmd = base_cmd + ["-N", "16"] + common_args + [
+        cmd = ["-N", "16"] + common_args + [
             "--extract-audio", "--audio-format", "mp3", "--audio-quality", "5",
             "--continue",
             "--add-header", "Referer: https://www.youtube.com/",
@@ -169,7 +289,7 @@ def download_audio(job):
             url
         ]
         try:
-            run_command(cmd)
+            run_ytdlp(cmd, "fallback", on_progress)
         except Exception as e:
             print(f"❌ Fallback download failed: {e}")
             raise e
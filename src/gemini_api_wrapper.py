@@ -4,39 +4,23 @@ import logging
 import json
 import os
 import asyncio
-from typing import Optional, List, Dict, Any
+import threading
+import weakref
+from typing import Optional, List, Dict, Any, Callable, Iterable, AsyncIterator, Tuple
 from src.gemini_auth_service import GeminiAuthService, GeminiCliAuthRecord
-from src.usage_tracker import UsageTracker
+from src.usage_tracker import get_shared_tracker
 from src.audio_processor import AudioProcessor
+from src.async_runner import AsyncLoopRunner, get_shared_runner
+from src.account_scheduler import AccountScheduler
+from src.rate_limiter import RateLimiter
+from src.backoff import BackoffManager, parse_retry_after, SERVER_ERROR, TIMEOUT, EMPTY_RESPONSE
 
 logger = logging.getLogger(__name__)
 
-class BackoffManager:
-    """Manages exponential backoff for API retries and delays."""
-    def __init__(self, initial_delay: float = 10.0, max_delay: float = 60.0, factor: float = 2.0):
-        self.initial_delay = initial_delay
-        self.max_delay = max_delay
-        self.factor = factor
-
-    def get_delay(self, attempt: int) -> float:
-        """Calculates the delay for a given attempt number."""
-        delay = self.initial_delay * (self.factor ** attempt)
-        return min(delay, self.max_delay)
-
-    async def async_sleep(self, attempt: int):
-        """Asynchronously sleeps for the delay calculated for the given attempt."""
-        delay = self.get_delay(attempt)
-        logger.debug(f"Async backoff sleep: {delay}s (Attempt {attempt})")
-        await asyncio.sleep(delay)
-
-    def sync_sleep(self, attempt: int):
-        """Synchronously sleeps for the delay calculated for the given attempt."""
-        delay = self.get_delay(attempt)
-        logger.debug(f"Sync backoff sleep: {delay}s (Attempt {attempt})")
-        time.sleep(delay)
-
 class GeminiAPIWrapper:
     CODE_ASSIST_ENDPOINT = "https://cloudcode-pa.googleapis.com"
+    # Connection pool settings for the shared HTTP client
+    POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120.0)
     GEMINI_CLI_HEADERS = {
         "User-Agent": "google-cloud-sdk vscode_cloudshelleditor/0.1",
         "X-Goog-Api-Client": "gl-node/22.17.0",
@@ -47,23 +31,90 @@ class GeminiAPIWrapper:
         }),
     }
 
-    def __init__(self, config=None, auth_service=None, usage_tracker=None):
+    def __init__(self, config=None, auth_service=None, usage_tracker=None, runner: Optional[AsyncLoopRunner] = None):
         from src.config_manager import ConfigManager
         self.config = config or ConfigManager()
         self.auth_service = auth_service or GeminiAuthService()
-        self.usage_tracker = usage_tracker or UsageTracker()
+        self.usage_tracker = usage_tracker or get_shared_tracker()
+        # Persistent loop backing the synchronous wrappers
+        self.runner = runner or get_shared_runner()
         
         self.api_timeout = self.config.get("api_timeout", 300)
         self.api_max_retries = self.config.get("api_max_retries", 3)
         self.api_retry_delay = self.config.get("api_retry_delay", 10)
         
-        self.backoff_manager = BackoffManager(
+        self.backoff_manager = BackoffManager.from_config(
+            self.config,
             initial_delay=float(self.api_retry_delay),
             max_delay=float(self.config.get("api_max_delay", 60.0))
         )
         
         self.error_file = "error.json"
 
+        # Picks the account with the most headroom and keeps rate-limited ones idle
+        self.scheduler = AccountScheduler.from_config(self.auth_service, self.config)
+        # Paces sends to each account's per-model RPM/TPM quota (off unless configured)
+        self.rate_limiter = RateLimiter.from_config(self.config)
+
+        # Per-account cap on concurrent requests. Slots are thread-safe so
+        # callers on different threads/event loops share the same limit.
+        self.max_inflight_per_account = max(1, int(self.config.get("api_max_inflight_per_account", 2)))
+        self._account_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._account_slots_lock = threading.Lock()
+
+        # One pooled client per event loop (httpx connections are loop-bound).
+        # The auth service borrows the same pool for token refreshes.
+        self._clients = weakref.WeakKeyDictionary()
+        self._clients_lock = threading.Lock()
+        self.auth_service.client_provider = self.get_client
+
+    def _use_http2(self) -> bool:
+        if not self.config.get("api_http2", True):
+            return False
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.debug("HTTP/2 requested but 'h2' is not installed. Falling back to HTTP/1.1.")
+            return False
+        return True
+
+    def get_client(self) -> httpx.AsyncClient:
+        """Returns the pooled client for the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            client = self._clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    timeout=self.api_timeout,
+                    limits=self.POOL_LIMITS,
+                    http2=self._use_http2(),
+                )
+                self._clients[loop] = client
+            return client
+
+    async def aclose(self):
+        """Closes the pooled client bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            client = self._clients.pop(loop, None)
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+    def _get_account_slot(self, email: str) -> threading.BoundedSemaphore:
+        with self._account_slots_lock:
+            slot = self._account_slots.get(email)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.max_inflight_per_account)
+                self._account_slots[email] = slot
+            return slot
+
+    async def _acquire_account_slot(self, email: str) -> threading.BoundedSemaphore:
+        """Waits until the account has a free in-flight slot and takes it."""
+        slot = self._get_account_slot(email)
+        while not slot.acquire(blocking=False):
+            await asyncio.sleep(0.05)
+        return slot
+
     def _log_error(self, request_body: Any, response_data: Any):
         """Logs the full request and response to error.json with truncation for large data."""
         
@@ -101,19 +152,98 @@ class GeminiAPIWrapper:
         with open(self.error_file, 'w') as f:
             json.dump(errors, f, indent=4)
 
-    async def generate_content_async(self, prompt: str, audio_base64: Optional[str] = None, model_type: str = "note", system_instruction: Optional[str] = None) -> str:
+    @staticmethod
+    def _parse_sse_line(line) -> Optional[Dict[str, Any]]:
+        """Parses one SSE line, returning the JSON payload of a 'data:' line or None."""
+        # Ensure line is a string for startswith and slicing
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.startswith("data:"):
+            return None
+        json_str = line[5:].strip()
+        if not json_str:
+            return None
+        try:
+            return json.loads(json_str)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _extract_text_parts(chunk: Dict[str, Any]) -> Iterable[str]:
+        """Yields the text parts of the first candidate in a streamed response chunk."""
+        candidates = chunk.get("response", {}).get("candidates", [])
+        if candidates:
+            for p in candidates[0].get("content", {}).get("parts", []):
+                if "text" in p:
+                    yield p["text"]
+
+    def model_for(self, model_type: str) -> str:
+        """Returns the configured model name for a request type ('note' or 'transcription')."""
         # Map 'note' to 'note_generation' to match config key
         config_prefix = "note_generation" if model_type == "note" else model_type
-        model_name = self.config.get(f"{config_prefix}_model") or "gemini-2.0-flash"
+        return self.config.get(f"{config_prefix}_model") or "gemini-2.0-flash"
+
+    @staticmethod
+    def _estimate_tokens(prompt: str, system_instruction: Optional[str], audio_base64: Optional[str], audio_size: Optional[int]) -> int:
+        """Estimates a request's prompt tokens for the rate limiter."""
+        audio_bytes = 0
+        if audio_size is not None:
+            audio_bytes = audio_size
+        elif audio_base64:
+            audio_bytes = len(audio_base64) * 3 // 4
+        return RateLimiter.estimate_tokens(len(prompt or "") + len(system_instruction or ""), audio_bytes)
+
+    # Stands in for the audio data in the JSON envelope until it is streamed
+    AUDIO_PLACEHOLDER = "__zaknotes_audio_data__"
+
+    def _build_streaming_body(self, request_body: Dict[str, Any], audio_path: str, audio_size: int) -> Tuple[Callable[[], AsyncIterator[bytes]], int]:
+        """
+        Serializes request_body around the placeholder and returns a factory for an
+        async byte stream that base64-encodes audio_path (audio_size bytes) in
+        blocks, plus its length. A new stream is needed for every attempt.
+        """
+        envelope = json.dumps(request_body).encode("utf-8")
+        prefix, suffix = envelope.split(json.dumps(self.AUDIO_PLACEHOLDER).encode("utf-8"), 1)
+        prefix += b'"'
+        suffix = b'"' + suffix
+        length = len(prefix) + AudioProcessor.base64_size(audio_size) + len(suffix)
+
+        async def body() -> AsyncIterator[bytes]:
+            yield prefix
+            for block in AudioProcessor.iter_base64_chunks(audio_path):
+                yield block
+            yield suffix
+
+        return body, length
+
+    async def generate_content_async(self, prompt: str, audio_base64: Optional[str] = None, model_type: str = "note", system_instruction: Optional[str] = None, on_text: Optional[Callable[[Optional[str]], None]] = None, audio_path: Optional[str] = None) -> str:
+        """
+        Streams a generateContent call and returns the full response text.
+        If on_text is given it is called with each text delta as it arrives, and
+        with None when a partially streamed attempt is discarded for a retry.
+        Audio passed as audio_path is base64-encoded into the request stream block
+        by block instead of being held in memory.
+        """
+        model_name = self.model_for(model_type)
+
+        audio_size = None
+        if audio_path:
+            # A missing file fails every attempt on every account; report it right away
+            audio_size = os.path.getsize(audio_path)
         
         max_accounts_to_try = len(self.auth_service.accounts) or 1
         accounts_tried = 0
+        # Accounts that already failed this request; the scheduler prefers the others
+        failed_accounts = set()
+        # Last backoff sleep of this request, for decorrelated jitter
+        last_delay = None
         
         while accounts_tried < max_accounts_to_try:
             accounts_tried += 1
-            auth_record = self.auth_service.get_next_account()
+            auth_record = await self.scheduler.acquire(exclude=failed_accounts)
             if not auth_record:
                 raise Exception("No Gemini CLI accounts configured. Please add an account first.")
+            failed_accounts.add(auth_record.get("email"))
             
             # Ensure token is valid
             try:
@@ -124,7 +254,9 @@ class GeminiAPIWrapper:
 
             # Prepare parts
             parts = []
-            if audio_base64:
+            if audio_path:
+                parts.append({"inline_data": {"mime_type": "audio/mp3", "data": self.AUDIO_PLACEHOLDER}})
+            elif audio_base64:
                 parts.append({"inline_data": {"mime_type": "audio/mp3", "data": audio_base64}})
             parts.append({"text": prompt})
 
@@ -150,108 +282,156 @@ class GeminiAPIWrapper:
                     "parts": [{"text": system_instruction}]
                 }
 
+            body_factory = None
+            if audio_path:
+                body_factory, body_length = self._build_streaming_body(request_body, audio_path, audio_size)
+                request_bytes = body_length
+            else:
+                request_bytes = len(json.dumps(request_body).encode("utf-8"))
+            estimated_tokens = self._estimate_tokens(prompt, system_instruction, audio_base64, audio_size)
+
+            account_email = auth_record["email"] or "unknown"
             for attempt in range(self.api_max_retries + 1):
-                logger.info(f"Gemini API Request - Account: {auth_record['email']}, Type: {model_type}, Model: {model_name} (Attempt: {attempt + 1})")
-                
-                start_time = time.time()
+                await self.rate_limiter.acquire(account_email, model_name, estimated_tokens)
+                slot = await self._acquire_account_slot(account_email)
+                self.scheduler.request_started(account_email)
+                # Backoff to sleep before the next attempt; the slot is released first
+                backoff = None
                 try:
-                    async with httpx.AsyncClient(timeout=self.api_timeout) as client:
-                        resp = await client.post(
+                    logger.info(f"Gemini API Request - Account: {auth_record['email']}, Type: {model_type}, Model: {model_name} (Attempt: {attempt + 1})")
+                
+                    start_time = time.time()
+                    try:
+                        headers = {
+                            "Authorization": f"Bearer {auth_record['access']}",
+                            "Content-Type": "application/json",
+                            "Accept": "text/event-stream",
+                            **self.GEMINI_CLI_HEADERS,
+                        }
+                        if body_factory:
+                            headers["Content-Length"] = str(body_length)
+                            body_kwargs = {"content": body_factory()}
+                        else:
+                            body_kwargs = {"json": request_body}
+
+                        client = self.get_client()
+                        async with client.stream(
+                            "POST",
                             f"{self.CODE_ASSIST_ENDPOINT}/v1internal:streamGenerateContent?alt=sse",
-                            headers={
-                                "Authorization": f"Bearer {auth_record['access']}",
-                                "Content-Type": "application/json",
-                                "Accept": "text/event-stream",
-                                **self.GEMINI_CLI_HEADERS,
-                            },
-                            json=request_body
-                        )
+                            headers=headers,
+                            **body_kwargs
+                        ) as resp:
+                            ttfb = time.time() - start_time
 
-                        if resp.status_code != 200:
-                            error_payload = resp.text
-                            try:
-                                error_payload = resp.json()
-                            except: pass
-                            
-                            self._log_error(request_body, error_payload)
-                            logger.error(f"Gemini API Error ({resp.status_code}) for {auth_record['email']}")
-                            
-                            if resp.status_code == 429:
-                                backoff_429 = BackoffManager(initial_delay=30, max_delay=300)
-                                logger.warning(f"Rate limit (429) for {auth_record['email']}. Waiting and retrying indefinitely...")
-                                await backoff_429.async_sleep(attempt)
-                                accounts_tried = 0 # Reset safety to allow indefinite retries
-                                break # Move to next account (or same if only one)
-                            
-                            if resp.status_code in [401, 403]:
-                                break # Move to next account
-                            
-                            if resp.status_code == 503:
-                                logger.warning("Service Unavailable (503). Retrying...")
-                                await self.backoff_manager.async_sleep(attempt)
-                                continue
-                            
-                            raise Exception(f"API Error {resp.status_code}: {resp.text}")
-
-                        # Process SSE stream
-                        full_text = ""
-                        for line in resp.iter_lines():
-                            # Ensure line is a string for startswith and slicing
-                            if isinstance(line, bytes):
-                                line = line.decode('utf-8')
-                                
-                            if line.startswith("data:"):
-                                json_str = line[5:].strip()
-                                if not json_str: continue
+                            if resp.status_code != 200:
+                                await resp.aread()
+                                error_payload = resp.text
                                 try:
-                                    chunk = json.loads(json_str)
-                                    candidates = chunk.get("response", {}).get("candidates", [])
-                                    if candidates:
-                                        parts_resp = candidates[0].get("content", {}).get("parts", [])
-                                        for p in parts_resp:
-                                            if "text" in p:
-                                                full_text += p["text"]
-                                except Exception:
+                                    error_payload = resp.json()
+                                except: pass
+                        
+                                self._log_error(request_body, error_payload)
+                                logger.error(f"Gemini API Error ({resp.status_code}) for {auth_record['email']}")
+                        
+                                retry_after = parse_retry_after(resp.headers, error_payload)
+
+                                if resp.status_code == 429:
+                                    # Cool the account down (for as long as the server asks, if it
+                                    # says) and move on; the scheduler only waits if every account
+                                    # is rate limited
+                                    self.scheduler.record_rate_limited(account_email, retry_after)
+                                    failed_accounts.discard(account_email)
+                                    accounts_tried = 0 # Reset safety to allow indefinite retries
+                                    break # Move to next account (or same if only one)
+                        
+                                if resp.status_code in [401, 403]:
+                                    break # Move to next account
+                        
+                                if resp.status_code == 503:
+                                    logger.warning("Service Unavailable (503). Retrying...")
+                                    backoff = (attempt, retry_after, SERVER_ERROR)
                                     continue
+                        
+                                raise Exception(f"API Error {resp.status_code}: {resp.text}")
+
+                            # Process SSE stream incrementally as lines arrive
+                            text_parts = []
+                            streamed_any = False
+                            usage_metadata = None
+                            async for line in resp.aiter_lines():
+                                chunk = self._parse_sse_line(line)
+                                if chunk is None:
+                                    continue
+                                # Token counts are cumulative; the last chunk carries the totals
+                                usage_metadata = chunk.get("response", {}).get("usageMetadata") or usage_metadata
+                                for text in self._extract_text_parts(chunk):
+                                    text_parts.append(text)
+                                    if on_text is not None:
+                                        on_text(text)
+                                        streamed_any = True
+                            full_text = "".join(text_parts)
 
                         duration = time.time() - start_time
                         logger.info(f"Gemini API Response - Success - Duration: {duration:.2f}s")
-                        
+                    
                         # Record usage
+                        self.scheduler.record_success(account_email)
+                        self.rate_limiter.settle(
+                            account_email, model_name, estimated_tokens,
+                            (usage_metadata or {}).get("totalTokenCount")
+                        )
                         self.usage_tracker.record_usage(auth_record["email"] or "unknown", model_name)
-                        
+                        self.usage_tracker.record_call(
+                            auth_record["email"] or "unknown", model_name, duration,
+                            ttfb=ttfb, request_bytes=request_bytes, usage_metadata=usage_metadata
+                        )
+                    
                         if not full_text.strip():
                             logger.warning(f"Empty/whitespace response from Gemini for {auth_record['email']}. Retrying indefinitely...")
-                            await self.backoff_manager.async_sleep(attempt)
+                            if streamed_any:
+                                on_text(None)
+                            backoff = (attempt, None, EMPTY_RESPONSE)
                             # Reset safety to allow indefinite retries for this specific issue
                             accounts_tried = 0
                             continue # Retry current account/request
-                            
+                        
                         return full_text
 
-                except httpx.TimeoutException:
-                    logger.warning(f"Gemini API Timeout (Attempt {attempt+1})")
-                    if attempt >= self.api_max_retries:
-                        break # Try next account
-                    await self.backoff_manager.async_sleep(attempt)
-                except Exception as e:
-                    logger.error(f"Gemini API Exception ({type(e).__name__}): {e}")
-                    self._log_error(request_body, f"{type(e).__name__}: {str(e)}")
-                    if attempt >= self.api_max_retries:
-                        break # Try next account
-                    await self.backoff_manager.async_sleep(attempt)
+                    except httpx.TimeoutException:
+                        logger.warning(f"Gemini API Timeout (Attempt {attempt+1})")
+                        if on_text is not None:
+                            on_text(None)
+                        if attempt >= self.api_max_retries:
+                            break # Try next account
+                        backoff = (attempt, None, TIMEOUT)
+                    except Exception as e:
+                        logger.error(f"Gemini API Exception ({type(e).__name__}): {e}")
+                        self._log_error(request_body, f"{type(e).__name__}: {str(e)}")
+                        if on_text is not None:
+                            on_text(None)
+                        if attempt >= self.api_max_retries:
+                            break # Try next account
+                        backoff = (attempt, None, None)
+                finally:
+                    # Free the slot while backing off, so waiting requests can use the account
+                    self.scheduler.request_finished(account_email)
+                    slot.release()
+                    if backoff is not None:
+                        last_delay = await self.backoff_manager.async_sleep(*backoff, previous_delay=last_delay)
 
         raise Exception("All configured Gemini CLI accounts failed or were skipped.")
 
-    # Synchronous wrappers for existing pipeline
-    def generate_content(self, prompt, model_type="note", system_instruction=None):
-        import asyncio
-        return asyncio.run(self.generate_content_async(prompt, model_type=model_type, system_instruction=system_instruction))
+    # Synchronous wrappers for existing pipeline.
+    # All calls run on one persistent loop, so the pooled client survives across calls.
+    def generate_content(self, prompt, model_type="note", system_instruction=None, on_text=None):
+        return self.runner.run(self.generate_content_async(prompt, model_type=model_type, system_instruction=system_instruction, on_text=on_text))
+
+    def generate_content_with_file(self, file_path, prompt, model_type="transcription", system_instruction=None, on_text=None):
+        return self.runner.run(self.generate_content_async(prompt, audio_path=file_path, model_type=model_type, system_instruction=system_instruction, on_text=on_text))
 
-    def generate_content_with_file(self, file_path, prompt, model_type="transcription", system_instruction=None):
-        import asyncio
-        audio_base64 = AudioProcessor.encode_to_base64(file_path)
-        return asyncio.run(self.generate_content_async(prompt, audio_base64=audio_base64, model_type=model_type, system_instruction=system_instruction))
+    def close(self):
+        """Closes the pooled client held on the persistent loop."""
+        self.runner.run(self.aclose())
 
     def _wait_for_file_active(self, client, file_obj):
         """Waits for the uploaded file to be in ACTIVE state."""
@@ -5,8 +5,11 @@ import hashlib
 import base64
 import secrets
 import logging
+import asyncio
 import httpx
-from typing import Optional, Dict, List, TypedDict
+import weakref
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, List, TypedDict, Callable
 from urllib.parse import urlencode, urlparse, parse_qs
 
 logger = logging.getLogger(__name__)
@@ -27,6 +30,9 @@ class GeminiAuthService:
     USERINFO_URL = "https://www.googleapis.com/oauth2/v1/userinfo?alt=json"
     CODE_ASSIST_ENDPOINT = "https://cloudcode-pa.googleapis.com"
     REDIRECT_URI = "http://localhost:8085/oauth2callback"
+    REQUEST_TIMEOUT = 30.0
+    # Tokens this close to expiry are refreshed in the background while still in use
+    PREEMPTIVE_REFRESH_SECONDS = 120
     SCOPES = [
         "https://www.googleapis.com/auth/cloud-platform",
         "https://www.googleapis.com/auth/userinfo.email",
@@ -37,6 +43,22 @@ class GeminiAuthService:
         self.auth_file = auth_file
         self.accounts: List[GeminiCliAuthRecord] = self._load_accounts()
         self.current_index = 0
+        # Optional callable returning a shared, pooled httpx.AsyncClient.
+        # Set by GeminiAPIWrapper so refreshes reuse its connection pool.
+        self.client_provider: Optional[Callable[[], httpx.AsyncClient]] = None
+        # In-flight refresh task per event loop and account, so concurrent callers share one refresh
+        self._refreshes = weakref.WeakKeyDictionary()
+        # Pending pre-emptive refresh timer per event loop and account
+        self._refresh_timers = weakref.WeakKeyDictionary()
+
+    @asynccontextmanager
+    async def _http_client(self):
+        """Yields the shared pooled client if one is attached, otherwise a short-lived client."""
+        if self.client_provider is not None:
+            yield self.client_provider()
+        else:
+            async with httpx.AsyncClient() as client:
+                yield client
 
     def _load_accounts(self) -> List[GeminiCliAuthRecord]:
         if not os.path.exists(self.auth_file):
@@ -87,8 +109,8 @@ class GeminiAuthService:
         if client_secret:
             data["client_secret"] = client_secret
 
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(self.TOKEN_URL, data=data)
+        async with self._http_client() as client:
+            resp = await client.post(self.TOKEN_URL, data=data, timeout=self.REQUEST_TIMEOUT)
             if resp.status_code != 200:
                 raise Exception(f"Token exchange failed: {resp.text}")
             
@@ -139,8 +161,8 @@ class GeminiAuthService:
         if record["clientSecret"]:
             data["client_secret"] = record["clientSecret"]
 
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(self.TOKEN_URL, data=data)
+        async with self._http_client() as client:
+            resp = await client.post(self.TOKEN_URL, data=data, timeout=self.REQUEST_TIMEOUT)
             if resp.status_code != 200:
                 record["status"] = "invalid"
                 self._save_accounts()
@@ -160,8 +182,8 @@ class GeminiAuthService:
 
     async def _get_user_email(self, access_token: str) -> Optional[str]:
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(self.USERINFO_URL, headers={"Authorization": f"Bearer {access_token}"})
+            async with self._http_client() as client:
+                resp = await client.get(self.USERINFO_URL, headers={"Authorization": f"Bearer {access_token}"}, timeout=self.REQUEST_TIMEOUT)
                 if resp.status_code == 200:
                     return resp.json().get("email")
         except Exception:
@@ -188,8 +210,8 @@ class GeminiAuthService:
             },
         }
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.post(f"{self.CODE_ASSIST_ENDPOINT}/v1internal:loadCodeAssist", headers=headers, json=load_body)
+        async with self._http_client() as client:
+            resp = await client.post(f"{self.CODE_ASSIST_ENDPOINT}/v1internal:loadCodeAssist", headers=headers, json=load_body, timeout=self.REQUEST_TIMEOUT)
             
             data = {}
             if resp.status_code != 200:
@@ -227,7 +249,7 @@ class GeminiAuthService:
                 onboard_body["cloudaicompanionProject"] = env_project
                 onboard_body["metadata"]["duetProject"] = env_project
 
-            onboard_resp = await client.post(f"{self.CODE_ASSIST_ENDPOINT}/v1internal:onboardUser", headers=headers, json=onboard_body)
+            onboard_resp = await client.post(f"{self.CODE_ASSIST_ENDPOINT}/v1internal:onboardUser", headers=headers, json=onboard_body, timeout=self.REQUEST_TIMEOUT)
             if onboard_resp.status_code != 200:
                 raise Exception(f"onboardUser failed: {onboard_resp.status_code} {onboard_resp.text}")
             
@@ -244,10 +266,10 @@ class GeminiAuthService:
         raise Exception("Could not discover or provision a Google Cloud project. Set GOOGLE_CLOUD_PROJECT.")
 
     async def _poll_operation(self, op_name: str, headers: dict) -> dict:
-        async with httpx.AsyncClient() as client:
+        async with self._http_client() as client:
             for _ in range(24):
                 await asyncio.sleep(5)
-                resp = await client.get(f"{self.CODE_ASSIST_ENDPOINT}/v1internal/{op_name}", headers=headers)
+                resp = await client.get(f"{self.CODE_ASSIST_ENDPOINT}/v1internal/{op_name}", headers=headers, timeout=self.REQUEST_TIMEOUT)
                 if resp.status_code != 200:
                     continue
                 data = resp.json()
@@ -264,9 +286,66 @@ class GeminiAuthService:
         self.current_index += 1
         return acc
 
+    @staticmethod
+    def _account_key(record: GeminiCliAuthRecord) -> str:
+        return record.get("email") or record.get("refresh") or ""
+
+    def _refresh_once(self, record: GeminiCliAuthRecord) -> "asyncio.Task":
+        """Returns the account's in-flight refresh task, starting one if none is running."""
+        loop = asyncio.get_running_loop()
+        tasks = self._refreshes.setdefault(loop, {})
+        key = self._account_key(record)
+        task = tasks.get(key)
+        if task is None:
+            logger.info(f"Refreshing token for {record.get('email')}")
+            task = loop.create_task(self.refresh_token(record))
+            tasks[key] = task
+
+            def done(t):
+                tasks.pop(key, None)
+                if not t.cancelled() and t.exception() is None:
+                    self._schedule_preemptive_refresh(record)
+
+            task.add_done_callback(done)
+        return task
+
+    def _schedule_preemptive_refresh(self, record: GeminiCliAuthRecord):
+        """Arranges for the token to be refreshed in the background shortly before it expires."""
+        loop = asyncio.get_running_loop()
+        timers = self._refresh_timers.setdefault(loop, {})
+        key = self._account_key(record)
+        if key in timers:
+            timers.pop(key).cancel()
+        delay = record["expires"] / 1000 - time.time() - self.PREEMPTIVE_REFRESH_SECONDS
+        timers[key] = loop.call_later(max(delay, 0), self._refresh_in_background, record)
+
+    def _refresh_in_background(self, record: GeminiCliAuthRecord):
+        self._refresh_timers.get(asyncio.get_running_loop(), {}).pop(self._account_key(record), None)
+        if record.get("status") != "valid":
+            return
+        task = self._refresh_once(record)
+
+        def log_failure(t):
+            if not t.cancelled() and t.exception() is not None:
+                logger.warning(f"Background token refresh failed for {record.get('email')}: {t.exception()}")
+
+        task.add_done_callback(log_failure)
+
     async def get_valid_account(self, record: GeminiCliAuthRecord) -> GeminiCliAuthRecord:
-        """Ensures the record has a valid access token, refreshing if necessary."""
-        if int(time.time() * 1000) >= record["expires"]:
-            logger.info(f"Refreshing token for {record['email']}")
-            return await self.refresh_token(record)
+        """
+        Ensures the record has a valid access token, refreshing if necessary.
+        Concurrent callers for the same account share a single refresh. A token
+        that is about to expire is still returned while a refresh runs in the
+        background.
+        """
+        remaining = record["expires"] / 1000 - time.time()
+        if remaining <= 0:
+            # shield: a cancelled caller must not cancel the refresh others are awaiting
+            return await asyncio.shield(self._refresh_once(record))
+        if remaining <= self.PREEMPTIVE_REFRESH_SECONDS:
+            self._refresh_in_background(record)
+        else:
+            timers = self._refresh_timers.get(asyncio.get_running_loop(), {})
+            if self._account_key(record) not in timers:
+                self._schedule_preemptive_refresh(record)
         return record
@@ -1,16 +1,61 @@
 import re
 import json
 import os
+import threading
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 HISTORY_FILE = "history.json"
+# Append-only log of job changes made since HISTORY_FILE was last written
+JOURNAL_FILE = "history.journal.jsonl"
 
 class JobManager:
+    # Fold the journal into the snapshot once it holds this many events
+    COMPACT_THRESHOLD = 500
+
+    # Statuses picked up for (re)processing, besides TRANSCRIBING_CHUNK_N
+    RETRY_STATUSES = [
+        'queue', 'failed', 'downloading', 'processing',
+        'DOWNLOADED', 'SILENCE_REMOVED', 'BITRATE_MODIFIED', 'CHUNKED'
+    ]
+    # Statuses that fail_pending marks as failed, besides TRANSCRIBING_CHUNK_N
+    INTERRUPTED_STATUSES = [
+        'queue', 'downloading', 'processing',
+        'DOWNLOADED', 'SILENCE_REMOVED', 'BITRATE_MODIFIED', 'CHUNKED'
+    ]
+    CHUNK_STATUS_PREFIX = 'TRANSCRIBING_CHUNK_'
+
+    @staticmethod
+    def from_config(config):
+        """Returns the JobManager for the configured 'job_store' ('json' or 'sqlite')."""
+        if config.get("job_store", "json") == "sqlite":
+            from src.sqlite_job_manager import SqliteJobManager
+            return SqliteJobManager()
+        return JobManager()
+
+    @classmethod
+    def _matches(cls, status, statuses):
+        return status in statuses or status.startswith(cls.CHUNK_STATUS_PREFIX)
+
+    @staticmethod
+    def _status_fields(old_status, status):
+        """Returns the fields to set when moving a job from old_status to status."""
+        fields = {'status': status}
+        if status == 'failed' and old_status not in ['queue', 'downloading', 'processing', 'failed', 'completed', 'cancelled']:
+            fields['last_granular_state'] = old_status
+        return fields
+
     def __init__(self):
         self.history = []
+        # Guards history and the history files when jobs run concurrently
+        self._lock = threading.RLock()
+        self._journal_events = 0
         self.load_history()
 
     def load_history(self):
+        """Loads the history snapshot and replays the journal on top of it."""
         if os.path.exists(HISTORY_FILE):
             try:
                 with open(HISTORY_FILE, 'r') as f:
@@ -19,11 +64,73 @@ class JobManager:
                 self.history = []
         else:
             self.history = []
+        self._journal_events = self._replay_journal()
+
+    def _replay_journal(self) -> int:
+        """Applies journal events to history. Returns the number of events applied."""
+        if not os.path.exists(JOURNAL_FILE):
+            return 0
+        by_id = {job.get('id'): job for job in self.history}
+        applied = 0
+        with open(JOURNAL_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append; everything before it is intact
+                    logger.warning(f"Ignoring malformed line in {JOURNAL_FILE}")
+                    continue
+                op = event.get('op')
+                if op == 'add':
+                    job = event['job']
+                    # Events may already be in the snapshot if a crash hit mid-compaction
+                    if job.get('id') not in by_id:
+                        self.history.append(job)
+                        by_id[job.get('id')] = job
+                elif op == 'update':
+                    job = by_id.get(event.get('id'))
+                    if job is not None:
+                        job.update(event.get('fields', {}))
+                applied += 1
+        return applied
+
+    def _append_event(self, event: dict):
+        """Durably appends one event to the journal, compacting when it grows large."""
+        with self._lock:
+            with open(JOURNAL_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(event) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_events += 1
+            if self._journal_events >= self.COMPACT_THRESHOLD:
+                self.save_history()
 
     def save_history(self):
-        # Save entire history to file
-        with open(HISTORY_FILE, 'w') as f:
-            json.dump(self.history, f, indent=4)
+        """Writes a full snapshot of history atomically and truncates the journal."""
+        with self._lock:
+            tmp_path = HISTORY_FILE + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.history, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, HISTORY_FILE)
+            # The snapshot now contains every journaled change
+            if os.path.exists(JOURNAL_FILE):
+                os.remove(JOURNAL_FILE)
+            self._journal_events = 0
+
+    def checkpoint(self):
+        """Compacts the journal into the snapshot if it has grown past the threshold."""
+        with self._lock:
+            if self._journal_events >= self.COMPACT_THRESHOLD:
+                self.save_history()
+
+    def add_job_records(self, jobs):
+        """Appends fully-formed job records to history, journaling each one."""
+        with self._lock:
+            for job in jobs:
+                self.history.append(job)
+                self._append_event({"op": "add", "job": job})
 
     def get_pending_from_last_150(self):
         """
@@ -31,39 +138,24 @@ class JobManager:
         Also includes granular intermediate states.
         Exclude 'no_link_found' from retry.
         """
-        target_statuses = [
-            'queue', 'failed', 'downloading', 'processing',
-            'DOWNLOADED', 'SILENCE_REMOVED', 'BITRATE_MODIFIED', 'CHUNKED'
-        ]
-        # Use regex for TRANSCRIBING_CHUNK_N
         pending = []
         for job in self.history:
-            status = job.get('status', '')
-            if status in target_statuses or status.startswith('TRANSCRIBING_CHUNK_'):
+            if self._matches(job.get('status', ''), self.RETRY_STATUSES):
                 pending.append(job)
         return pending
 
     def cancel_pending(self):
         """Cancel ALL pending, failed, and stuck jobs in history"""
-        target_statuses = [
-            'queue', 'failed', 'downloading', 'processing',
-            'DOWNLOADED', 'SILENCE_REMOVED', 'BITRATE_MODIFIED', 'CHUNKED'
-        ]
         for job in self.history:
-            status = job.get('status', '')
-            if status in target_statuses or status.startswith('TRANSCRIBING_CHUNK_'):
+            if self._matches(job.get('status', ''), self.RETRY_STATUSES):
                 job['status'] = 'cancelled'
         self.save_history()
 
     def fail_pending(self):
         """Mark ALL pending, downloading, or processing jobs as failed"""
-        target_statuses = [
-            'queue', 'downloading', 'processing',
-            'DOWNLOADED', 'SILENCE_REMOVED', 'BITRATE_MODIFIED', 'CHUNKED'
-        ]
         for job in self.history:
             status = job.get('status', '')
-            if status in target_statuses or status.startswith('TRANSCRIBING_CHUNK_'):
+            if self._matches(status, self.INTERRUPTED_STATUSES):
                 # Preserve the current state in a separate field if it's granular
                 if status not in ['queue', 'downloading', 'processing']:
                     job['last_granular_state'] = status
@@ -72,15 +164,21 @@ class JobManager:
 
     def update_job_status(self, job_id, status):
         """Update the status of a specific job by ID."""
-        for job in self.history:
-            if job.get('id') == job_id:
-                old_status = job.get('status')
-                if status == 'failed' and old_status not in ['queue', 'downloading', 'processing', 'failed', 'completed', 'cancelled']:
-                    job['last_granular_state'] = old_status
-                job['status'] = status
-                self.save_history()
-                return True
-        return False
+        with self._lock:
+            job = self.get_job(job_id)
+            if job is None:
+                return False
+            return self.update_job_fields(job_id, self._status_fields(job.get('status'), status))
+
+    def update_job_fields(self, job_id, fields):
+        """Set fields (e.g. a pre-resolved media URL) on a specific job by ID."""
+        with self._lock:
+            job = self.get_job(job_id)
+            if job is None:
+                return False
+            job.update(fields)
+            self._append_event({"op": "update", "id": job_id, "fields": fields})
+            return True
 
     def get_job(self, job_id):
         """Get a specific job by ID."""
@@ -163,6 +261,5 @@ class JobManager:
                         "added_at": str(datetime.now())
                     })
         
-        self.history.extend(new_jobs)
-        self.save_history()
+        self.add_job_records(new_jobs)
         return new_jobs
\ No newline at end of file
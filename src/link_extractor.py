@@ -4,13 +4,26 @@ Extract media links (Vimeo, Vidinfra) from a webpage using Playwright.
 """
 
 import argparse
+import asyncio
+import atexit
 import sys
 import os
 import threading
 import queue
 import re
+from concurrent.futures import Future
 from urllib.parse import urlparse, urljoin
 from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+MEDIA_HOSTS = ('player.vimeo.com', 'player.vidinfra.com')
+
+# Upper bound on waiting for a player to appear after navigation
+READY_TIMEOUT_MS = 15000
+POLL_INTERVAL_MS = 250
+# Extra wait after the first player appears, for pages with several
+SETTLE_MS = 500
 
 
 def parse_netscape_cookies(cookie_file_path):
@@ -123,12 +136,150 @@ def select_with_timeout(options, timeout=30):
         return options[0]
 
 
+def _media_link(url):
+    """Return url without its query string if it is a media player URL, else None."""
+    if url and url != "about:blank" and any(host in url for host in MEDIA_HOSTS):
+        return url.split('?')[0]
+    return None
+
+
+class _MediaLinkWatcher:
+    """
+    Collects media player links seen on a page (from frame navigations, document
+    requests and frame scans) and decides when to stop waiting for more.
+    """
+
+    def __init__(self, page, timeout_ms):
+        self.links = set()
+        self.polls = 0
+        self.max_polls = max(1, timeout_ms // POLL_INTERVAL_MS)
+        self._settle_polls = SETTLE_MS // POLL_INTERVAL_MS
+        self._first_found = None
+        # Frame navigations and document requests fire while Playwright waits
+        page.on("framenavigated", lambda frame: self.add(frame.url))
+        page.on("request", lambda request: self.add(request.url) if request.resource_type == "document" else None)
+
+    def add(self, candidate):
+        link = _media_link(candidate)
+        if link:
+            self.links.add(link)
+
+    def should_stop(self, frames):
+        """Scan frames (in case they attached before the listeners) and report whether to stop."""
+        if self.polls >= self.max_polls:
+            return True
+        for frame in frames:
+            try:
+                self.add(frame.url)
+            except:
+                continue
+        if self.links:
+            if self._first_found is None:
+                self._first_found = self.polls
+            if self.polls - self._first_found >= self._settle_polls:
+                return True
+        return False
+
+
+def collect_media_links(page, url, timeout_ms=READY_TIMEOUT_MS):
+    """
+    Navigate page to url and return the sorted media player links found in its frames.
+    Returns as soon as a player frame is attached or its document is requested
+    (plus a short settle window for pages with several players); timeout_ms only
+    bounds the wait for pages that never show one.
+    """
+    watcher = _MediaLinkWatcher(page, timeout_ms)
+
+    print(f"INFO: Navigating to {url}...", file=sys.stderr)
+
+    # Use longer timeouts and wait for commit
+    page.goto(url, wait_until="commit", timeout=60000)
+
+    print(f"INFO: Waiting for media player...", file=sys.stderr)
+    while not watcher.should_stop(page.frames):
+        page.wait_for_timeout(POLL_INTERVAL_MS)
+        watcher.polls += 1
+
+    print(f"DEBUG: Final URL: {page.url} (waited ~{watcher.polls * POLL_INTERVAL_MS / 1000:.1f}s)", file=sys.stderr)
+    return sorted(watcher.links)
+
+
+async def collect_media_links_async(page, url, timeout_ms=READY_TIMEOUT_MS):
+    """Async-API counterpart of collect_media_links."""
+    watcher = _MediaLinkWatcher(page, timeout_ms)
+    await page.goto(url, wait_until="commit", timeout=60000)
+    while not watcher.should_stop(page.frames):
+        await page.wait_for_timeout(POLL_INTERVAL_MS)
+        watcher.polls += 1
+    return sorted(watcher.links)
+
+
+async def resolve_links_async(urls, cookie_file=None, user_agent=None, concurrency=4):
+    """
+    Resolve many pages at once in one browser, with up to concurrency pages open.
+    Returns a dict mapping each URL to the sorted list of media links found on it
+    (empty if none were found or the page failed to load).
+    """
+    results = {}
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            context = await browser.new_context(user_agent=user_agent or DEFAULT_USER_AGENT)
+            if cookie_file:
+                try:
+                    cookies = parse_netscape_cookies(cookie_file)
+                except SystemExit:
+                    raise Exception(f"Could not load cookies from {cookie_file}")
+                await context.add_cookies(cookies)
+
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+
+            async def resolve(url):
+                async with semaphore:
+                    page = await context.new_page()
+                    try:
+                        results[url] = await collect_media_links_async(page, url)
+                    except Exception as e:
+                        print(f"ERROR: Failed to resolve {url}: {e}", file=sys.stderr)
+                        results[url] = []
+                    finally:
+                        await page.close()
+
+            await asyncio.gather(*(resolve(url) for url in dict.fromkeys(urls)))
+        finally:
+            await browser.close()
+    return results
+
+
+def resolve_links(urls, cookie_file=None, user_agent=None, concurrency=4):
+    """Synchronous entry point for resolve_links_async."""
+    return asyncio.run(resolve_links_async(urls, cookie_file, user_agent, concurrency))
+
+
+def choose_link(links, chooser=None):
+    """
+    Pick one of the found links. If there are several, chooser(links) picks one;
+    without a chooser the first link is used.
+    """
+    if not links:
+        print(f"ERROR: No links found", file=sys.stderr)
+        return None
+    if len(links) > 1:
+        if chooser is None:
+            print(f"WARNING: {len(links)} links found, using the first: {links[0]}", file=sys.stderr)
+            return links[0]
+        selected = chooser(links)
+        return selected if selected else links[0]
+    return links[0]
+
+
 def extract_link(url, cookie_file, user_agent=None):
     """
     Extract Vimeo/Vidinfra media link.
+    Launches a one-off browser; use LinkExtractorService for repeated extractions.
     """
     if not user_agent:
-        user_agent = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        user_agent = DEFAULT_USER_AGENT
         
     try:
         cookies = parse_netscape_cookies(cookie_file)
@@ -147,50 +298,142 @@ def extract_link(url, cookie_file, user_agent=None):
                 return None
             
             page = context.new_page()
-            print(f"INFO: Navigating to {url}...", file=sys.stderr)
-            
-            # Use longer timeouts and wait for commit
-            page.goto(url, wait_until="commit", timeout=60000)
-            
-            # Wait for content to settle
-            print(f"INFO: Waiting for content to settle...", file=sys.stderr)
-            page.wait_for_timeout(15000)
-            
-            print(f"DEBUG: Final URL: {page.url}", file=sys.stderr)
-            
-            found_links = set()
-
-            # Iterate through ALL frames
-            all_frames = page.frames
-            for frame in all_frames:
-                try:
-                    f_url = frame.url
-                    if not f_url or f_url == "about:blank":
-                        continue
-                        
-                    if 'player.vimeo.com' in f_url or 'player.vidinfra.com' in f_url:
-                        found_links.add(f_url.split('?')[0])
-                            
-                except:
-                    continue
-
+            links = collect_media_links(page, url)
             browser.close()
 
-            if not found_links:
-                print(f"ERROR: No links found", file=sys.stderr)
-                return None
-
-            sorted_links = sorted(list(found_links))
-            if len(sorted_links) > 1:
-                selected = select_with_timeout(sorted_links)
-                return selected if selected else sorted_links[0]
-            return sorted_links[0]
+        # Only the standalone CLI prompts; it owns its stdin
+        return choose_link(links, chooser=select_with_timeout)
             
     except Exception as e:
         print(f"ERROR: Unexpected error in extract_link: {e}", file=sys.stderr)
         return None
 
 
+class LinkExtractorService:
+    """
+    In-process link extractor backed by one long-lived headless browser.
+    Playwright's sync API is bound to the thread that started it, so the browser
+    lives on a dedicated worker thread and extractions are queued to it. A
+    browser context (with the cookie file loaded) is kept per cookie file and
+    user agent, and reloaded when the cookie file changes; each extraction only
+    opens a new page.
+    """
+
+    def __init__(self, headless=True):
+        self.headless = headless
+        self._requests = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._contexts = {}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="zaknotes-link-extractor", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        item = None
+        try:
+            with sync_playwright() as p:
+                browser = None
+                while True:
+                    item = self._requests.get()
+                    if item is None:
+                        break
+                    func, args, future = item
+                    if browser is None or not browser.is_connected():
+                        browser = p.chromium.launch(headless=self.headless)
+                        self._contexts = {}
+                    try:
+                        future.set_result(func(browser, *args))
+                    except Exception as e:
+                        future.set_exception(e)
+                    item = None
+                if browser is not None:
+                    browser.close()
+                self._contexts = {}
+        except Exception as e:
+            print(f"ERROR: Link extractor browser failed: {e}", file=sys.stderr)
+            # Fail the request in progress and everything queued behind it
+            pending = [item] if item is not None else []
+            while not self._requests.empty():
+                pending.append(self._requests.get_nowait())
+            for entry in pending:
+                if entry is not None and not entry[2].done():
+                    entry[2].set_exception(e)
+
+    def _submit(self, func, *args):
+        future = Future()
+        self._ensure_started()
+        self._requests.put((func, args, future))
+        return future
+
+    def _context(self, browser, cookie_file, user_agent):
+        mtime = os.path.getmtime(cookie_file) if cookie_file and os.path.exists(cookie_file) else None
+        key = (cookie_file, user_agent)
+        cached = self._contexts.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        if cached is not None:
+            cached[1].close()
+
+        context = browser.new_context(user_agent=user_agent)
+        if cookie_file:
+            try:
+                cookies = parse_netscape_cookies(cookie_file)
+            except SystemExit:
+                # parse_netscape_cookies exits for the CLI; fail just this extraction
+                context.close()
+                raise Exception(f"Could not load cookies from {cookie_file}")
+            context.add_cookies(cookies)
+        self._contexts[key] = (mtime, context)
+        return context
+
+    def _extract_on_browser(self, browser, url, cookie_file, user_agent):
+        context = self._context(browser, cookie_file, user_agent)
+        page = context.new_page()
+        try:
+            return collect_media_links(page, url)
+        finally:
+            page.close()
+
+    def extract(self, url, cookie_file=None, user_agent=None, timeout=180, chooser=None):
+        """
+        Extract the Vimeo/Vidinfra media link from url, or return None if none is found.
+        The service never reads stdin: with several links, chooser(links) picks
+        one if given, otherwise the first is used.
+        """
+        future = self._submit(self._extract_on_browser, url, cookie_file, user_agent or DEFAULT_USER_AGENT)
+        try:
+            links = future.result(timeout=timeout)
+        except Exception as e:
+            print(f"ERROR: Link extraction failed for {url}: {e}", file=sys.stderr)
+            return None
+        return choose_link(links, chooser)
+
+    def close(self):
+        """Close the browser and stop the worker thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._requests.put(None)
+            thread.join(timeout=30)
+
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+def get_extractor_service():
+    """Return the process-wide LinkExtractorService, creating it on first use."""
+    global _shared_service
+    with _shared_service_lock:
+        if _shared_service is None:
+            _shared_service = LinkExtractorService()
+            atexit.register(_shared_service.close)
+        return _shared_service
+
+
 def main():
     parser = argparse.ArgumentParser(description='Vimeo/Vidinfra Media Link Extractor')
     parser.add_argument('--url', required=True, help='Target webpage URL')
@@ -1,13 +1,18 @@
 import os
 from src.gemini_api_wrapper import GeminiAPIWrapper
 from src.prompts import NOTE_GENERATION_PROMPT
+from src.result_cache import ResultCache
 
 class NoteGenerationService:
     @staticmethod
-    def generate(transcript_path: str, output_path: str, prompt_text: str = None) -> bool:
+    def generate(transcript_path: str, output_path: str, prompt_text: str = None, api_wrapper: GeminiAPIWrapper = None, cache: ResultCache = None) -> bool:
         """
         Generates notes from a transcript file.
         Saves the notes to output_path.
+        Pass api_wrapper to reuse an existing wrapper (and its connection pool).
+        Partial output is streamed to '<output_path>.part' while the model responds.
+        If a cache is given, notes for the same transcript, prompt and model are
+        reused from it instead of calling the API again.
         """
         if not os.path.exists(transcript_path):
             print(f"      ❌ Transcript file not found: {transcript_path}")
@@ -20,20 +25,55 @@ class NoteGenerationService:
             with open(transcript_path, 'r', encoding='utf-8') as f:
                 transcript_content = f.read()
             
-            api = GeminiAPIWrapper()
-            notes = api.generate_content(
-                prompt=f"TRANSCRIPT:\n{transcript_content}",
-                model_type="note",
-                system_instruction=prompt_text
-            )
-            
+            out_dir = os.path.dirname(output_path)
+            if out_dir and not os.path.exists(out_dir):
+                os.makedirs(out_dir, exist_ok=True)
+
+            api = api_wrapper or GeminiAPIWrapper()
+            prompt = f"TRANSCRIPT:\n{transcript_content}"
+
+            cache_key = None
+            if cache is not None:
+                cache_key = ResultCache.make_key(
+                    ResultCache.hash_text(prompt),
+                    ResultCache.hash_text(prompt_text),
+                    api.model_for("note"),
+                )
+                cached = cache.get(cache_key)
+                if cached:
+                    print("      - Using cached notes for this transcript.")
+                    with open(output_path, 'w', encoding='utf-8') as f:
+                        f.write(cached)
+                    return True
+
+            partial_path = output_path + ".part"
+            try:
+                with open(partial_path, 'w', encoding='utf-8') as partial:
+                    def on_text(text):
+                        if text is None:
+                            # The attempt was discarded for a retry; start over
+                            partial.seek(0)
+                            partial.truncate()
+                        else:
+                            partial.write(text)
+                            partial.flush()
+
+                    notes = api.generate_content(
+                        prompt=prompt,
+                        model_type="note",
+                        system_instruction=prompt_text,
+                        on_text=on_text
+                    )
+            finally:
+                # The streamed copy is only useful while the request runs
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+
             if notes:
-                out_dir = os.path.dirname(output_path)
-                if out_dir and not os.path.exists(out_dir):
-                    os.makedirs(out_dir, exist_ok=True)
-                    
                 with open(output_path, 'w', encoding='utf-8') as f:
                     f.write(notes)
+                if cache_key:
+                    cache.put(cache_key, notes)
                 
                 return True
             else:
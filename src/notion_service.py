@@ -3,6 +3,7 @@ import re
 import time
 from typing import List, Dict, Any, Callable
 from notion_client import Client, APIResponseError
+from src.backoff import BackoffManager, parse_retry_after, RATE_LIMIT
 
 logger = logging.getLogger(__name__)
 
@@ -11,11 +12,10 @@ class NotionService:
         self.client = Client(auth=notion_secret)
         self.database_id = database_id
         self.max_retries = max_retries
-        # Import BackoffManager to avoid circular dependency if it was in gemini_api_wrapper only
-        from src.gemini_api_wrapper import BackoffManager
         self.backoff_manager = BackoffManager(
             initial_delay=float(retry_delay),
-            max_delay=60.0
+            max_delay=60.0,
+            jitter="full"
         )
 
     def _execute_with_retry(self, func: Callable, *args, **kwargs) -> Any:
@@ -33,9 +33,11 @@ class NotionService:
                         logger.error(f"Max retries reached for Notion API (429).")
                         raise
                     
-                    delay = self.backoff_manager.get_delay(retries - 1)
-                    logger.warning(f"Notion rate limit reached. Retrying in {delay}s... (Attempt {retries}/{self.max_retries})")
-                    self.backoff_manager.sync_sleep(retries - 1)
+                    # Notion sends Retry-After with its 429s
+                    retry_after = parse_retry_after(getattr(e, "headers", None))
+                    delay = self.backoff_manager.get_delay(retries - 1, retry_after, RATE_LIMIT)
+                    logger.warning(f"Notion rate limit reached. Retrying in {delay:.1f}s... (Attempt {retries}/{self.max_retries})")
+                    time.sleep(delay)
                 else:
                     logger.error(f"Notion API error: {e}")
                     raise
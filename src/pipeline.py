@@ -1,6 +1,7 @@
 import os
 import time
 import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from src.downloader import download_audio, get_expected_audio_path
 from src.audio_processor import AudioProcessor
 from src.note_generation_service import NoteGenerationService
@@ -8,306 +9,471 @@ from src.cleanup_service import FileCleanupService
 from src.gemini_api_wrapper import GeminiAPIWrapper
 from src.prompts import TRANSCRIPTION_PROMPT
 from src.job_manager import JobManager
+from src.sqlite_job_manager import LeaseLostError
 from src.notion_service import NotionService
 from src.notion_config_manager import NotionConfigManager
 from src.rclone_service import RcloneService
 from src.rclone_config_manager import RcloneConfigManager
+from src.result_cache import ResultCache
 
 class ProcessingPipeline:
     def __init__(self, config_manager, api_wrapper=None, job_manager=None):
         self.config = config_manager
-        self.manager = job_manager or JobManager()
+        self.manager = job_manager or JobManager.from_config(config_manager)
         self.api = api_wrapper or GeminiAPIWrapper()
         self.notion_config = NotionConfigManager()
         self.rclone_config = RcloneConfigManager()
         self.rclone_service = RcloneService()
+        self.transcript_cache = self._build_cache("transcript_cache", "cache/transcripts", max_size_mb=500)
+        self.note_cache = self._build_cache("note_cache", "cache/notes", max_size_mb=100, ttl_hours=168)
 
-    def execute_job(self, job) -> bool:
+    def _build_cache(self, prefix: str, default_dir: str, max_size_mb: float, ttl_hours: float = None):
+        """Creates a ResultCache from the '<prefix>_*' config keys, or None if disabled."""
+        return ResultCache.from_config(self.config, prefix, default_dir, max_size_mb, ttl_hours)
+
+    # Pipeline stages in execution order: (name, method name).
+    # Each stage takes (job, ctx) and returns True to continue or False on failure.
+    STAGES = [
+        ("download", "stage_acquire_source"),
+        ("audio", "stage_prepare_audio"),
+        ("transcribe", "stage_transcribe"),
+        ("notes", "stage_generate_and_publish"),
+    ]
+    TEMP_DIR = "temp"
+
+    def new_context(self) -> dict:
+        """Creates the per-job state that is handed from one stage to the next."""
+        if not os.path.exists(self.TEMP_DIR):
+            os.makedirs(self.TEMP_DIR, exist_ok=True)
+        return {
+            "audio_path": None,
+            "prepared_path": None,
+            "chunks": [],
+            "transcript_path": None,
+        }
+
+    def run_stage(self, stage_name: str, job, ctx: dict) -> bool:
+        """
+        Runs a single named stage for a job, marking the job failed on exceptions.
+        LeaseLostError propagates: the job belongs to another worker now.
+        """
+        method_name = dict(self.STAGES)[stage_name]
+        try:
+            return getattr(self, method_name)(job, ctx)
+        except LeaseLostError:
+            raise
+        except Exception as e:
+            print(f"❌ Exception in pipeline for job {job['id']}: {e}")
+            self.manager.update_job_status(job['id'], 'failed')
+            return False
+
+    def execute_job(self, job, should_stop=None) -> bool:
         """
         Executes the full pipeline for a single job with resumption support.
         Supports both URL-based and local file-based jobs.
+        should_stop, if given, is checked before each stage; the job stops
+        (returning False) once it returns True.
         """
-        
-        audio_path = None
-        chunks = []
-        transcript_path = None
-        notes_path = None
-        
-        temp_dir = "temp"
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir, exist_ok=True)
-
         try:
-            # 1. Source Acquisition (Download or Local)
-            is_local = "file_path" in job
+            ctx = self.new_context()
+        except Exception as e:
+            print(f"❌ Exception in pipeline for job {job['id']}: {e}")
+            self.manager.update_job_status(job['id'], 'failed')
+            return False
+
+        for stage_name, _ in self.STAGES:
+            if should_stop is not None and should_stop():
+                print(f"⏹️ Stopping job {job['id']} before stage '{stage_name}'.")
+                return False
+            if not self.run_stage(stage_name, job, ctx):
+                return False
+        return True
+
+    @staticmethod
+    def _download_progress(job):
+        """Returns a download progress callback that prints every 10% step."""
+        last_step = [-1]
+
+        def report(progress):
+            total = progress.get("total_bytes")
+            done = progress.get("downloaded_bytes")
+            if progress.get("status") != "downloading" or not total or done is None:
+                return
+            step = min(10, int(done * 10 / total))
+            if step > last_step[0]:
+                last_step[0] = step
+                speed = progress.get("speed")
+                rate = f" at {speed / 1e6:.1f} MB/s" if speed else ""
+                print(f"      - {job['name']}: {step * 10}% of {total / 1e6:.1f} MB{rate}")
+
+        return report
+
+    def stage_acquire_source(self, job, ctx: dict) -> bool:
+        """Stage 1: Source acquisition (download or local file)."""
+        is_local = "file_path" in job
+        
+        if is_local:
+            audio_path = job["file_path"]
+            if not os.path.exists(audio_path):
+                print(f"❌ Local file missing: {audio_path}")
+                self.manager.update_job_status(job['id'], 'failed')
+                return False
+            print(f"📂 [1/4] Using local file: {audio_path}")
+            # Ensure status is at least DOWNLOADED for local files to enter next step
+            if job.get('status') == 'queue' or job.get('status') == 'downloading':
+                job['status'] = 'DOWNLOADED'
+                self.manager.update_job_status(job['id'], 'DOWNLOADED')
+        else:
+            # URL-based: 1. Download
+            audio_path = get_expected_audio_path(job)
+            skip_download = False
+            ready_states = ['DOWNLOADED', 'SILENCE_REMOVED', 'BITRATE_MODIFIED', 'CHUNKED']
+            if job.get('status') in ready_states or job.get('status', '').startswith('TRANSCRIBING_CHUNK_'):
+                if os.path.exists(audio_path):
+                    print(f"⏩ Skipping download: {audio_path} already exists.")
+                    skip_download = True
+            elif os.path.exists(audio_path):
+                print(f"⏩ Audio file {audio_path} already exists. Skipping download and setting status to DOWNLOADED.")
+                job['status'] = 'DOWNLOADED'
+                self.manager.update_job_status(job['id'], 'DOWNLOADED')
+                skip_download = True
             
-            if is_local:
-                audio_path = job["file_path"]
-                if not os.path.exists(audio_path):
-                    print(f"❌ Local file missing: {audio_path}")
+            if not skip_download:
+                print(f"📥 [1/4] Downloading audio for: {job['name']}...")
+                self.manager.update_job_status(job['id'], 'downloading')
+                resolved_url = job.get('resolved_url')
+                try:
+                    audio_path = download_audio(job, on_progress=self._download_progress(job))
+                finally:
+                    # download_audio replaces or drops a stale pre-resolved link
+                    if job.get('resolved_url') != resolved_url:
+                        self.manager.update_job_fields(job['id'], {'resolved_url': job.get('resolved_url')})
+                if not audio_path or not os.path.exists(audio_path):
+                    print(f"❌ Download failed or file missing for job: {job['name']}")
                     self.manager.update_job_status(job['id'], 'failed')
                     return False
-                print(f"📂 [1/4] Using local file: {audio_path}")
-                # Ensure status is at least DOWNLOADED for local files to enter next step
-                if job.get('status') == 'queue' or job.get('status') == 'downloading':
-                    job['status'] = 'DOWNLOADED'
-                    self.manager.update_job_status(job['id'], 'DOWNLOADED')
-            else:
-                # URL-based: 1. Download
-                audio_path = get_expected_audio_path(job)
-                skip_download = False
-                ready_states = ['DOWNLOADED', 'SILENCE_REMOVED', 'BITRATE_MODIFIED', 'CHUNKED']
-                if job.get('status') in ready_states or job.get('status', '').startswith('TRANSCRIBING_CHUNK_'):
-                    if os.path.exists(audio_path):
-                        print(f"⏩ Skipping download: {audio_path} already exists.")
-                        skip_download = True
-                elif os.path.exists(audio_path):
-                    print(f"⏩ Audio file {audio_path} already exists. Skipping download and setting status to DOWNLOADED.")
-                    job['status'] = 'DOWNLOADED'
-                    self.manager.update_job_status(job['id'], 'DOWNLOADED')
-                    skip_download = True
-                
-                if not skip_download:
-                    print(f"📥 [1/4] Downloading audio for: {job['name']}...")
-                    self.manager.update_job_status(job['id'], 'downloading')
-                    audio_path = download_audio(job)
-                    if not audio_path or not os.path.exists(audio_path):
-                        print(f"❌ Download failed or file missing for job: {job['name']}")
-                        self.manager.update_job_status(job['id'], 'failed')
-                        return False
-                    self.manager.update_job_status(job['id'], 'DOWNLOADED')
-                    job['status'] = 'DOWNLOADED'
-
-            # 2. Audio Processing (Granular steps)
-            base_name = os.path.splitext(os.path.basename(audio_path))[0]
-            # Use .mp3 extension for prepared file to ensure compatibility and trigger conversion
-            prepared_path = os.path.join(temp_dir, f"{base_name}_prepared.mp3")
-            
-            # 2.1 Optimization (Silence, Bitrate, Mono, 16kHz)
-            if job.get('status') == 'DOWNLOADED':
-                print(f"✂️ [2/4] Optimizing audio (single pass): {audio_path}")
-                if not os.path.exists(prepared_path):
-                    if AudioProcessor.optimize_audio(audio_path, prepared_path):
-                        self.manager.update_job_status(job['id'], 'BITRATE_MODIFIED')
-                        job['status'] = 'BITRATE_MODIFIED'
-                    else:
-                        shutil.copy2(audio_path, prepared_path)
-                        self.manager.update_job_status(job['id'], 'BITRATE_MODIFIED')
-                        job['status'] = 'BITRATE_MODIFIED'
+                self.manager.update_job_status(job['id'], 'DOWNLOADED')
+                job['status'] = 'DOWNLOADED'
+
+        ctx["audio_path"] = audio_path
+        return True
+
+    def stage_prepare_audio(self, job, ctx: dict) -> bool:
+        """Stage 2: Audio optimization and chunking (granular steps)."""
+        temp_dir = self.TEMP_DIR
+        audio_path = ctx["audio_path"]
+        chunks = []
+
+        base_name = os.path.splitext(os.path.basename(audio_path))[0]
+        # Use .mp3 extension for prepared file to ensure compatibility and trigger conversion
+        prepared_path = os.path.join(temp_dir, f"{base_name}_prepared.mp3")
+        ctx["prepared_path"] = prepared_path
+        
+        # 2.1 Optimization (Silence, Bitrate, Mono, 16kHz)
+        if job.get('status') == 'DOWNLOADED':
+            print(f"✂️ [2/4] Optimizing audio (single pass): {audio_path}")
+            if not os.path.exists(prepared_path):
+                if AudioProcessor.optimize_audio(audio_path, prepared_path):
+                    self.manager.update_job_status(job['id'], 'BITRATE_MODIFIED')
+                    job['status'] = 'BITRATE_MODIFIED'
                 else:
-                    print(f"⏩ Prepared audio already exists.")
+                    shutil.copy2(audio_path, prepared_path)
                     self.manager.update_job_status(job['id'], 'BITRATE_MODIFIED')
                     job['status'] = 'BITRATE_MODIFIED'
+            else:
+                print(f"⏩ Prepared audio already exists.")
+                self.manager.update_job_status(job['id'], 'BITRATE_MODIFIED')
+                job['status'] = 'BITRATE_MODIFIED'
+
+        # 2.2 Chunking
+        if job.get('status') == 'BITRATE_MODIFIED':
+            chunks = sorted([os.path.join(temp_dir, f) for f in os.listdir(temp_dir) if f.startswith(f"job_{job['id']}_chunk_")])
+            if not chunks:
+                segment_time = self.config.get("segment_time", 1800)
+                print(f"✂️ Splitting audio into chunks based on time ({segment_time}s)...")
+                max_size_mb = self.config.get("max_chunk_size_mb", 15)
+                # Use .mp3 for chunks
+                output_pattern = os.path.join(temp_dir, f"job_{job['id']}_chunk_%03d.mp3")
+
+                chunks = AudioProcessor.process_for_transcription(
+                    prepared_path, 
+                    segment_time=segment_time,
+                    max_size_mb=max_size_mb, 
+                    output_dir=temp_dir, 
+                    output_pattern=output_pattern
+                )
 
-            # 2.2 Chunking
-            if job.get('status') == 'BITRATE_MODIFIED':
-                chunks = sorted([os.path.join(temp_dir, f) for f in os.listdir(temp_dir) if f.startswith(f"job_{job['id']}_chunk_")])
-                if not chunks:
-                    segment_time = self.config.get("segment_time", 1800)
-                    print(f"✂️ Splitting audio into chunks based on time ({segment_time}s)...")
-                    max_size_mb = self.config.get("max_chunk_size_mb", 15)
-                    # Use .mp3 for chunks
-                    output_pattern = os.path.join(temp_dir, f"job_{job['id']}_chunk_%03d.mp3")
-
-                    chunks = AudioProcessor.process_for_transcription(
-                        prepared_path, 
-                        segment_time=segment_time,
-                        max_size_mb=max_size_mb, 
-                        output_dir=temp_dir, 
-                        output_pattern=output_pattern
-                    )
-
-                    if not chunks:
-                        print(f"❌ Error: Chunking failed to produce chunks for job {job['id']}")
-                        self.manager.update_job_status(job['id'], 'failed')
-                        return False
-                    self.manager.update_job_status(job['id'], 'CHUNKED')
-                    job['status'] = 'CHUNKED'
-                else:
-                    print(f"⏩ Skipping chunking: {len(chunks)} chunk(s) already exist.")
-                    self.manager.update_job_status(job['id'], 'CHUNKED')
-                    job['status'] = 'CHUNKED'
-            
-            # Re-verify chunks existence for next step (Transcription)
-            if not chunks and (job.get('status') == 'CHUNKED' or job.get('status', '').startswith('TRANSCRIBING_CHUNK_')):
-                chunks = sorted([os.path.join(temp_dir, f) for f in os.listdir(temp_dir) if f.startswith(f"job_{job['id']}_chunk_")])
-            
-            if not chunks and (job.get('status') == 'CHUNKED' or job.get('status', '').startswith('TRANSCRIBING_CHUNK_')):
-                chunks = sorted([os.path.join(temp_dir, f) for f in os.listdir(temp_dir) if f.startswith(f"job_{job['id']}_chunk_")])
                 if not chunks:
-                    print(f"❌ Error: Status is {job['status']} but no chunks found for job {job['id']}")
+                    print(f"❌ Error: Chunking failed to produce chunks for job {job['id']}")
                     self.manager.update_job_status(job['id'], 'failed')
                     return False
+                self.manager.update_job_status(job['id'], 'CHUNKED')
+                job['status'] = 'CHUNKED'
+            else:
+                print(f"⏩ Skipping chunking: {len(chunks)} chunk(s) already exist.")
+                self.manager.update_job_status(job['id'], 'CHUNKED')
+                job['status'] = 'CHUNKED'
+        
+        # Re-verify chunks existence for next step (Transcription)
+        if not chunks and (job.get('status') == 'CHUNKED' or job.get('status', '').startswith('TRANSCRIBING_CHUNK_')):
+            chunks = sorted([os.path.join(temp_dir, f) for f in os.listdir(temp_dir) if f.startswith(f"job_{job['id']}_chunk_")])
+            if not chunks:
+                print(f"❌ Error: Status is {job['status']} but no chunks found for job {job['id']}")
+                self.manager.update_job_status(job['id'], 'failed')
+                return False
 
-            # 3. Transcription
-            print(f"📝 [3/4] Transcribing {len(chunks)} chunks using Gemini...")
-            safe_name = job['name'].replace(" ", "_").replace("/", "-")
-            transcript_path = os.path.join(temp_dir, f"{safe_name}_transcript.txt")
-            
-            # Ensure the directory for transcript exists
-            if not os.path.exists(temp_dir):
-                os.makedirs(temp_dir, exist_ok=True)
-
-            # Count existing chunks in the transcript file for resumption
-            # Each chunk is separated by \n\n
-            completed_chunks = 0
-            if os.path.exists(transcript_path):
-                with open(transcript_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    # Split by double newline and filter empty parts
-                    completed_chunks = len([p for p in content.split("\n\n") if p.strip()])
-            
-            any_success = completed_chunks > 0
+        ctx["chunks"] = chunks
+        return True
 
-            for i, chunk in enumerate(chunks):
-                chunk_index = i + 1
-                if chunk_index <= completed_chunks:
-                    print(f"      - Chunk {chunk_index}/{len(chunks)} already transcribed in {transcript_path}. Skipping.")
-                    continue
+    def stage_transcribe(self, job, ctx: dict) -> bool:
+        """Stage 3: Transcription of all chunks, resuming from the transcript file."""
+        temp_dir = self.TEMP_DIR
+        chunks = ctx["chunks"]
 
-                if any_success: # If we processed at least one chunk (resumed or new)
-                    print(f"      - Waiting before next chunk...")
-                    self.api.backoff_manager.sync_sleep(0) # Start with base delay
+        print(f"📝 [3/4] Transcribing {len(chunks)} chunks using Gemini...")
+        safe_name = job['name'].replace(" ", "_").replace("/", "-")
+        transcript_path = os.path.join(temp_dir, f"{safe_name}_transcript.txt")
+        ctx["transcript_path"] = transcript_path
+        
+        # Ensure the directory for transcript exists
+        if not os.path.exists(temp_dir):
+            os.makedirs(temp_dir, exist_ok=True)
 
-                print(f"      - Processing chunk {chunk_index}/{len(chunks)}...")
+        # Count existing chunks in the transcript file for resumption
+        # Each chunk is separated by \n\n
+        completed_chunks = 0
+        if os.path.exists(transcript_path):
+            with open(transcript_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+                # Split by double newline and filter empty parts
+                completed_chunks = len([p for p in content.split("\n\n") if p.strip()])
+        
+        any_success = completed_chunks > 0
 
-                self.manager.update_job_status(job['id'], f'TRANSCRIBING_CHUNK_{chunk_index}')
-                try:
-                    text = self.api.generate_content_with_file(
-                        file_path=chunk,
-                        prompt="Please transcribe this audio chunk.",
-                        model_type="transcription",
-                        system_instruction=TRANSCRIPTION_PROMPT
-                    )
-                    if text:
-                        with open(transcript_path, 'a', encoding='utf-8') as f:
-                            f.write(text)
-                            f.write("\n\n")
-                        any_success = True
-                    else:
-                        print(f"      ⚠️ Warning: No text extracted from chunk {chunk_index}")
-                        self.manager.update_job_status(job['id'], 'failed')
-                        return False
-                except Exception as e:
-                    print(f"      ❌ Failed to get transcription for chunk {chunk_index}: {str(e)}")
-                    self.manager.update_job_status(job['id'], 'failed')
-                    return False
+        pending = []
+        for i, chunk in enumerate(chunks):
+            chunk_index = i + 1
+            if chunk_index <= completed_chunks:
+                print(f"      - Chunk {chunk_index}/{len(chunks)} already transcribed in {transcript_path}. Skipping.")
+                continue
+            pending.append((chunk_index, chunk))
 
-            if not any_success:
-                print(f"❌ Transcription failed for job: {job['name']}")
-                self.manager.update_job_status(job['id'], 'failed')
-                return False
-            print(f"   - Transcription complete: {transcript_path}")
-
-            # 4. Note Generation
-            print(f"🗒️ [4/4] Generating study notes...")
-            safe_name = job['name'].replace(" ", "_").replace("/", "-")
-            notes_dir = "notes"
-            if not os.path.exists(notes_dir):
-                os.makedirs(notes_dir, exist_ok=True)
-            
-            final_notes_path = os.path.join(notes_dir, f"{safe_name}.md")
-            
-            if not NoteGenerationService.generate(transcript_path, final_notes_path):
-                print(f"❌ Note generation failed for job: {job['name']}")
-                self.manager.update_job_status(job['id'], 'failed')
-                return False
-            print(f"   - Notes generated: {final_notes_path}")
-
-            # Optional delay before next phase
-            print(f"      - Waiting before Notion integration...")
-            self.api.backoff_manager.sync_sleep(0) # Base delay
-
-            # 5. Notion Integration (Post-generation)
-            pushed_to_notion = False
-            if self.config.get("notion_integration_enabled", False):
-                print(f"🚀 [5/5] Pushing to Notion...")
-                notion_secret, database_id = self.notion_config.get_credentials()
-                
-                if not notion_secret or not database_id:
-                    print("⚠️ Notion credentials not configured. Skipping Notion push.")
-                else:
+        if pending:
+            # Chunks are transcribed concurrently (the API wrapper caps in-flight
+            # requests per account) but committed to the transcript strictly in
+            # chunk order, so the transcript file stays a valid resume point.
+            results = {}
+            next_index = pending[0][0]
+            failed = False
+            self.manager.update_job_status(job['id'], f'TRANSCRIBING_CHUNK_{next_index}')
+
+            max_parallel = max(1, int(self.config.get("max_parallel_chunks", 4)))
+            with ThreadPoolExecutor(max_workers=min(max_parallel, len(pending)), thread_name_prefix="zaknotes-chunk") as pool:
+                futures = {}
+                for chunk_index, chunk in pending:
+                    print(f"      - Processing chunk {chunk_index}/{len(chunks)}...")
+                    futures[pool.submit(self._transcribe_chunk, chunk)] = chunk_index
+
+                for future in as_completed(futures):
+                    chunk_index = futures[future]
                     try:
-                        notion_service = NotionService(notion_secret, database_id)
-                        
-                        # Title: replace underscores with spaces, remove extension
-                        title = os.path.splitext(os.path.basename(final_notes_path))[0].replace("_", " ")
-                        
-                        with open(final_notes_path, 'r', encoding='utf-8') as f:
-                            markdown_content = f.read()
-                        
-                        url = notion_service.create_page(title, markdown_content)
-                        if url:
-                            print(f"✅ Successfully pushed to Notion: {url}")
-                            pushed_to_notion = True
-                        else:
-                            print("❌ Notion push failed: No URL returned.")
+                        text = future.result()
                     except Exception as e:
-                        print(f"❌ Notion push failed with exception: {e}")
-
-            # 5.1 Rclone Integration (Post-generation)
-            pushed_to_rclone = False
-            if self.config.get("rclone_integration_enabled", False):
-                print(f"🚀 [5.1/5] Pushing to Rclone...")
-                remote_name, remote_path = self.rclone_config.get_credentials()
-                
-                if not remote_name:
-                    print("⚠️ Rclone remote not configured. Skipping Rclone push.")
-                else:
-                    try:
-                        # Construct remote destination: remote:path/filename.md
-                        remote_dest = f"{remote_name}:{remote_path}"
-                        success, message = self.rclone_service.push_note(final_notes_path, remote_dest)
-                        
-                        if success:
-                            print(f"✅ Successfully pushed to Rclone: {remote_dest}")
-                            pushed_to_rclone = True
+                        print(f"      ❌ Failed to get transcription for chunk {chunk_index}: {str(e)}")
+                        failed = True
+                    else:
+                        if text:
+                            results[chunk_index] = text
                         else:
-                            print(f"❌ Rclone push failed: {message}")
-                    except Exception as e:
-                        print(f"❌ Rclone push failed with exception: {e}")
-
-            # 6. Cleanup
-            print(f"🧹 Cleaning up intermediate files...")
-            files_to_cleanup = [audio_path, transcript_path, prepared_path]
-            for c in chunks:
-                if c not in files_to_cleanup:
-                    files_to_cleanup.append(c)
-            
-            # Completion status determination
-            notion_enabled = self.config.get("notion_integration_enabled", False)
-            rclone_enabled = self.config.get("rclone_integration_enabled", False)
-            
-            # If at least one enabled integration was successful, we consider it pushed
-            is_pushed = (notion_enabled and pushed_to_notion) or (rclone_enabled and pushed_to_rclone)
+                            print(f"      ⚠️ Warning: No text extracted from chunk {chunk_index}")
+                            failed = True
+
+                    if failed:
+                        # Stop queued chunks; chunks already in flight are allowed to finish
+                        for f in futures:
+                            f.cancel()
+                        break
+
+                    next_index = self._commit_transcribed_chunks(job, transcript_path, results, next_index)
+
+            if failed:
+                # Keep any in-order work that finished before the failure
+                for f, chunk_index in futures.items():
+                    if f.done() and not f.cancelled() and f.exception() is None and f.result():
+                        results.setdefault(chunk_index, f.result())
+                self._commit_transcribed_chunks(job, transcript_path, results, next_index, update_status=False)
+                self.manager.update_job_status(job['id'], 'failed')
+                return False
+            any_success = True
+
+        if not any_success:
+            print(f"❌ Transcription failed for job: {job['name']}")
+            self.manager.update_job_status(job['id'], 'failed')
+            return False
+        print(f"   - Transcription complete: {transcript_path}")
+        return True
+
+    TRANSCRIBE_CHUNK_PROMPT = "Please transcribe this audio chunk."
+
+    def _transcribe_chunk(self, chunk: str) -> str:
+        """
+        Transcribes a single audio chunk.
+        Identical chunk bytes sent to the same model with the same prompts are
+        served from the transcript cache instead of calling the API again.
+        """
+        cache_key = None
+        if self.transcript_cache:
+            try:
+                cache_key = ResultCache.make_key(
+                    ResultCache.hash_file(chunk),
+                    self.api.model_for("transcription"),
+                    ResultCache.hash_text(self.TRANSCRIBE_CHUNK_PROMPT + "\0" + TRANSCRIPTION_PROMPT),
+                )
+                cached = self.transcript_cache.get(cache_key)
+            except Exception as e:
+                # The cache must never fail a job; fall back to the API
+                print(f"      ⚠️ Transcript cache unavailable for {chunk}: {e}")
+                cache_key = cached = None
+            if cached:
+                print(f"      - Using cached transcript for {chunk}")
+                return cached
+
+        text = self.api.generate_content_with_file(
+            file_path=chunk,
+            prompt=self.TRANSCRIBE_CHUNK_PROMPT,
+            model_type="transcription",
+            system_instruction=TRANSCRIPTION_PROMPT
+        )
+        if cache_key and text and text.strip():
+            self.transcript_cache.put(cache_key, text)
+        return text
+
+    def _commit_transcribed_chunks(self, job, transcript_path: str, results: dict, next_index: int, update_status: bool = True) -> int:
+        """
+        Appends the contiguous run of finished chunks starting at next_index to the
+        transcript file. Returns the index of the first chunk still outstanding.
+        """
+        if next_index not in results:
+            return next_index
+        with open(transcript_path, 'a', encoding='utf-8') as f:
+            while next_index in results:
+                f.write(results.pop(next_index))
+                f.write("\n\n")
+                next_index += 1
+        if update_status:
+            self.manager.update_job_status(job['id'], f'TRANSCRIBING_CHUNK_{next_index}')
+        return next_index
+
+    def stage_generate_and_publish(self, job, ctx: dict) -> bool:
+        """Stage 4: Note generation, optional Notion/Rclone push and cleanup."""
+        audio_path = ctx["audio_path"]
+        prepared_path = ctx["prepared_path"]
+        chunks = ctx["chunks"]
+        transcript_path = ctx["transcript_path"]
+
+        # 4. Note Generation
+        print(f"🗒️ [4/4] Generating study notes...")
+        safe_name = job['name'].replace(" ", "_").replace("/", "-")
+        notes_dir = "notes"
+        if not os.path.exists(notes_dir):
+            os.makedirs(notes_dir, exist_ok=True)
+        
+        final_notes_path = os.path.join(notes_dir, f"{safe_name}.md")
+        
+        if not NoteGenerationService.generate(transcript_path, final_notes_path, api_wrapper=self.api, cache=self.note_cache):
+            print(f"❌ Note generation failed for job: {job['name']}")
+            self.manager.update_job_status(job['id'], 'failed')
+            return False
+        print(f"   - Notes generated: {final_notes_path}")
+
+        # No fixed pause here: Gemini calls are paced at send time by the account
+        # scheduler and rate limiter, and Notion retries its own 429s
+
+        # 5. Notion Integration (Post-generation)
+        pushed_to_notion = False
+        if self.config.get("notion_integration_enabled", False):
+            print(f"🚀 [5/5] Pushing to Notion...")
+            notion_secret, database_id = self.notion_config.get_credentials()
             
-            # If all ENABLED integrations succeeded, we can cleanup the final note
-            can_cleanup_note = True
-            if notion_enabled and not pushed_to_notion:
-                can_cleanup_note = False
-            if rclone_enabled and not pushed_to_rclone:
-                can_cleanup_note = False
+            if not notion_secret or not database_id:
+                print("⚠️ Notion credentials not configured. Skipping Notion push.")
+            else:
+                try:
+                    notion_service = NotionService(notion_secret, database_id)
+                    
+                    # Title: replace underscores with spaces, remove extension
+                    title = os.path.splitext(os.path.basename(final_notes_path))[0].replace("_", " ")
+                    
+                    with open(final_notes_path, 'r', encoding='utf-8') as f:
+                        markdown_content = f.read()
+                    
+                    url = notion_service.create_page(title, markdown_content)
+                    if url:
+                        print(f"✅ Successfully pushed to Notion: {url}")
+                        pushed_to_notion = True
+                    else:
+                        print("❌ Notion push failed: No URL returned.")
+                except Exception as e:
+                    print(f"❌ Notion push failed with exception: {e}")
+
+        # 5.1 Rclone Integration (Post-generation)
+        pushed_to_rclone = False
+        if self.config.get("rclone_integration_enabled", False):
+            print(f"🚀 [5.1/5] Pushing to Rclone...")
+            remote_name, remote_path = self.rclone_config.get_credentials()
             
-            if is_pushed:
-                self.manager.update_job_status(job['id'], 'completed')
-                if can_cleanup_note:
-                    files_to_cleanup.append(final_notes_path)
-                    print(f"✅ Job '{job['name']}' completed and pushed to all enabled destinations!")
-                else:
-                    print(f"✅ Job '{job['name']}' completed (partial push success). Notes kept: {final_notes_path}")
+            if not remote_name:
+                print("⚠️ Rclone remote not configured. Skipping Rclone push.")
             else:
-                if notion_enabled or rclone_enabled:
-                    # If any was enabled but none succeeded
-                    self.manager.update_job_status(job['id'], 'completed_local_only')
-                    print(f"✅ Job '{job['name']}' completed locally (All push integrations failed). Notes: {final_notes_path}")
-                else:
-                    self.manager.update_job_status(job['id'], 'completed')
-                    print(f"✅ Job '{job['name']}' completed successfully! Notes: {final_notes_path}")
+                try:
+                    # Construct remote destination: remote:path/filename.md
+                    remote_dest = f"{remote_name}:{remote_path}"
+                    success, message = self.rclone_service.push_note(final_notes_path, remote_dest)
+                    
+                    if success:
+                        print(f"✅ Successfully pushed to Rclone: {remote_dest}")
+                        pushed_to_rclone = True
+                    else:
+                        print(f"❌ Rclone push failed: {message}")
+                except Exception as e:
+                    print(f"❌ Rclone push failed with exception: {e}")
 
-            FileCleanupService.cleanup_job_files(files_to_cleanup)
-            return True
+        # 6. Cleanup
+        print(f"🧹 Cleaning up intermediate files...")
+        files_to_cleanup = [audio_path, transcript_path, prepared_path]
+        for c in chunks:
+            if c not in files_to_cleanup:
+                files_to_cleanup.append(c)
+        
+        # Completion status determination
+        notion_enabled = self.config.get("notion_integration_enabled", False)
+        rclone_enabled = self.config.get("rclone_integration_enabled", False)
+        
+        # If at least one enabled integration was successful, we consider it pushed
+        is_pushed = (notion_enabled and pushed_to_notion) or (rclone_enabled and pushed_to_rclone)
+        
+        # If all ENABLED integrations succeeded, we can cleanup the final note
+        can_cleanup_note = True
+        if notion_enabled and not pushed_to_notion:
+            can_cleanup_note = False
+        if rclone_enabled and not pushed_to_rclone:
+            can_cleanup_note = False
+        
+        if is_pushed:
+            self.manager.update_job_status(job['id'], 'completed')
+            if can_cleanup_note:
+                files_to_cleanup.append(final_notes_path)
+                print(f"✅ Job '{job['name']}' completed and pushed to all enabled destinations!")
+            else:
+                print(f"✅ Job '{job['name']}' completed (partial push success). Notes kept: {final_notes_path}")
+        else:
+            if notion_enabled or rclone_enabled:
+                # If any was enabled but none succeeded
+                self.manager.update_job_status(job['id'], 'completed_local_only')
+                print(f"✅ Job '{job['name']}' completed locally (All push integrations failed). Notes: {final_notes_path}")
+            else:
+                self.manager.update_job_status(job['id'], 'completed')
+                print(f"✅ Job '{job['name']}' completed successfully! Notes: {final_notes_path}")
 
-        except Exception as e:
-            print(f"❌ Exception in pipeline for job {job['id']}: {e}")
-            self.manager.update_job_status(job['id'], 'failed')
-            return False
+        FileCleanupService.cleanup_job_files(files_to_cleanup)
+        return True
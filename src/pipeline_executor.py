@@ -0,0 +1,185 @@
+import logging
+import queue
+import threading
+from typing import Callable, Dict, List, Any, Optional
+
+from src.sqlite_job_manager import LeaseLostError
+
+logger = logging.getLogger(__name__)
+
+# Default number of jobs allowed in flight for each performance profile.
+PROFILE_JOB_CONCURRENCY = {
+    "low": 1,
+    "balanced": 2,
+    "high": 3,
+}
+
+class StagedPipelineExecutor:
+    """
+    Runs jobs through the pipeline stages with a separate worker pool per stage.
+    Stages are connected by bounded queues, so job N+1 can download while job N
+    is in ffmpeg and job N-1 is waiting on Gemini.
+    """
+    DEFAULT_STAGE_WORKERS = {
+        "download": 1,
+        "audio": 1,
+        "transcribe": 1,
+        "notes": 1,
+    }
+    DEFAULT_QUEUE_SIZE = 2
+
+    _STOP = object()
+
+    def __init__(self, pipeline, job_manager, max_workers: int = 1, stage_workers: Dict[str, int] = None, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.pipeline = pipeline
+        self.manager = job_manager
+        self.max_workers = max(1, int(max_workers))
+        self.stage_workers = dict(self.DEFAULT_STAGE_WORKERS)
+        for name, count in (stage_workers or {}).items():
+            self.stage_workers[name] = max(1, int(count))
+        self.queue_size = max(1, int(queue_size))
+
+    @staticmethod
+    def resolve_concurrency(config) -> int:
+        """
+        Returns the configured job concurrency.
+        Falls back to a default derived from the detected performance profile.
+        """
+        value = config.get("max_concurrent_jobs")
+        if value:
+            try:
+                return max(1, int(value))
+            except (TypeError, ValueError):
+                logger.warning(f"Invalid max_concurrent_jobs value: {value}. Using profile default.")
+        return PROFILE_JOB_CONCURRENCY.get(config.get("performance_profile"), 1)
+
+    @classmethod
+    def resolve_stage_concurrency(cls, pipeline, config) -> int:
+        """
+        Returns how many jobs may be in flight at once. An explicit
+        max_concurrent_jobs is honoured; otherwise at least one job per stage is
+        admitted, so a download never waits for another job's notes.
+        """
+        if config.get("max_concurrent_jobs"):
+            return cls.resolve_concurrency(config)
+        return max(cls.resolve_concurrency(config), len(pipeline.STAGES))
+
+    @classmethod
+    def from_config(cls, pipeline, job_manager, config):
+        """Builds an executor using the concurrency settings from config."""
+        stage_workers = dict(config.get("pipeline_stage_workers") or {})
+        # Downloads are budgeted by the download scheduler, so by default the
+        # stage runs as many of them as the scheduler admits at once
+        stage_workers.setdefault("download", config.get("download_max_concurrent", 3) or 1)
+        return cls(
+            pipeline,
+            job_manager,
+            max_workers=cls.resolve_stage_concurrency(pipeline, config),
+            stage_workers=stage_workers,
+            queue_size=config.get("pipeline_queue_size", cls.DEFAULT_QUEUE_SIZE) or cls.DEFAULT_QUEUE_SIZE,
+        )
+
+    def run(self, jobs: List[Dict[str, Any]], should_stop: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Dict[Any, bool]:
+        """
+        Executes all jobs stage by stage. At most max_workers jobs are admitted
+        into the pipeline at once; a job failing in any stage leaves the others running.
+        should_stop(job), if given, is checked before each of the job's stages;
+        once it returns True the job stops without its status being touched
+        (e.g. its lease passed to another worker).
+        Returns a mapping of job id to success.
+        """
+        results = {}
+        if not jobs:
+            return results
+
+        stage_names = [name for name, _ in self.pipeline.STAGES]
+        counts = [self.stage_workers.get(name, 1) for name in stage_names]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in stage_names]
+        remaining = list(counts)
+        state_lock = threading.Lock()
+        admission = threading.BoundedSemaphore(self.max_workers)
+
+        def mark_failed(job):
+            try:
+                self.manager.update_job_status(job['id'], 'failed')
+            except Exception as e:
+                print(f"⚠️ Could not mark job '{job['name']}' as failed: {e}")
+
+        def finish(job, success):
+            with state_lock:
+                results[job['id']] = success
+            try:
+                # Progress is journaled as it happens; compact it between jobs
+                self.manager.checkpoint()
+            except Exception as e:
+                print(f"⚠️ Could not checkpoint job history: {e}")
+            finally:
+                if not success:
+                    print(f"⚠️ Job '{job['name']}' failed. Continuing with remaining jobs...")
+                admission.release()
+
+        def feeder():
+            try:
+                for job in jobs:
+                    admission.acquire()
+                    print(f"\n--- Processing Job: {job['name']} ---")
+                    try:
+                        ctx = self.pipeline.new_context()
+                    except Exception as e:
+                        print(f"❌ Exception in pipeline for job {job['id']}: {e}")
+                        mark_failed(job)
+                        finish(job, False)
+                        continue
+                    queues[0].put((job, ctx))
+            finally:
+                for _ in range(counts[0]):
+                    queues[0].put(self._STOP)
+
+        def worker(index):
+            stage_name = stage_names[index]
+            is_last = index == len(stage_names) - 1
+            try:
+                while True:
+                    item = queues[index].get()
+                    if item is self._STOP:
+                        break
+                    job, ctx = item
+                    if should_stop is not None and should_stop(job):
+                        print(f"⏹️ Stopping job {job['id']} before stage '{stage_name}'.")
+                        finish(job, False)
+                        continue
+                    try:
+                        success = self.pipeline.run_stage(stage_name, job, ctx)
+                    except LeaseLostError as e:
+                        # Another worker owns the job now; leave its status to them
+                        print(f"⚠️ Stopped job '{job['name']}': {e}")
+                        success = False
+                    except Exception as e:
+                        print(f"❌ Unhandled exception for job '{job['name']}' in stage '{stage_name}': {e}")
+                        mark_failed(job)
+                        success = False
+
+                    if success and not is_last:
+                        queues[index + 1].put((job, ctx))
+                    else:
+                        finish(job, success)
+            finally:
+                # The last worker of a stage to exit shuts down the next stage,
+                # even if this one died, so the batch can never hang on a stage
+                with state_lock:
+                    remaining[index] -= 1
+                    shutdown_next = remaining[index] == 0 and not is_last
+                if shutdown_next:
+                    for _ in range(counts[index + 1]):
+                        queues[index + 1].put(self._STOP)
+
+        threads = [threading.Thread(target=feeder, name="zaknotes-feeder", daemon=True)]
+        for index, stage_name in enumerate(stage_names):
+            for n in range(counts[index]):
+                threads.append(threading.Thread(target=worker, args=(index,), name=f"zaknotes-{stage_name}-{n}", daemon=True))
+
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rough token estimates used before the server reports real counts
+CHARS_PER_TOKEN = 4
+AUDIO_TOKENS_PER_SECOND = 32
+# Prepared chunks are 48 kbit/s MP3
+AUDIO_BYTES_PER_SECOND = 48000 / 8
+
+class TokenBucket:
+    """
+    A bucket holding up to capacity tokens, refilled at capacity per period seconds.
+    Not thread-safe on its own; RateLimiter serializes access.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount tokens are available (0 if they are now)."""
+        self._refill(now)
+        # A single request larger than the bucket only needs a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float):
+        """Adds (or, if negative, removes) tokens; the balance may go into debt."""
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+class RateLimiter:
+    """
+    Client-side requests-per-minute and tokens-per-minute limits per (account, model).
+    Callers await acquire() before each send, so requests are spread out at the
+    quota rate instead of bursting into 429s. Token usage is estimated up front
+    and corrected with the real counts via settle().
+
+    limits maps a model name (or "default") to {"rpm": int, "tpm": int}; either
+    may be omitted. Models without limits are not paced.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None):
+        self.limits = limits or {}
+        self._buckets: Dict[Tuple[str, str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        limits = config.get("api_rate_limits") or {}
+        return cls(limits if isinstance(limits, dict) else {})
+
+    @staticmethod
+    def estimate_tokens(text_chars: int = 0, audio_bytes: int = 0) -> int:
+        """Estimates the prompt tokens of a request from its text length and audio size."""
+        audio_seconds = audio_bytes / AUDIO_BYTES_PER_SECOND
+        return int(text_chars / CHARS_PER_TOKEN + audio_seconds * AUDIO_TOKENS_PER_SECOND)
+
+    def _limits_for(self, model: str) -> Dict[str, float]:
+        return self.limits.get(model) or self.limits.get("default") or {}
+
+    def _bucket(self, account: str, model: str, kind: str) -> Optional[TokenBucket]:
+        limit = self._limits_for(model).get(kind)
+        if not limit:
+            return None
+        key = (account, model, kind)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(limit)
+        return bucket
+
+    def try_acquire(self, account: str, model: str, tokens: int = 0) -> float:
+        """
+        Takes one request and tokens from the (account, model) buckets if both are
+        available. Returns 0 on success, otherwise the seconds to wait before retrying.
+        """
+        with self._lock:
+            now = time.monotonic()
+            requests = self._bucket(account, model, "rpm")
+            token_bucket = self._bucket(account, model, "tpm")
+            wait = 0.0
+            if requests is not None:
+                wait = max(wait, requests.wait_time(1, now))
+            if token_bucket is not None and tokens:
+                wait = max(wait, token_bucket.wait_time(tokens, now))
+            if wait > 0:
+                return wait
+            if requests is not None:
+                requests.take(1)
+            if token_bucket is not None and tokens:
+                token_bucket.take(tokens)
+            return 0.0
+
+    async def acquire(self, account: str, model: str, tokens: int = 0):
+        """Waits until the request fits within the account's limits for model, then takes it."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(account, model, tokens)
+            if wait <= 0:
+                if waited >= 1:
+                    logger.info(f"Paced request for {account} ({model}) by {waited:.1f}s to stay within quota.")
+                return
+            waited += wait
+            await asyncio.sleep(wait)
+
+    def settle(self, account: str, model: str, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Corrects the token bucket once the real token count of a request is known."""
+        if actual_tokens is None:
+            return
+        with self._lock:
+            bucket = self._bucket(account, model, "tpm")
+            if bucket is not None:
+                bucket.adjust(estimated_tokens - actual_tokens)
@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache for model outputs.
+    Entries are text files named by key. An entry's mtime is its write time and
+    its atime its last use: entries older than ttl_seconds are treated as misses,
+    and the least recently used entries are evicted once the cache grows past
+    max_size_mb.
+    """
+    HASH_BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_dir: str, max_size_mb: float = 500, ttl_seconds: Optional[float] = None):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(float(max_size_mb) * 1024 * 1024)
+        self.ttl_seconds = float(ttl_seconds) if ttl_seconds else None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size_bytes = None
+
+    @classmethod
+    def from_config(cls, config, prefix: str, default_dir: str, max_size_mb: float, ttl_hours: float = None):
+        """Creates a cache from the '<prefix>_*' config keys, or returns None if it is disabled."""
+        if not config.get(f"{prefix}_enabled", True):
+            return None
+        try:
+            max_size_mb = float(config.get(f"{prefix}_max_mb", max_size_mb))
+            ttl = config.get(f"{prefix}_ttl_hours", ttl_hours)
+            ttl_seconds = float(ttl) * 3600 if ttl else None
+        except (TypeError, ValueError):
+            print(f"⚠️ Invalid {prefix} settings in config. Using defaults.")
+            ttl_seconds = ttl_hours * 3600 if ttl_hours else None
+        return cls(config.get(f"{prefix}_dir", default_dir), max_size_mb=max_size_mb, ttl_seconds=ttl_seconds)
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Builds a cache key from the given parts (e.g. content hash, model, prompt)."""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Returns the SHA-256 hex digest of a string."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def hash_file(cls, file_path: str) -> str:
+        """Returns the SHA-256 hex digest of a file's bytes, read in blocks."""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(cls.HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def _entries(self):
+        """Yields (path, size, last_used) for every entry in the cache."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".txt"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_atime
+
+    def _current_size(self) -> int:
+        if self._size_bytes is None:
+            self._size_bytes = sum(size for _, size, _ in self._entries())
+        return self._size_bytes
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached value for key, or None on a miss."""
+        path = self._path(key)
+        with self._lock:
+            try:
+                st = os.stat(path)
+                now = time.time()
+                if self.ttl_seconds is not None and now - st.st_mtime > self.ttl_seconds:
+                    self._remove(path, st.st_size)
+                    self.misses += 1
+                    return None
+                with open(path, "r", encoding="utf-8") as f:
+                    value = f.read()
+                # Mark as recently used without changing the write time
+                os.utime(path, (now, st.st_mtime))
+            except (FileNotFoundError, OSError):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    def invalidate(self, key: str):
+        """Removes the entry for key, if any."""
+        path = self._path(key)
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return
+            self._remove(path, size)
+
+    def _remove(self, path: str, size: int):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        if self._size_bytes is not None:
+            self._size_bytes -= size
+
+    def put(self, key: str, value: str):
+        """Stores value under key, evicting least recently used entries if needed."""
+        path = self._path(key)
+        data = value.encode("utf-8")
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                size = self._current_size()
+                if os.path.exists(path):
+                    size -= os.path.getsize(path)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self._size_bytes = size + len(data)
+                self._evict()
+            except OSError as e:
+                logger.error(f"Error writing cache entry {key}: {e}")
+
+    def _evict(self):
+        if self._size_bytes <= self.max_size_bytes:
+            return
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        for path, size, _ in entries:
+            if self._size_bytes <= self.max_size_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size_bytes -= size
+            logger.debug(f"Evicted cache entry {os.path.basename(path)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters and the current size of the cache."""
+        with self._lock:
+            entries = list(self._entries())
+            self._size_bytes = sum(size for _, size, _ in entries)
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "entries": len(entries),
+                "size_bytes": self._size_bytes,
+            }
@@ -0,0 +1,371 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+from src.job_manager import JobManager, HISTORY_FILE, JOURNAL_FILE
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = "history.db"
+
+class LeaseLostError(Exception):
+    """Raised when a job's lease has passed to another worker, so this one must stop writing to it."""
+
+class SqliteJobManager(JobManager):
+    """
+    JobManager backed by a SQLite database in WAL mode.
+    Jobs are stored as JSON documents with indexed id, status and added_at
+    columns, so lookups and status updates do not scan or rewrite the history.
+    Job dicts returned from queries are copies; persist changes through the
+    manager's methods.
+
+    Several worker processes can share one database: claim_next_job hands each
+    job to one worker under a time-limited lease, which the worker renews while
+    it runs. A job whose lease expires (e.g. the worker crashed) can be claimed
+    again and resumes from its last granular state. Once another worker holds
+    the lease, status and field updates for the job from this manager raise
+    LeaseLostError instead of overwriting the new owner's progress.
+    """
+    LEASE_SECONDS = 300
+    # Statuses a worker may claim. Failed jobs are only retried on request.
+    CLAIMABLE_STATUSES = [status for status in JobManager.RETRY_STATUSES if status != 'failed']
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT '',
+            added_at TEXT,
+            data TEXT NOT NULL,
+            lease_owner TEXT,
+            lease_expires REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+        CREATE INDEX IF NOT EXISTS idx_jobs_added_at ON jobs(added_at);
+    """
+
+    def __init__(self, db_path: str = DB_FILE):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        # Job id -> owner, for the leases taken through this manager
+        self._leases: Dict[str, str] = {}
+        # Wait for other processes' write transactions instead of failing
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._add_missing_columns()
+        self.migrate_from_json()
+
+    def _add_missing_columns(self):
+        """Upgrades databases created before leases were added."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, decl in (("lease_owner", "TEXT"), ("lease_expires", "REAL")):
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Storage helpers ---
+
+    @staticmethod
+    def _row_values(job: Dict[str, Any]):
+        return (str(job.get('id')), job.get('status', ''), job.get('added_at'), json.dumps(job))
+
+    def _insert(self, jobs: List[Dict[str, Any]]):
+        self._conn.executemany(
+            "INSERT INTO jobs (id, status, added_at, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET status=excluded.status, added_at=excluded.added_at, data=excluded.data",
+            [self._row_values(job) for job in jobs],
+        )
+
+    def _update(self, job: Dict[str, Any]):
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, data = ? WHERE id = ?",
+            (job.get('status', ''), json.dumps(job), str(job.get('id'))),
+        )
+
+    def _select(self, where: str = "", params=()) -> List[Dict[str, Any]]:
+        rows = self._conn.execute(f"SELECT data FROM jobs {where} ORDER BY seq", params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _matching_clause(self, statuses: List[str]):
+        """Returns a WHERE condition and params matching statuses or a TRANSCRIBING_CHUNK_N state."""
+        placeholders = ", ".join("?" for _ in statuses)
+        # A range on the prefix lets SQLite use the status index (LIKE would not)
+        prefix = self.CHUNK_STATUS_PREFIX
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return f"(status IN ({placeholders}) OR (status >= ? AND status < ?))", (*statuses, prefix, upper)
+
+    def _select_matching(self, statuses: List[str], unleased_only: bool = False) -> List[Dict[str, Any]]:
+        """Returns jobs whose status is in statuses or is a TRANSCRIBING_CHUNK_N state."""
+        clause, params = self._matching_clause(statuses)
+        if unleased_only:
+            clause += " AND (lease_expires IS NULL OR lease_expires < ?)"
+            params = (*params, time.time())
+        return self._select(f"WHERE {clause}", params)
+
+    # --- JobManager interface ---
+
+    @property
+    def history(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._select()
+
+    @history.setter
+    def history(self, jobs: List[Dict[str, Any]]):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM jobs")
+                self._insert(jobs)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def load_history(self):
+        # Jobs are read from the database on demand
+        pass
+
+    def save_history(self):
+        # Every change is committed as it is made
+        pass
+
+    def checkpoint(self):
+        """Copies committed WAL pages back into the main database file."""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def add_job_records(self, jobs):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._insert(jobs)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get_job(self, job_id) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            jobs = self._select("WHERE id = ?", (str(job_id),))
+        return jobs[0] if jobs else None
+
+    def get_pending_from_last_150(self):
+        """Returns pending jobs, skipping jobs currently leased by a worker."""
+        with self._lock:
+            return self._select_matching(self.RETRY_STATUSES, unleased_only=True)
+
+    def _modify(self, job_id, change) -> bool:
+        """
+        Applies change to a job's stored document in one write transaction.
+        Raises LeaseLostError if this manager leased the job and another owner holds it now.
+        """
+        job_id = str(job_id)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT data, lease_owner FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return False
+                owner = self._leases.get(job_id)
+                if owner is not None and row[1] != owner:
+                    raise LeaseLostError(f"Job {job_id} is now leased by {row[1] or 'nobody'}, not {owner}")
+                job = json.loads(row[0])
+                change(job)
+                self._update(job)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return True
+
+    def update_job_status(self, job_id, status):
+        return self._modify(job_id, lambda job: job.update(self._status_fields(job.get('status'), status)))
+
+    def update_job_fields(self, job_id, fields):
+        return self._modify(job_id, lambda job: job.update(fields))
+
+    def _bulk_update(self, statuses: List[str], change):
+        """Applies change to matching jobs, leaving jobs a worker currently holds a lease on alone."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for job in self._select_matching(statuses, unleased_only=True):
+                    change(job)
+                    self._update(job)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def cancel_pending(self):
+        """Cancel ALL pending, failed, and stuck jobs in history"""
+        self._bulk_update(self.RETRY_STATUSES, lambda job: job.update(status='cancelled'))
+
+    def fail_pending(self):
+        """Mark ALL pending, downloading, or processing jobs as failed"""
+        def fail(job):
+            status = job.get('status', '')
+            # Preserve the current state in a separate field if it's granular
+            if status not in ['queue', 'downloading', 'processing']:
+                job['last_granular_state'] = status
+            job['status'] = 'failed'
+        self._bulk_update(self.INTERRUPTED_STATUSES, fail)
+
+    # --- Leases ---
+
+    @staticmethod
+    def default_owner() -> str:
+        """Returns an owner id that is unique per worker process."""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def claim_next_job(self, owner: str, lease_seconds: float = None) -> Optional[Dict[str, Any]]:
+        """
+        Atomically leases the oldest claimable job to owner and returns it,
+        or returns None when no unleased job is waiting.
+        """
+        lease_seconds = lease_seconds or self.LEASE_SECONDS
+        clause, params = self._matching_clause(self.CLAIMABLE_STATUSES)
+        with self._lock:
+            now = time.time()
+            # IMMEDIATE takes the write lock up front, so two processes cannot pick the same row
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT id, data, lease_owner FROM jobs WHERE {clause} "
+                    "AND (lease_expires IS NULL OR lease_expires < ?) ORDER BY seq LIMIT 1",
+                    (*params, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET lease_owner = ?, lease_expires = ? WHERE id = ?",
+                    (owner, now + lease_seconds, row[0]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._leases[str(row[0])] = owner
+        job = json.loads(row[1])
+        if row[2] and row[2] != owner:
+            logger.warning(f"Reclaimed job {job.get('id')} from expired lease held by {row[2]} (status: {job.get('status')})")
+        return job
+
+    def claim_job(self, job_id, owner: str, lease_seconds: float = None) -> Optional[Dict[str, Any]]:
+        """
+        Leases a specific job to owner and returns it, or returns None if the
+        job does not exist or another owner holds an unexpired lease on it.
+        """
+        lease_seconds = lease_seconds or self.LEASE_SECONDS
+        job_id = str(job_id)
+        with self._lock:
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET lease_owner = ?, lease_expires = ? WHERE id = ? "
+                    "AND (lease_owner IS NULL OR lease_owner = ? OR lease_expires IS NULL OR lease_expires < ?)",
+                    (owner, now + lease_seconds, job_id, owner, now),
+                )
+                row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone() if cursor.rowcount else None
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if row is None:
+                return None
+            self._leases[job_id] = owner
+        return json.loads(row[0])
+
+    def renew_lease(self, job_id, owner: str, lease_seconds: float = None) -> bool:
+        """Extends owner's lease on a job. Returns False if the lease was lost."""
+        lease_seconds = lease_seconds or self.LEASE_SECONDS
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ?",
+                (time.time() + lease_seconds, str(job_id), owner),
+            )
+            return cursor.rowcount == 1
+
+    def release_job(self, job_id, owner: str) -> bool:
+        """Ends owner's lease on a job so other workers may claim it again."""
+        with self._lock:
+            self._leases.pop(str(job_id), None)
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_owner = NULL, lease_expires = NULL WHERE id = ? AND lease_owner = ?",
+                (str(job_id), owner),
+            )
+            return cursor.rowcount == 1
+
+    # --- Migration ---
+
+    def migrate_from_json(self) -> int:
+        """
+        One-shot import of history.json (and its journal) into an empty database.
+        The JSON files are renamed with a '.migrated' suffix afterwards.
+        Returns the number of jobs imported.
+        """
+        with self._lock:
+            if not (os.path.exists(HISTORY_FILE) or os.path.exists(JOURNAL_FILE)):
+                return 0
+            if self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]:
+                return 0
+            jobs = JobManager().history
+            self.add_job_records(jobs)
+            for path in (HISTORY_FILE, JOURNAL_FILE):
+                if os.path.exists(path):
+                    os.replace(path, path + ".migrated")
+        print(f"📦 Migrated {len(jobs)} jobs from {HISTORY_FILE} to {self.db_path}")
+        return len(jobs)
+
+
+class LeaseHeartbeat:
+    """
+    Renews a job lease from a background thread while the job runs.
+    Use as a context manager around the job's execution; the lease is released on exit.
+    lost turns True once another owner has taken the lease; the job should stop then.
+    """
+
+    def __init__(self, manager: SqliteJobManager, job_id, owner: str, lease_seconds: float = None, interval: float = None):
+        self.manager = manager
+        self.job_id = job_id
+        self.owner = owner
+        self.lease_seconds = lease_seconds or manager.LEASE_SECONDS
+        # Renew well before expiry so one missed beat does not lose the lease
+        self.interval = interval or self.lease_seconds / 3
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.manager.renew_lease(self.job_id, self.owner, self.lease_seconds):
+                    self.lost = True
+                    logger.warning(f"Lost lease on job {self.job_id}; another worker may pick it up.")
+                    return
+            except sqlite3.Error as e:
+                logger.error(f"Failed to renew lease on job {self.job_id}: {e}")
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name=f"zaknotes-lease-{self.job_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.manager.release_job(self.job_id, self.owner)
+        return False
@@ -1,42 +1,230 @@
 import json
+import math
 import os
+import time
+import atexit
+import threading
 import logging
-from typing import Dict
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; flushes are then only atomic, not merged under a lock
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
+# Gemini bills audio input at 32 tokens per second
+AUDIO_TOKENS_PER_SECOND = 32
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of values, or None if there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
 class UsageTracker:
-    def __init__(self, usage_file: str = "usage_stats.json"):
+    """
+    Counts requests per account and model, and keeps per-call metrics (tokens,
+    audio seconds, bytes sent, latency, time to first byte) in hourly buckets.
+    Increments are batched in memory and flushed to usage_file (and the metrics
+    file next to it) at most once per flush_interval seconds and at interpreter
+    exit. A flush merges the pending increments into whatever is on disk under a
+    file lock, so other trackers and processes writing the same file do not lose
+    updates.
+    """
+    BUCKET_FORMAT = "%Y-%m-%dT%H"
+    # Latency samples kept per bucket, model and account for percentiles
+    MAX_SAMPLES_PER_BUCKET = 500
+    METRICS_RETENTION_HOURS = 24 * 7
+
+    def __init__(self, usage_file: str = "usage_stats.json", flush_interval: float = 5.0, metrics_file: Optional[str] = None):
         self.usage_file = usage_file
+        self.metrics_file = metrics_file or os.path.splitext(usage_file)[0] + ".metrics.json"
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, int]] = {}
+        self._pending_metrics: Dict[str, Any] = {}
+        self._timer: Optional[threading.Timer] = None
         self.stats = self._load_stats()
+        atexit.register(self.flush)
 
-    def _load_stats(self) -> Dict[str, Dict[str, int]]:
-        if not os.path.exists(self.usage_file):
+    @staticmethod
+    def _load_json(path: str) -> Dict[str, Any]:
+        if not os.path.exists(path):
             return {}
         try:
-            with open(self.usage_file, 'r') as f:
+            with open(path, 'r') as f:
                 return json.load(f)
         except (json.JSONDecodeError, IOError):
             return {}
 
-    def _save_stats(self):
+    def _load_stats(self) -> Dict[str, Dict[str, int]]:
+        return self._load_json(self.usage_file)
+
+    @staticmethod
+    def _add(target: Dict[str, Dict[str, int]], deltas: Dict[str, Dict[str, int]]):
+        for email, models in deltas.items():
+            bucket = target.setdefault(email, {})
+            for model_name, count in models.items():
+                bucket[model_name] = bucket.get(model_name, 0) + count
+
+    @classmethod
+    def _add_metrics(cls, target: Dict[str, Any], deltas: Dict[str, Any]):
+        """Merges bucket -> model -> email metric records from deltas into target."""
+        for bucket, models in deltas.items():
+            for model_name, accounts in models.items():
+                for email, record in accounts.items():
+                    into = target.setdefault(bucket, {}).setdefault(model_name, {}).setdefault(email, {})
+                    for field, value in record.items():
+                        if isinstance(value, list):
+                            into[field] = (into.get(field, []) + value)[-cls.MAX_SAMPLES_PER_BUCKET:]
+                        else:
+                            into[field] = into.get(field, 0) + value
+
+    def _prune_metrics(self, metrics: Dict[str, Any]):
+        cutoff = time.strftime(self.BUCKET_FORMAT, time.gmtime(time.time() - self.METRICS_RETENTION_HOURS * 3600))
+        for bucket in [b for b in metrics if b < cutoff]:
+            del metrics[bucket]
+
+    def _write_merged(self, path: str, deltas: Dict[str, Any], merge: Callable[[Dict, Dict], None]) -> Dict[str, Any]:
+        """Merges deltas into the JSON file at path and atomically replaces it. Returns the result."""
+        lock_file = None
         try:
-            with open(self.usage_file, 'w') as f:
-                json.dump(self.stats, f, indent=4)
-        except IOError as e:
-            logger.error(f"Error saving usage stats: {e}")
+            if fcntl is not None:
+                lock_file = open(path + ".lock", 'w')
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            merged = self._load_json(path)
+            merge(merged, deltas)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(merged, f, indent=4)
+            os.replace(tmp_path, path)
+            return merged
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    def _merge_metrics(self, merged: Dict[str, Any], deltas: Dict[str, Any]):
+        self._add_metrics(merged, deltas)
+        self._prune_metrics(merged)
+
+    def flush(self):
+        """Writes pending increments to disk now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending:
+                deltas, self._pending = self._pending, {}
+                try:
+                    self.stats = self._write_merged(self.usage_file, deltas, self._add)
+                except (IOError, OSError) as e:
+                    logger.error(f"Error saving usage stats: {e}")
+                    # Keep the increments for the next flush
+                    self._add(self._pending, deltas)
+            if self._pending_metrics:
+                deltas, self._pending_metrics = self._pending_metrics, {}
+                try:
+                    self._write_merged(self.metrics_file, deltas, self._merge_metrics)
+                except (IOError, OSError) as e:
+                    logger.error(f"Error saving usage metrics: {e}")
+                    self._add_metrics(self._pending_metrics, deltas)
+
+    def _schedule_flush(self):
+        # Debounce: the first increment after a flush schedules the next one
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
 
     def record_usage(self, email: str, model_name: str):
         """Records a single request for a given email and model."""
-        if email not in self.stats:
-            self.stats[email] = {}
-        
-        if model_name not in self.stats[email]:
-            self.stats[email][model_name] = 0
-            
-        self.stats[email][model_name] += 1
-        self._save_stats()
+        with self._lock:
+            self._add(self.stats, {email: {model_name: 1}})
+            self._add(self._pending, {email: {model_name: 1}})
+            self._schedule_flush()
+
+    def record_call(self, email: str, model_name: str, duration: float, ttfb: Optional[float] = None,
+                    request_bytes: int = 0, usage_metadata: Optional[Dict[str, Any]] = None):
+        """
+        Records metrics for one completed API call.
+        usage_metadata is the 'usageMetadata' object from the Gemini response.
+        """
+        usage_metadata = usage_metadata or {}
+        audio_tokens = sum(
+            d.get("tokenCount", 0) for d in usage_metadata.get("promptTokensDetails", [])
+            if d.get("modality") == "AUDIO"
+        )
+        record = {
+            "calls": 1,
+            "prompt_tokens": usage_metadata.get("promptTokenCount", 0),
+            "output_tokens": usage_metadata.get("candidatesTokenCount", 0),
+            "audio_tokens": audio_tokens,
+            "bytes_sent": request_bytes,
+            "duration_total": duration,
+            "latencies": [round(duration, 3)],
+        }
+        if ttfb is not None:
+            record["ttfbs"] = [round(ttfb, 3)]
+        bucket = time.strftime(self.BUCKET_FORMAT, time.gmtime())
+        with self._lock:
+            self._add_metrics(self._pending_metrics, {bucket: {model_name: {email: record}}})
+            self._schedule_flush()
+
+    def get_metrics_summary(self, since_hours: float = 24) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Summarizes recorded calls per model and account over the last since_hours:
+        call count, token and byte totals, audio seconds, p50/p95 latency and time
+        to first byte (seconds), and output tokens per second of request time.
+        """
+        cutoff = time.strftime(self.BUCKET_FORMAT, time.gmtime(time.time() - since_hours * 3600))
+        with self._lock:
+            metrics = self._load_json(self.metrics_file)
+            self._add_metrics(metrics, self._pending_metrics)
+
+        combined: Dict[str, Any] = {}
+        for bucket, models in metrics.items():
+            if bucket >= cutoff:
+                self._add_metrics(combined, {"all": models})
+
+        summary = {}
+        for model_name, accounts in combined.get("all", {}).items():
+            for email, r in accounts.items():
+                duration_total = r.get("duration_total", 0)
+                summary.setdefault(model_name, {})[email] = {
+                    "calls": r.get("calls", 0),
+                    "prompt_tokens": r.get("prompt_tokens", 0),
+                    "output_tokens": r.get("output_tokens", 0),
+                    "audio_seconds": r.get("audio_tokens", 0) / AUDIO_TOKENS_PER_SECOND,
+                    "bytes_sent": r.get("bytes_sent", 0),
+                    "latency_p50": _percentile(r.get("latencies", []), 50),
+                    "latency_p95": _percentile(r.get("latencies", []), 95),
+                    "ttfb_p50": _percentile(r.get("ttfbs", []), 50),
+                    "ttfb_p95": _percentile(r.get("ttfbs", []), 95),
+                    "tokens_per_second": (r.get("output_tokens", 0) / duration_total) if duration_total else 0.0,
+                }
+        return summary
 
     def get_usage_report(self) -> Dict[str, Dict[str, int]]:
-        """Returns the full usage statistics."""
-        return self.stats
+        """Returns the full usage statistics, including other processes' flushed counts."""
+        with self._lock:
+            report = self._load_stats()
+            self._add(report, self._pending)
+            self.stats = report
+            return report
+
+
+_shared_trackers: Dict[str, UsageTracker] = {}
+_shared_trackers_lock = threading.Lock()
+
+def get_shared_tracker(usage_file: str = "usage_stats.json") -> UsageTracker:
+    """Returns the process-wide tracker for usage_file."""
+    key = os.path.abspath(usage_file)
+    with _shared_trackers_lock:
+        if key not in _shared_trackers:
+            _shared_trackers[key] = UsageTracker(usage_file)
+        return _shared_trackers[key]
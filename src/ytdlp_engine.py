@@ -0,0 +1,163 @@
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import yt_dlp
+from yt_dlp import YoutubeDL
+
+logger = logging.getLogger(__name__)
+
+# Options whose values change with every job; they are applied to a reused
+# instance per download instead of forcing a new one
+PER_JOB_OPTIONS = ("-o", "--output", "--referer")
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+def _mtime(path: Optional[str]) -> Optional[float]:
+    return os.path.getmtime(path) if path and os.path.exists(path) else None
+
+class _Session:
+    """A YoutubeDL instance plus the progress callback of the job it is running."""
+
+    def __init__(self, ydl_opts: Dict[str, Any]):
+        self.on_progress: Optional[ProgressCallback] = None
+        self.cookie_file = ydl_opts.get("cookiefile")
+        # The cookie file version this instance has loaded
+        self.cookie_mtime = _mtime(self.cookie_file)
+        opts = dict(ydl_opts, quiet=True, noprogress=True, progress_hooks=[self._hook])
+        self.ydl = YoutubeDL(opts)
+
+    def _hook(self, d: Dict[str, Any]):
+        if self.on_progress is None:
+            return
+        try:
+            self.on_progress({
+                "status": d.get("status"),
+                "downloaded_bytes": d.get("downloaded_bytes"),
+                "total_bytes": d.get("total_bytes") or d.get("total_bytes_estimate"),
+                "speed": d.get("speed"),
+                "eta": d.get("eta"),
+                "fragment_index": d.get("fragment_index"),
+                "fragment_count": d.get("fragment_count"),
+                "filename": d.get("filename"),
+            })
+        except Exception as e:
+            # A broken progress consumer must not abort the download
+            logger.debug(f"Progress callback failed: {e}")
+
+    def save_cookies(self):
+        """Writes the session's cookies back to its cookie file, like the CLI does on exit."""
+        self.ydl.save_cookies()
+        self.cookie_mtime = _mtime(self.cookie_file)
+
+    def close(self):
+        try:
+            self.ydl.close()
+        except Exception:
+            pass
+
+    def apply_job_options(self, ydl_opts: Dict[str, Any]):
+        self.ydl.params["outtmpl"] = dict(self.ydl.params.get("outtmpl") or {}, **(ydl_opts.get("outtmpl") or {}))
+        self.ydl.params["http_headers"].update(ydl_opts.get("http_headers") or {})
+
+class YtDlpEngine:
+    """
+    Runs yt-dlp in-process. Command-line style arguments are parsed with
+    yt_dlp.parse_options, and YoutubeDL instances are pooled per site profile
+    and option set, so a download skips interpreter start-up and extractor
+    imports and reuses an already configured instance. An instance serves one
+    download at a time; concurrent downloads get their own. Cookies are saved
+    after each successful download, and pooled instances are replaced once
+    their cookie file changes on disk (e.g. after Refresh Cookies).
+    """
+
+    def __init__(self):
+        self._idle: Dict[Tuple, List[_Session]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _signature(args: List[str], urls: List[str]) -> Tuple[str, ...]:
+        """The arguments that define an instance: everything but URLs and per-job options."""
+        signature = []
+        skip_next = False
+        for arg in args:
+            if skip_next:
+                skip_next = False
+                continue
+            if arg in PER_JOB_OPTIONS:
+                skip_next = True
+                continue
+            if arg in urls:
+                continue
+            signature.append(arg)
+        return tuple(signature)
+
+    def _acquire(self, key: Tuple, ydl_opts: Dict[str, Any]) -> _Session:
+        mtime = _mtime(ydl_opts.get("cookiefile"))
+        stale = []
+        session = None
+        with self._lock:
+            idle = self._idle.get(key) or []
+            while idle:
+                candidate = idle.pop()
+                if candidate.cookie_mtime == mtime:
+                    session = candidate
+                    break
+                stale.append(candidate)
+        for candidate in stale:
+            candidate.close()
+        return session or _Session(ydl_opts)
+
+    def _release(self, key: Tuple, session: _Session):
+        with self._lock:
+            self._idle.setdefault(key, []).append(session)
+
+    def run(self, args: List[str], profile: str = "fallback", on_progress: Optional[ProgressCallback] = None):
+        """
+        Downloads the URLs in args (yt-dlp command-line arguments, without the
+        program name). Raises an Exception with yt-dlp's error message on failure.
+        """
+        parsed = yt_dlp.parse_options(args)
+        key = (profile, self._signature(args, parsed.urls))
+        session = self._acquire(key, parsed.ydl_opts)
+        session.apply_job_options(parsed.ydl_opts)
+        session.on_progress = on_progress
+        try:
+            if session.ydl.download(parsed.urls):
+                raise Exception(f"yt-dlp reported errors downloading {', '.join(parsed.urls)}")
+        except BaseException as e:
+            # Drop the instance: its state after a failure is not worth trusting
+            session.on_progress = None
+            session.close()
+            if isinstance(e, Exception):
+                raise Exception(str(e)) from e
+            raise
+        session.on_progress = None
+        try:
+            session.save_cookies()
+        except Exception as e:
+            logger.warning(f"Could not save cookies to {session.cookie_file}: {e}")
+            session.close()
+            return
+        self._release(key, session)
+
+    def close(self):
+        """Closes all idle instances."""
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle = {}
+        for session in sessions:
+            session.close()
+
+
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+def get_shared_engine() -> YtDlpEngine:
+    """Returns the process-wide yt-dlp engine."""
+    global _shared_engine
+    with _shared_engine_lock:
+        if _shared_engine is None:
+            _shared_engine = YtDlpEngine()
+        return _shared_engine
@@ -0,0 +1,26 @@
+import json
+
+
+class FakeStreamResponse:
+    """Minimal stand-in for the response yielded by httpx.AsyncClient.stream()."""
+    def __init__(self, status_code=200, lines=(), text="", headers=None):
+        self.status_code = status_code
+        self.lines = list(lines)
+        self.text = text
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def aiter_lines(self):
+        for line in self.lines:
+            yield line
+
+    async def aread(self):
+        return self.text.encode()
+
+    def json(self):
+        return json.loads(self.text)
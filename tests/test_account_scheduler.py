@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import pytest
+from unittest.mock import MagicMock, AsyncMock, patch
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.account_scheduler import AccountScheduler
+from src.gemini_api_wrapper import GeminiAPIWrapper
+from conftest import FakeStreamResponse
+
+def make_auth(*emails):
+    auth = MagicMock()
+    auth.accounts = [{"email": e, "status": "valid", "projectId": "p", "access": "t"} for e in emails]
+    auth.accounts.append({"email": "expired@example.com", "status": "invalid"})
+    auth.get_valid_account = AsyncMock(side_effect=lambda acc: acc)
+    return auth
+
+def test_picks_account_with_most_headroom():
+    scheduler = AccountScheduler(make_auth("a", "b"))
+    scheduler.request_started("a")
+    # "a" is busy, so "b" is chosen
+    assert scheduler.next_account()["email"] == "b"
+    scheduler.request_finished("a")
+    # Both idle; "a" has fewer recent requests
+    assert scheduler.next_account()["email"] == "a"
+    # Invalid accounts are never scheduled
+    emails = {scheduler.next_account()["email"] for _ in range(6)}
+    assert emails == {"a", "b"}
+
+def test_rate_limited_account_cools_down():
+    scheduler = AccountScheduler(make_auth("a", "b"), base_cooldown=30, max_cooldown=100)
+    assert scheduler.record_rate_limited("a") == 30
+    assert all(scheduler.next_account()["email"] == "b" for _ in range(5))
+
+    # Consecutive 429s double the window up to the maximum
+    assert scheduler.record_rate_limited("b") == 30
+    assert scheduler.record_rate_limited("b") == 60
+    assert scheduler.record_rate_limited("b") == 100
+    assert scheduler.next_account() is None
+    assert 25 < scheduler.seconds_until_available() <= 30
+
+    scheduler.record_success("b")
+    assert scheduler.snapshot()["b"]["consecutive_429s"] == 0
+
+def test_requests_per_window_soft_cap():
+    scheduler = AccountScheduler(make_auth("a", "b"), requests_per_window=1)
+    first = scheduler.next_account()["email"]
+    second = scheduler.next_account()["email"]
+    assert {first, second} == {"a", "b"}
+    # Both at the cap: still served rather than refused
+    assert scheduler.next_account() is not None
+
+@pytest.mark.anyio
+async def test_acquire_waits_for_cooldown():
+    scheduler = AccountScheduler(make_auth("a"))
+    scheduler.record_rate_limited("a", retry_after=0.1)
+    start = time.time()
+    account = await scheduler.acquire()
+    assert account["email"] == "a"
+    assert time.time() - start >= 0.05
+
+@pytest.mark.anyio
+async def test_wrapper_moves_off_rate_limited_account_without_sleeping(tmp_path):
+    config = MagicMock()
+    config.get.side_effect = lambda k, d=None: d
+    wrapper = GeminiAPIWrapper(config=config, auth_service=make_auth("a", "b"), usage_tracker=MagicMock())
+    wrapper.error_file = str(tmp_path / "error.json")
+    used = []
+
+    def fake_stream(method, url, headers=None, **kwargs):
+        used.append(headers["Authorization"])
+        if len(used) == 1:
+            return FakeStreamResponse(status_code=429, text='{"error": {"code": 429}}')
+        return FakeStreamResponse(lines=['data: {"response": {"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}}'])
+
+    start = time.time()
+    with patch('httpx.AsyncClient.stream', side_effect=fake_stream):
+        assert await wrapper.generate_content_async("p") == "ok"
+
+    assert len(used) == 2
+    assert time.time() - start < 1
+    snapshot = wrapper.scheduler.snapshot()
+    limited = [email for email, s in snapshot.items() if s["cooldown_remaining"] > 0]
+    assert len(limited) == 1
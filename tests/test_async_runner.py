@@ -0,0 +1,66 @@
+import os
+import sys
+import asyncio
+import threading
+import pytest
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.async_runner import AsyncLoopRunner, get_shared_runner
+
+@pytest.fixture
+def runner():
+    r = AsyncLoopRunner(name="test-runner")
+    yield r
+    r.stop()
+
+def test_run_uses_one_persistent_loop(runner):
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    first = runner.run(current_loop())
+    second = runner.run(current_loop())
+    assert first is second
+    assert first is runner.loop
+
+def test_run_from_many_threads(runner):
+    async def double(x):
+        await asyncio.sleep(0.01)
+        return x * 2
+
+    results = [None] * 8
+
+    def call(i):
+        results[i] = runner.run(double(i))
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [i * 2 for i in range(8)]
+
+def test_run_propagates_exceptions(runner):
+    async def boom():
+        raise ValueError("bad")
+
+    with pytest.raises(ValueError, match="bad"):
+        runner.run(boom())
+
+def test_run_inside_loop_is_rejected(runner):
+    async def nested():
+        return runner.run(asyncio.sleep(0))
+
+    with pytest.raises(RuntimeError):
+        runner.run(nested())
+
+def test_stop_and_restart(runner):
+    first = runner.loop
+    runner.stop()
+    assert first.is_closed()
+    assert runner.run(asyncio.sleep(0, result="ok")) == "ok"
+    assert runner.loop is not first
+
+def test_shared_runner_is_singleton():
+    assert get_shared_runner() is get_shared_runner()
@@ -46,3 +46,45 @@ def test_backoff_sync_sleep(monkeypatch):
     
     manager.sync_sleep(1)
     assert sleep_calls == [0.1, 0.2]
+
+def test_backoff_full_jitter_stays_within_delay():
+    manager = BackoffManager(initial_delay=1.0, max_delay=8.0, jitter="full")
+    delays = [manager.get_delay(2) for _ in range(50)]
+    assert all(0 <= d <= 4.0 for d in delays)
+    assert len(set(delays)) > 1
+
+def test_backoff_decorrelated_jitter_bounds():
+    manager = BackoffManager(initial_delay=1.0, max_delay=5.0, jitter="decorrelated")
+    for attempt in range(6):
+        assert all(1.0 <= manager.get_delay(attempt) <= 3.0 for _ in range(20))
+
+def test_backoff_decorrelated_jitter_follows_previous_delay(monkeypatch):
+    manager = BackoffManager(initial_delay=1.0, max_delay=50.0, jitter="decorrelated")
+    # The range grows from the delay actually slept, not from the attempt number
+    assert all(1.0 <= manager.get_delay(0, previous_delay=10.0) <= 30.0 for _ in range(20))
+    assert max(manager.get_delay(0, previous_delay=10.0) for _ in range(50)) > 3.0
+    assert all(manager.get_delay(5, previous_delay=1.0) <= 3.0 for _ in range(20))
+
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    delay = None
+    for attempt in range(3):
+        delay = manager.sync_sleep(attempt, previous_delay=delay)
+    assert delay == sleeps[-1]
+
+def test_backoff_retry_after_and_policies():
+    manager = BackoffManager(initial_delay=10.0, max_delay=60.0, policies={"empty_response": {"initial_delay": 1.0}})
+    # A server hint replaces the computed delay
+    assert manager.get_delay(3, retry_after=2.5) == 2.5
+    assert manager.get_delay(1, error_class="empty_response") == 2.0
+    assert manager.get_delay(1, error_class="timeout") == 20.0
+
+def test_parse_retry_after():
+    from src.backoff import parse_retry_after
+    assert parse_retry_after({"retry-after": "7"}) == 7.0
+    payload = {"error": {"code": 429, "details": [
+        {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "12.5s"}
+    ]}}
+    assert parse_retry_after({}, payload) == 12.5
+    assert parse_retry_after({}, [{"error": {"message": "Quota exceeded. Please retry in 850ms."}}]) == 0.85
+    assert parse_retry_after({}, "not json") is None
@@ -0,0 +1,86 @@
+import os
+import sys
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.download_scheduler import DownloadScheduler, DownloadLease
+from src.downloader import apply_download_lease, run_ytdlp
+
+def test_connections_are_capped_by_host_and_global_budget():
+    scheduler = DownloadScheduler(max_downloads=4, max_connections=20,
+                                  host_limits={"vimeo": {"downloads": 2, "connections": 12}})
+
+    first = scheduler.acquire("vimeo", 16)
+    assert first.connections == 12
+    second = scheduler.acquire("mediadelivery", 16)
+    assert second.connections == 8
+    assert scheduler.snapshot() == {
+        "vimeo": {"downloads": 1, "connections": 12},
+        "mediadelivery": {"downloads": 1, "connections": 8},
+    }
+
+    scheduler.release(first)
+    assert scheduler.acquire("youtube", 16).connections == 4
+
+def test_download_waits_for_host_slot():
+    scheduler = DownloadScheduler(max_downloads=3)
+    first = scheduler.acquire("youtube", 4)
+    started = threading.Event()
+
+    def second():
+        with scheduler.lease("youtube", 4):
+            started.set()
+
+    worker = threading.Thread(target=second)
+    worker.start()
+    time.sleep(0.05)
+    assert not started.is_set()
+
+    # Another host is not blocked by the busy one
+    with scheduler.lease("vimeo", 16) as lease:
+        assert lease.connections == 16
+
+    scheduler.release(first)
+    worker.join(timeout=2)
+    assert started.is_set()
+    assert scheduler.snapshot() == {}
+
+def test_bandwidth_is_shared_between_downloads():
+    scheduler = DownloadScheduler(max_downloads=3, max_connections=48, max_bandwidth=900_000)
+    leases = [scheduler.acquire(host, 16) for host in ["vimeo", "mediadelivery", "facebook"]]
+    assert [lease.rate_limit for lease in leases] == [300_000] * 3
+    assert sum(lease.rate_limit for lease in leases) <= scheduler.max_bandwidth
+    assert DownloadScheduler().acquire("vimeo", 16).rate_limit is None
+
+def test_from_config():
+    config = MagicMock()
+    values = {"download_max_concurrent": 5, "download_max_bandwidth_mbps": 80,
+              "download_host_limits": {"youtube": {"downloads": 2}}}
+    config.get.side_effect = lambda key, default=None: values.get(key, default)
+
+    scheduler = DownloadScheduler.from_config(config)
+    assert scheduler.max_downloads == 5
+    assert scheduler.max_connections == 32
+    assert scheduler.max_bandwidth == 10_000_000
+    assert scheduler.host_limits["youtube"] == {"downloads": 2, "connections": 4}
+
+def test_apply_download_lease():
+    args = ["-N", "16", "--no-playlist", "https://vimeo.com/1"]
+    assert apply_download_lease(args, DownloadLease("vimeo", 6, None)) == ["-N", "6", "--no-playlist", "https://vimeo.com/1"]
+    assert apply_download_lease(args, DownloadLease("vimeo", 6, 250000))[:2] == ["--limit-rate", "250000"]
+
+@patch('src.downloader.get_shared_engine')
+@patch('src.downloader.get_download_scheduler')
+def test_run_ytdlp_uses_granted_connections(mock_get_scheduler, mock_engine):
+    mock_get_scheduler.return_value = DownloadScheduler(host_limits={"vimeo": {"connections": 8}})
+
+    run_ytdlp(["-N", "16", "https://vimeo.com/1"], "vimeo")
+
+    args = mock_engine.return_value.run.call_args[0][0]
+    assert args == ["-N", "8", "https://vimeo.com/1"]
+    assert mock_get_scheduler.return_value.snapshot() == {}
@@ -1,7 +1,7 @@
 import os
 import sys
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, ANY
 
 # Add project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -33,18 +33,11 @@ def test_get_cookie_path_default(tmp_path, monkeypatch):
     
     assert get_cookie_path("nonexistent") == str(default_cookie)
 
-def test_run_command_success():
-    from src.downloader import run_command
-    with patch('subprocess.run') as mock_sub:
-        mock_sub.return_value = MagicMock(returncode=0, stdout="Success Output", stderr="")
-        assert run_command("echo test") == "Success Output"
-
-def test_run_command_failure():
-    from src.downloader import run_command
-    with patch('subprocess.run') as mock_sub:
-        mock_sub.return_value = MagicMock(returncode=1, stdout="", stderr="Error Message")
-        with pytest.raises(Exception, match="Error Message"):
-            run_command("false")
+@pytest.fixture(autouse=True)
+def no_url_cache():
+    # Keep tests away from the real resolved-URL cache on disk
+    with patch('src.downloader.get_resolved_url_cache', return_value=None) as mock:
+        yield mock
 
 @pytest.fixture
 def mock_job():
@@ -54,7 +47,7 @@ def mock_job():
         "url": "https://example.com/video"
     }
 
-@patch('src.downloader.run_command')
+@patch('src.downloader.run_ytdlp')
 @patch('src.downloader.get_cookie_path')
 def test_download_facebook(mock_cookies, mock_run, mock_job):
     mock_job['url'] = "https://facebook.com/video/123"
@@ -68,7 +61,7 @@ def test_download_facebook(mock_cookies, mock_run, mock_job):
     assert any("cookies" in a for a in args)
     assert any("bangi.txt" in a for a in args)
 
-@patch('src.downloader.run_command')
+@patch('src.downloader.run_ytdlp')
 @patch('src.downloader.get_cookie_path')
 def test_download_youtube(mock_cookies, mock_run, mock_job):
     mock_job['url'] = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
@@ -80,7 +73,7 @@ def test_download_youtube(mock_cookies, mock_run, mock_job):
     assert any("youtube.com" in a for a in args)
     assert any("Referer: https://www.youtube.com/" in a for a in args)
 
-@patch('src.downloader.run_command')
+@patch('src.downloader.run_ytdlp')
 @patch('src.downloader.get_cookie_path')
 def test_download_mediadelivery(mock_cookies, mock_run, mock_job):
     # SPEC: mediadelivery.net link provided directly
@@ -94,26 +87,167 @@ def test_download_mediadelivery(mock_cookies, mock_run, mock_job):
     assert any("Referer: https://academic.aparsclassroom.com/" in a for a in args)
     assert any("Origin: https://academic.aparsclassroom.com" in a for a in args)
 
-@patch('src.downloader.run_command')
+@patch('src.downloader.get_extractor_service')
+@patch('src.downloader.run_ytdlp')
 @patch('src.downloader.get_cookie_path')
-def test_download_edgecoursebd(mock_cookies, mock_run, mock_job):
+def test_download_edgecoursebd(mock_cookies, mock_run, mock_service, mock_job):
     mock_job['url'] = "https://edgecoursebd.com/video"
     mock_cookies.return_value = "cookies/bangi.txt"
     
-    # Mock the scraper run_command
-    # First call is scraper, second is yt-dlp
-    mock_run.side_effect = ["https://player.vimeo.com/video/999", "Done"]
+    # The scraper runs in-process; only yt-dlp goes through run_ytdlp
+    mock_service.return_value.extract.return_value = "https://player.vimeo.com/video/999"
     
     download_audio(mock_job)
     
-    assert mock_run.call_count == 2
-    scraper_call = mock_run.call_args_list[0][0][0]
-    assert any("link_extractor.py" in a for a in scraper_call)
-    
-    yt_dlp_call = mock_run.call_args_list[1][0][0]
+    mock_service.return_value.extract.assert_called_once_with("https://edgecoursebd.com/video", "cookies/bangi.txt", ANY)
+    assert mock_run.call_count == 1
+    yt_dlp_call = mock_run.call_args_list[0][0][0]
     assert any("player.vimeo.com" in a for a in yt_dlp_call)
 
-@patch('src.downloader.run_command')
+@patch('src.downloader.get_extractor_service')
+@patch('src.downloader.run_ytdlp')
+@patch('src.downloader.get_cookie_path')
+def test_download_edgecoursebd_no_link(mock_cookies, mock_run, mock_service, mock_job):
+    mock_job['url'] = "https://edgecoursebd.com/video"
+    mock_cookies.return_value = None
+    mock_service.return_value.extract.return_value = None
+    
+    with pytest.raises(Exception, match="No media link"):
+        download_audio(mock_job)
+    mock_run.assert_not_called()
+
+@patch('src.downloader.get_extractor_service')
+@patch('src.downloader.run_ytdlp')
+@patch('src.downloader.get_cookie_path')
+def test_download_edgecoursebd_uses_cached_resolution(mock_cookies, mock_run, mock_service, mock_job, no_url_cache, tmp_path):
+    from src.result_cache import ResultCache
+    no_url_cache.return_value = ResultCache(str(tmp_path / "urls"), ttl_seconds=3600)
+    mock_job['url'] = "https://edgecoursebd.com/video"
+    mock_cookies.return_value = None
+    mock_service.return_value.extract.return_value = "https://player.vimeo.com/video/999"
+
+    download_audio(mock_job)
+    download_audio(mock_job)
+
+    # The second download skips the browser
+    mock_service.return_value.extract.assert_called_once()
+    assert mock_run.call_count == 2
+
+@patch('src.downloader.get_extractor_service')
+@patch('src.downloader.run_ytdlp')
+@patch('src.downloader.get_cookie_path')
+def test_download_edgecoursebd_stale_resolution_is_refreshed(mock_cookies, mock_run, mock_service, mock_job, no_url_cache, tmp_path):
+    from src.result_cache import ResultCache
+    from src.downloader import resolved_url_key
+    cache = ResultCache(str(tmp_path / "urls"))
+    cache.put(resolved_url_key("https://edgecoursebd.com/video"), "https://player.vimeo.com/video/old")
+    no_url_cache.return_value = cache
+    mock_job['url'] = "https://edgecoursebd.com/video"
+    mock_cookies.return_value = None
+    mock_service.return_value.extract.return_value = "https://player.vimeo.com/video/new"
+    mock_run.side_effect = [Exception("HTTP Error 404"), "Done"]
+
+    download_audio(mock_job)
+
+    assert "https://player.vimeo.com/video/old" in mock_run.call_args_list[0][0][0]
+    assert "https://player.vimeo.com/video/new" in mock_run.call_args_list[1][0][0]
+    assert cache.get(resolved_url_key("https://edgecoursebd.com/video")) == "https://player.vimeo.com/video/new"
+
+@patch('src.downloader.get_extractor_service')
+@patch('src.downloader.run_ytdlp')
+@patch('src.downloader.get_cookie_path')
+def test_download_edgecoursebd_failure_invalidates_resolution(mock_cookies, mock_run, mock_service, mock_job, no_url_cache, tmp_path):
+    from src.result_cache import ResultCache
+    from src.downloader import resolved_url_key
+    cache = ResultCache(str(tmp_path / "urls"))
+    no_url_cache.return_value = cache
+    mock_job['url'] = "https://edgecoursebd.com/video"
+    mock_cookies.return_value = None
+    mock_service.return_value.extract.return_value = "https://player.vimeo.com/video/999"
+    mock_run.side_effect = Exception("Download failed")
+
+    with pytest.raises(Exception):
+        download_audio(mock_job)
+    assert cache.get(resolved_url_key("https://edgecoursebd.com/video")) is None
+
+@patch('src.downloader.get_extractor_service')
+@patch('src.downloader.run_ytdlp')
+@patch('src.downloader.get_cookie_path')
+def test_download_edgecoursebd_uses_prefetched_url(mock_cookies, mock_run, mock_service, mock_job):
+    mock_job['url'] = "https://edgecoursebd.com/video"
+    mock_job['resolved_url'] = "https://player.vimeo.com/video/555"
+    mock_cookies.return_value = None
+
+    download_audio(mock_job)
+
+    mock_service.return_value.extract.assert_not_called()
+    assert "https://player.vimeo.com/video/555" in mock_run.call_args[0][0]
+
+@patch('src.downloader.get_extractor_service')
+@patch('src.downloader.run_ytdlp')
+@patch('src.downloader.get_cookie_path')
+def test_download_edgecoursebd_replaces_stale_prefetched_url(mock_cookies, mock_run, mock_service, mock_job):
+    mock_job['url'] = "https://edgecoursebd.com/video"
+    mock_job['resolved_url'] = "https://player.vimeo.com/video/old"
+    mock_cookies.return_value = None
+    mock_service.return_value.extract.return_value = "https://player.vimeo.com/video/new"
+    mock_run.side_effect = [Exception("HTTP Error 404"), "Done"]
+
+    download_audio(mock_job)
+
+    # The fresh link is left on the job for the pipeline to persist
+    assert mock_job['resolved_url'] == "https://player.vimeo.com/video/new"
+
+@patch('src.downloader.resolve_links')
+@patch('src.downloader.get_cookie_path')
+def test_prefetch_media_urls(mock_cookies, mock_resolve, no_url_cache, tmp_path):
+    from src.downloader import prefetch_media_urls, resolved_url_key
+    from src.result_cache import ResultCache
+    cache = ResultCache(str(tmp_path / "urls"))
+    cache.put(resolved_url_key("https://edgecoursebd.com/cached"), "https://player.vimeo.com/video/0")
+    no_url_cache.return_value = cache
+    mock_cookies.return_value = None
+    mock_resolve.return_value = {
+        "https://edgecoursebd.com/one": ["https://player.vimeo.com/video/1"],
+        "https://edgecoursebd.com/many": ["https://player.vimeo.com/video/2", "https://player.vimeo.com/video/3"],
+    }
+    jobs = [
+        {"id": "a", "name": "A", "url": "https://edgecoursebd.com/cached"},
+        {"id": "b", "name": "B", "url": "https://edgecoursebd.com/one"},
+        {"id": "c", "name": "C", "url": "https://edgecoursebd.com/many"},
+        {"id": "d", "name": "D", "url": "https://www.youtube.com/watch?v=x"},
+    ]
+    manager = MagicMock()
+    config = MagicMock()
+    config.get.side_effect = lambda key, default=None: default
+
+    assert prefetch_media_urls(jobs, manager, config) == 2
+
+    # Cached pages are not scraped again; other sites are never scraped
+    assert mock_resolve.call_args[0][0] == ["https://edgecoursebd.com/one", "https://edgecoursebd.com/many"]
+    assert jobs[0]["resolved_url"] == "https://player.vimeo.com/video/0"
+    assert jobs[1]["resolved_url"] == "https://player.vimeo.com/video/1"
+    # Ambiguous pages are left for download_audio to resolve
+    assert "resolved_url" not in jobs[2]
+    manager.update_job_fields.assert_any_call("b", {"resolved_url": "https://player.vimeo.com/video/1"})
+    assert cache.get(resolved_url_key("https://edgecoursebd.com/one")) == "https://player.vimeo.com/video/1"
+
+@patch('src.downloader.resolve_links')
+@patch('src.downloader.get_cookie_path')
+def test_prefetch_keeps_persisted_resolved_url(mock_cookies, mock_resolve):
+    from src.downloader import prefetch_media_urls
+    jobs = [{"id": "a", "name": "A", "url": "https://edgecoursebd.com/one", "resolved_url": "https://player.vimeo.com/video/1"}]
+    manager = MagicMock()
+    config = MagicMock()
+    config.get.side_effect = lambda key, default=None: default
+
+    # The resolved-URL cache is disabled (no_url_cache), yet the browser is not opened
+    assert prefetch_media_urls(jobs, manager, config) == 0
+    mock_resolve.assert_not_called()
+    manager.update_job_fields.assert_not_called()
+    assert jobs[0]["resolved_url"] == "https://player.vimeo.com/video/1"
+
+@patch('src.downloader.run_ytdlp')
 @patch('src.downloader.get_cookie_path')
 def test_download_fallback_failure(mock_cookies, mock_run, mock_job):
     mock_job['url'] = "https://unknown-domain.com/video"
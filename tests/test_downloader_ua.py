@@ -18,8 +18,7 @@ def mock_config():
 
 @pytest.fixture
 def mock_run():
-    with patch('subprocess.run') as mock:
-        mock.return_value = MagicMock(returncode=0, stdout="", stderr="")
+    with patch('src.downloader.run_ytdlp') as mock:
         yield mock
 
 def test_download_audio_uses_configured_ua(mock_config, mock_run):
@@ -32,7 +31,7 @@ def test_download_audio_uses_configured_ua(mock_config, mock_run):
     
     download_audio(job)
     
-    # Check if any of the calls to subprocess.run contained the User-Agent
+    # Check if any of the yt-dlp runs contained the User-Agent
     found_ua = False
     for call in mock_run.call_args_list:
         args = call[0][0]
@@ -64,12 +63,13 @@ def test_hls_downloader_flags(mock_config, mock_run):
     # This URL should trigger EdgeCourseBD mode
     job = {'url': 'https://edgecoursebd.com/lesson/123', 'name': 'test_edge'}
     
-    # We also need to mock link_extractor.py execution if it's called
-    with patch('src.downloader.run_command', return_value="https://player.vimeo.com/video/456") as mock_run_cmd:
-        # Mocking the first call (scraper) and second (download)
-        mock_run_cmd.side_effect = ["https://player.vimeo.com/video/456", "done"]
+    # The link extractor runs in-process; mock it and the yt-dlp call
+    with patch('src.downloader.get_extractor_service') as mock_service, \
+         patch('src.downloader.get_resolved_url_cache', return_value=None), \
+         patch('src.downloader.run_ytdlp') as mock_run_cmd:
+        mock_service.return_value.extract.return_value = "https://player.vimeo.com/video/456"
         
-        # We need to be careful because download_audio calls run_command
+        # We need to be careful because download_audio calls run_ytdlp
         # Let's just check if any of the commands had the flags
         try:
             download_audio(job)
@@ -1,8 +1,8 @@
 import pytest
-import json
 import asyncio
 from unittest.mock import AsyncMock, patch, MagicMock
 from src.gemini_api_wrapper import GeminiAPIWrapper
+from conftest import FakeStreamResponse
 
 @pytest.mark.anyio
 async def test_generate_content_empty_retry(monkeypatch):
@@ -29,15 +29,15 @@ async def test_generate_content_empty_retry(monkeypatch):
     # Mock httpx.AsyncClient
     responses = [
         # First response: Empty SSE data
-        AsyncMock(status_code=200, iter_lines=MagicMock(return_value=[b"data: {}\n"])),
+        FakeStreamResponse(lines=["data: {}"]),
         # Second response: Whitespace only
-        AsyncMock(status_code=200, iter_lines=MagicMock(return_value=[b'data: {"response": {"candidates": [{"content": {"parts": [{"text": "   "}]}}]}}\n'])),
+        FakeStreamResponse(lines=['data: {"response": {"candidates": [{"content": {"parts": [{"text": "   "}]}}]}}']),
         # Third response: Success
-        AsyncMock(status_code=200, iter_lines=MagicMock(return_value=[b'data: {"response": {"candidates": [{"content": {"parts": [{"text": "Hello world"}]}}]}}\n']))
+        FakeStreamResponse(lines=['data: {"response": {"candidates": [{"content": {"parts": [{"text": "Hello world"}]}}]}}'])
     ]
     
     call_count = 0
-    async def mock_post(*args, **kwargs):
+    def mock_stream(*args, **kwargs):
         nonlocal call_count
         resp = responses[call_count]
         call_count += 1
@@ -45,7 +45,7 @@ async def test_generate_content_empty_retry(monkeypatch):
 
     # We need to mock the context manager __aenter__
     mock_client = AsyncMock()
-    mock_client.post = mock_post
+    mock_client.stream = mock_stream
     mock_client.__aenter__.return_value = mock_client
     
     with patch("httpx.AsyncClient", return_value=mock_client):
@@ -3,7 +3,7 @@ import json
 import pytest
 import sys
 import time
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, AsyncMock, patch
 
 # Add project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -59,3 +59,70 @@ def test_account_cycling(auth_service):
     assert auth_service.get_next_account()["email"] == "u1"
     assert auth_service.get_next_account()["email"] == "u2"
     assert auth_service.get_next_account()["email"] == "u1"
+
+@pytest.mark.anyio
+async def test_refresh_uses_shared_client(auth_service):
+    record = {"email": "u1", "status": "valid", "access": "a1", "refresh": "r1", "expires": 0, "projectId": "p1", "clientId": "c1", "clientSecret": None}
+    auth_service.accounts = [record]
+
+    resp = MagicMock(status_code=200)
+    resp.json.return_value = {"access_token": "a2", "expires_in": 3600}
+    shared_client = MagicMock()
+    shared_client.post = AsyncMock(return_value=resp)
+    auth_service.client_provider = lambda: shared_client
+
+    refreshed = await auth_service.refresh_token(record)
+
+    assert refreshed["access"] == "a2"
+    shared_client.post.assert_awaited_once()
+    # The shared pool must not be closed by the auth service
+    shared_client.aclose.assert_not_called()
+
+@pytest.mark.anyio
+async def test_concurrent_refreshes_are_deduplicated(auth_service):
+    import asyncio
+    record = {"email": "u1", "status": "valid", "access": "a1", "refresh": "r1", "expires": 0, "projectId": "p1", "clientId": "c1", "clientSecret": None}
+    auth_service.accounts = [record]
+
+    async def slow_post(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        resp = MagicMock(status_code=200)
+        resp.json.return_value = {"access_token": "a2", "expires_in": 3600}
+        return resp
+
+    shared_client = MagicMock()
+    shared_client.post = AsyncMock(side_effect=slow_post)
+    auth_service.client_provider = lambda: shared_client
+
+    with patch.object(auth_service, "_save_accounts") as mock_save:
+        results = await asyncio.gather(*(auth_service.get_valid_account(record) for _ in range(5)))
+
+    assert all(r["access"] == "a2" for r in results)
+    shared_client.post.assert_awaited_once()
+    mock_save.assert_called_once()
+
+@pytest.mark.anyio
+async def test_token_near_expiry_refreshes_in_background(auth_service):
+    import asyncio
+    expires = int((time.time() + 60) * 1000)
+    record = {"email": "u1", "status": "valid", "access": "a1", "refresh": "r1", "expires": expires, "projectId": "p1", "clientId": "c1", "clientSecret": None}
+    auth_service.accounts = [record]
+
+    async def fake_refresh(rec):
+        rec["access"] = "a2"
+        rec["expires"] = int((time.time() + 3600) * 1000)
+        return rec
+
+    with patch.object(auth_service, "refresh_token", side_effect=fake_refresh) as mock_refresh:
+        # The still-valid token is returned without waiting for the refresh
+        result = await auth_service.get_valid_account(record)
+        assert result["access"] == "a1"
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        mock_refresh.assert_called_once()
+        assert record["access"] == "a2"
+
+        # A fresh token only schedules a timer for later
+        await auth_service.get_valid_account(record)
+        mock_refresh.assert_called_once()
+        assert "u1" in auth_service._refresh_timers[asyncio.get_running_loop()]
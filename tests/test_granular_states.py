@@ -6,16 +6,18 @@ import pytest
 # Add project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.job_manager import JobManager, HISTORY_FILE
+from src.job_manager import JobManager, HISTORY_FILE, JOURNAL_FILE
 
 @pytest.fixture
 def job_manager():
-    if os.path.exists(HISTORY_FILE):
-        os.remove(HISTORY_FILE)
+    for path in (HISTORY_FILE, JOURNAL_FILE):
+        if os.path.exists(path):
+            os.remove(path)
     manager = JobManager()
     yield manager
-    if os.path.exists(HISTORY_FILE):
-        os.remove(HISTORY_FILE)
+    for path in (HISTORY_FILE, JOURNAL_FILE):
+        if os.path.exists(path):
+            os.remove(path)
 
 def test_granular_states_retrieval(job_manager):
     """Test that jobs in granular states are correctly retrieved as pending."""
@@ -6,16 +6,18 @@ import pytest
 # Add project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.job_manager import JobManager, HISTORY_FILE
+from src.job_manager import JobManager, HISTORY_FILE, JOURNAL_FILE
 
 @pytest.fixture
 def job_manager():
-    if os.path.exists(HISTORY_FILE):
-        os.remove(HISTORY_FILE)
+    for path in (HISTORY_FILE, JOURNAL_FILE):
+        if os.path.exists(path):
+            os.remove(path)
     manager = JobManager()
     yield manager
-    if os.path.exists(HISTORY_FILE):
-        os.remove(HISTORY_FILE)
+    for path in (HISTORY_FILE, JOURNAL_FILE):
+        if os.path.exists(path):
+            os.remove(path)
 
 def test_get_pending_excludes_no_link_found(job_manager):
     """Test that no_link_found jobs are excluded from pending list."""
@@ -49,3 +51,50 @@ def test_fail_pending(job_manager):
     with open(HISTORY_FILE, 'r') as f:
         data = json.load(f)
         assert data[0]["status"] == "failed"
+
+def test_status_updates_are_journaled(job_manager):
+    """Test that status updates append to the journal instead of rewriting history."""
+    new_jobs = job_manager.add_jobs("Lecture", "http://example.com/a")
+    job_id = new_jobs[0]["id"]
+    job_manager.update_job_status(job_id, "CHUNKED")
+    job_manager.update_job_status(job_id, "failed")
+
+    assert not os.path.exists(HISTORY_FILE)
+    with open(JOURNAL_FILE, 'r') as f:
+        assert len(f.readlines()) == 3
+
+    # A fresh manager replays the journal
+    reloaded = JobManager()
+    job = reloaded.get_job(job_id)
+    assert job["status"] == "failed"
+    assert job["last_granular_state"] == "CHUNKED"
+
+def test_update_job_fields(job_manager):
+    job_id = job_manager.add_jobs("Lecture", "http://example.com/a")[0]["id"]
+    assert job_manager.update_job_fields(job_id, {"resolved_url": "https://player.vimeo.com/video/1"})
+    assert job_manager.update_job_fields("missing", {"resolved_url": "x"}) is False
+    assert JobManager().get_job(job_id)["resolved_url"] == "https://player.vimeo.com/video/1"
+
+def test_journal_ignores_torn_line(job_manager):
+    job_id = job_manager.add_jobs("Lecture", "http://example.com/a")[0]["id"]
+    job_manager.update_job_status(job_id, "DOWNLOADED")
+    with open(JOURNAL_FILE, 'a') as f:
+        f.write('{"op": "update", "id": "')
+
+    assert JobManager().get_job(job_id)["status"] == "DOWNLOADED"
+
+def test_journal_compaction(job_manager):
+    job_manager.COMPACT_THRESHOLD = 3
+    job_id = job_manager.add_jobs("Lecture", "http://example.com/a")[0]["id"]
+    job_manager.update_job_status(job_id, "DOWNLOADED")
+    job_manager.update_job_status(job_id, "CHUNKED")
+
+    # Third event triggered a snapshot and cleared the journal
+    assert not os.path.exists(JOURNAL_FILE)
+    with open(HISTORY_FILE, 'r') as f:
+        assert json.load(f)[0]["status"] == "CHUNKED"
+
+    # Replaying an add that is already in the snapshot does not duplicate the job
+    with open(JOURNAL_FILE, 'w') as f:
+        f.write(json.dumps({"op": "add", "job": job_manager.get_job(job_id)}) + "\n")
+    assert len(JobManager().history) == 1
@@ -121,4 +121,134 @@ def test_main_function_no_link(mock_cookie_file):
                 from src.link_extractor import main
                 main()
                 mock_extract.assert_called_with('https://example.com', mock_cookie_file, None)
-                mock_exit.assert_called_with(1)
\ No newline at end of file
+                mock_exit.assert_called_with(1)
+
+
+@patch('src.link_extractor.sync_playwright')
+def test_extractor_service_reuses_browser_and_context(mock_playwright, mock_cookie_file):
+    from src.link_extractor import LinkExtractorService
+    mock_p = mock_playwright.return_value.__enter__.return_value
+    mock_browser = mock_p.chromium.launch.return_value
+    mock_context = mock_browser.new_context.return_value
+    mock_page = mock_context.new_page.return_value
+
+    mock_frame = MagicMock()
+    mock_frame.url = 'https://player.vimeo.com/video/123?autoplay=1'
+    mock_page.frames = [mock_frame]
+
+    service = LinkExtractorService()
+    try:
+        assert service.extract('https://example.com/1', mock_cookie_file) == 'https://player.vimeo.com/video/123'
+        assert service.extract('https://example.com/2', mock_cookie_file) == 'https://player.vimeo.com/video/123'
+    finally:
+        service.close()
+
+    # One browser and one cookie-loaded context serve both pages
+    mock_p.chromium.launch.assert_called_once()
+    mock_browser.new_context.assert_called_once()
+    mock_context.add_cookies.assert_called_once()
+    assert mock_context.new_page.call_count == 2
+    assert mock_page.close.call_count == 2
+    mock_browser.close.assert_called_once()
+
+@patch('src.link_extractor.sync_playwright')
+def test_extractor_service_reports_failures(mock_playwright):
+    from src.link_extractor import LinkExtractorService
+    mock_p = mock_playwright.return_value.__enter__.return_value
+    mock_p.chromium.launch.side_effect = Exception("browser missing")
+
+    service = LinkExtractorService()
+    try:
+        assert service.extract('https://example.com', None) is None
+    finally:
+        service.close()
+
+def test_collect_media_links_returns_once_player_appears():
+    from src.link_extractor import collect_media_links, POLL_INTERVAL_MS, READY_TIMEOUT_MS
+    page = MagicMock()
+    page.frames = []
+    handlers = {}
+    page.on.side_effect = lambda event, handler: handlers.setdefault(event, handler)
+
+    waits = []
+    def wait_for_timeout(ms):
+        waits.append(ms)
+        if len(waits) == 2:
+            # The player iframe's document is requested while we wait
+            request = MagicMock(url='https://player.vimeo.com/video/7?h=abc', resource_type='document')
+            handlers['request'](request)
+            handlers['request'](MagicMock(url='https://player.vimeo.com/video/7/config', resource_type='xhr'))
+    page.wait_for_timeout.side_effect = wait_for_timeout
+
+    assert collect_media_links(page, 'https://example.com') == ['https://player.vimeo.com/video/7']
+    # Far fewer polls than the full timeout
+    assert len(waits) * POLL_INTERVAL_MS < READY_TIMEOUT_MS / 5
+
+def test_collect_media_links_times_out_without_player():
+    from src.link_extractor import collect_media_links, POLL_INTERVAL_MS
+    page = MagicMock()
+    page.frames = []
+    assert collect_media_links(page, 'https://example.com', timeout_ms=1000) == []
+    assert page.wait_for_timeout.call_count == 1000 // POLL_INTERVAL_MS
+
+@patch('src.link_extractor.async_playwright')
+def test_resolve_links_in_parallel_pages(mock_playwright, mock_cookie_file):
+    from unittest.mock import AsyncMock
+    from src.link_extractor import resolve_links
+
+    mock_p = MagicMock()
+    mock_playwright.return_value.__aenter__ = AsyncMock(return_value=mock_p)
+    mock_playwright.return_value.__aexit__ = AsyncMock(return_value=False)
+    mock_browser = MagicMock()
+    mock_browser.close = AsyncMock()
+    mock_p.chromium.launch = AsyncMock(return_value=mock_browser)
+    mock_context = MagicMock()
+    mock_context.add_cookies = AsyncMock()
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+
+    def make_page():
+        page = MagicMock()
+        page.frames = []
+        page.close = AsyncMock()
+        page.wait_for_timeout = AsyncMock()
+
+        async def goto(url, **kwargs):
+            if url.endswith("/1"):
+                frame = MagicMock()
+                frame.url = 'https://player.vimeo.com/video/1?h=x'
+                page.frames = [frame]
+            elif url.endswith("/2"):
+                raise Exception("net::ERR_TIMED_OUT")
+        page.goto = goto
+        return page
+    mock_context.new_page = AsyncMock(side_effect=lambda: make_page())
+
+    results = resolve_links(['https://example.com/1', 'https://example.com/2', 'https://example.com/3', 'https://example.com/1'], mock_cookie_file, concurrency=2)
+
+    assert results == {
+        'https://example.com/1': ['https://player.vimeo.com/video/1'],
+        'https://example.com/2': [],
+        'https://example.com/3': [],
+    }
+    # One browser and context for the batch, one page per unique URL
+    mock_p.chromium.launch.assert_awaited_once()
+    mock_context.add_cookies.assert_awaited_once()
+    assert mock_context.new_page.await_count == 3
+    mock_browser.close.assert_awaited_once()
+
+@patch('src.link_extractor.sync_playwright')
+@patch('src.link_extractor.select_with_timeout')
+def test_extractor_service_never_prompts(mock_select, mock_playwright, mock_cookie_file):
+    from src.link_extractor import LinkExtractorService
+    mock_page = mock_playwright.return_value.__enter__.return_value.chromium.launch.return_value.new_context.return_value.new_page.return_value
+    frames = [MagicMock(url='https://player.vimeo.com/video/1'), MagicMock(url='https://player.vimeo.com/video/2')]
+    mock_page.frames = frames
+
+    service = LinkExtractorService()
+    try:
+        assert service.extract('https://example.com/1', mock_cookie_file) == 'https://player.vimeo.com/video/1'
+        chooser = MagicMock(return_value='https://player.vimeo.com/video/2')
+        assert service.extract('https://example.com/2', mock_cookie_file, chooser=chooser) == 'https://player.vimeo.com/video/2'
+    finally:
+        service.close()
+    mock_select.assert_not_called()
@@ -2,12 +2,13 @@ import os
 import sys
 import json
 import pytest
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 
 # Add project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.note_generation_service import NoteGenerationService
+from src.result_cache import ResultCache
 
 
 
@@ -172,3 +173,64 @@ def test_generate_custom_prompt(mock_gen, transcript_file, output_md):
 
 
     assert "This is the transcript." in kwargs['prompt']
+
+
+@patch('src.gemini_api_wrapper.GeminiAPIWrapper.generate_content')
+def test_generate_streams_partial_output(mock_gen, transcript_file, output_md):
+    """Test that streamed text lands in a .part file until the notes are complete."""
+    partial_path = output_md + ".part"
+    seen = []
+
+    def fake_generate(prompt, model_type, system_instruction, on_text):
+        on_text("discarded")
+        on_text(None)
+        on_text("# Notes\n")
+        on_text("Content")
+        with open(partial_path, 'r') as f:
+            seen.append(f.read())
+        return "# Notes\nContent"
+
+    mock_gen.side_effect = fake_generate
+
+    assert NoteGenerationService.generate(transcript_path=transcript_file, output_path=output_md) is True
+    assert seen == ["# Notes\nContent"]
+    assert not os.path.exists(partial_path)
+    with open(output_md, 'r') as f:
+        assert f.read() == "# Notes\nContent"
+
+def test_generate_reuses_cached_notes(transcript_file, output_md, tmp_path):
+    """Test that a retry with the same transcript, prompt and model skips the API."""
+    api = MagicMock()
+    api.model_for.return_value = "model-note"
+    api.generate_content.return_value = "# Notes"
+    cache = ResultCache(str(tmp_path / "cache"))
+
+    assert NoteGenerationService.generate(transcript_file, output_md, api_wrapper=api, cache=cache) is True
+    os.remove(output_md)
+    assert NoteGenerationService.generate(transcript_file, output_md, api_wrapper=api, cache=cache) is True
+
+    api.generate_content.assert_called_once()
+    with open(output_md, 'r') as f:
+        assert f.read() == "# Notes"
+
+    # A different prompt is a cache miss
+    assert NoteGenerationService.generate(transcript_file, output_md, prompt_text="Other", api_wrapper=api, cache=cache) is True
+    assert api.generate_content.call_count == 2
+
+@patch('src.gemini_api_wrapper.GeminiAPIWrapper.generate_content')
+def test_generate_removes_partial_output_on_failure(mock_gen, transcript_file, output_md):
+    """Test that a failed or empty generation leaves no .part file behind."""
+    partial_path = output_md + ".part"
+
+    def fail(prompt, model_type, system_instruction, on_text):
+        on_text("# Half")
+        raise Exception("All configured Gemini CLI accounts failed")
+
+    mock_gen.side_effect = fail
+    assert NoteGenerationService.generate(transcript_path=transcript_file, output_path=output_md) is False
+    assert not os.path.exists(partial_path)
+
+    mock_gen.side_effect = None
+    mock_gen.return_value = ""
+    assert NoteGenerationService.generate(transcript_path=transcript_file, output_path=output_md) is False
+    assert not os.path.exists(partial_path)
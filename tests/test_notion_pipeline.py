@@ -61,6 +61,8 @@ def test_execute_job_notion_success(mock_cleanup, mock_job_manager_class, mock_s
         # Verify title formatting: Test_Job -> Test Job
         args, kwargs = mock_notion_service.create_page.call_args
         assert args[0] == "Test Job" 
+        # No fixed sleep between note generation and the Notion push
+        mock_api_class.return_value.backoff_manager.sync_sleep.assert_not_called()
 
 @patch('src.pipeline.download_audio')
 @patch('src.pipeline.AudioProcessor')
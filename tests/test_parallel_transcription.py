@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import pytest
+from unittest.mock import MagicMock, AsyncMock, patch
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.pipeline import ProcessingPipeline
+from src.gemini_api_wrapper import GeminiAPIWrapper
+from conftest import FakeStreamResponse
+
+@pytest.fixture
+def pipeline(tmp_path):
+    config = MagicMock()
+    config.get.side_effect = lambda k, d=None: {"max_parallel_chunks": 4}.get(k, d)
+    api = MagicMock()
+    p = ProcessingPipeline(config, api_wrapper=api, job_manager=MagicMock())
+    p.TEMP_DIR = str(tmp_path)
+    return p
+
+def make_chunks(tmp_path, count):
+    return [str(tmp_path / f"job_j1_chunk_{i:03d}.mp3") for i in range(1, count + 1)]
+
+def test_chunks_committed_in_order(pipeline, tmp_path):
+    """Test that chunks finishing out of order are written in chunk order."""
+    delays = {1: 0.15, 2: 0.0, 3: 0.05}
+
+    def transcribe(file_path, **kwargs):
+        index = int(file_path[-7:-4])
+        time.sleep(delays[index])
+        return f"text {index}"
+
+    pipeline.api.generate_content_with_file.side_effect = transcribe
+    job = {"id": "j1", "name": "Job One", "status": "CHUNKED"}
+    ctx = {"chunks": make_chunks(tmp_path, 3)}
+
+    assert pipeline.stage_transcribe(job, ctx) is True
+    with open(ctx["transcript_path"], encoding="utf-8") as f:
+        assert f.read() == "text 1\n\ntext 2\n\ntext 3\n\n"
+
+def test_chunks_run_concurrently(pipeline, tmp_path):
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def transcribe(file_path, **kwargs):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        return "text"
+
+    pipeline.api.generate_content_with_file.side_effect = transcribe
+    job = {"id": "j1", "name": "Job One", "status": "CHUNKED"}
+
+    assert pipeline.stage_transcribe(job, {"chunks": make_chunks(tmp_path, 4)}) is True
+    assert peak > 1
+    # No fixed sleep between chunks any more
+    pipeline.api.backoff_manager.sync_sleep.assert_not_called()
+
+def test_failure_keeps_contiguous_prefix(pipeline, tmp_path):
+    """Test that a failed chunk keeps earlier chunks as a resume point."""
+    def transcribe(file_path, **kwargs):
+        index = int(file_path[-7:-4])
+        if index == 2:
+            time.sleep(0.05)
+            raise Exception("API down")
+        return f"text {index}"
+
+    pipeline.api.generate_content_with_file.side_effect = transcribe
+    job = {"id": "j1", "name": "Job One", "status": "CHUNKED"}
+    ctx = {"chunks": make_chunks(tmp_path, 3)}
+
+    assert pipeline.stage_transcribe(job, ctx) is False
+    pipeline.manager.update_job_status.assert_called_with("j1", "failed")
+    with open(ctx["transcript_path"], encoding="utf-8") as f:
+        # Chunk 3 may have finished but cannot be committed ahead of chunk 2
+        assert f.read() == "text 1\n\n"
+
+    # Resuming only re-sends the failed and later chunks
+    pipeline.api.generate_content_with_file.reset_mock()
+    pipeline.api.generate_content_with_file.side_effect = lambda file_path, **kw: f"text {int(file_path[-7:-4])}"
+    assert pipeline.stage_transcribe(job, ctx) is True
+    sent = sorted(c.kwargs["file_path"][-7:-4] for c in pipeline.api.generate_content_with_file.call_args_list)
+    assert sent == ["002", "003"]
+    with open(ctx["transcript_path"], encoding="utf-8") as f:
+        assert f.read() == "text 1\n\ntext 2\n\ntext 3\n\n"
+
+@pytest.mark.anyio
+async def test_per_account_inflight_limit():
+    config = MagicMock()
+    config.get.side_effect = lambda k, d=None: {"api_max_inflight_per_account": 2}.get(k, d)
+    auth = MagicMock()
+    auth.accounts = [{"email": "a@example.com", "status": "valid", "projectId": "p", "access": "t"}]
+    auth.get_next_account.return_value = auth.accounts[0]
+    auth.get_valid_account = AsyncMock(side_effect=lambda acc: acc)
+    wrapper = GeminiAPIWrapper(config=config, auth_service=auth, usage_tracker=MagicMock())
+
+    in_flight = 0
+    peak = 0
+
+    class SlowResponse(FakeStreamResponse):
+        async def __aenter__(self):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+            return self
+
+    def slow_stream(*args, **kwargs):
+        return SlowResponse(lines=['data: {"response": {"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}}'])
+
+    with patch('httpx.AsyncClient.stream', side_effect=slow_stream):
+        results = await asyncio.gather(*[wrapper.generate_content_async("p") for _ in range(5)])
+
+    assert results == ["ok"] * 5
+    assert peak == 2
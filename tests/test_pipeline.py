@@ -110,4 +110,38 @@ def test_execute_job_download_failure(mock_job_manager_class, mock_os, mock_api,
     success = pipeline.execute_job(job)
     
     assert success is False
-    mock_manager.update_job_status.assert_called_with('123', 'failed')
\ No newline at end of file
+    mock_manager.update_job_status.assert_called_with('123', 'failed')
+
+
+@patch('src.pipeline.download_audio')
+@patch('src.pipeline.AudioProcessor')
+@patch('src.pipeline.GeminiAPIWrapper')
+@patch('src.pipeline.JobManager')
+def test_execute_job_stops_when_asked(mock_job_manager_class, mock_api, mock_audio, mock_down, mock_config, job):
+    """Test that a job stops before its next stage once should_stop is set."""
+    pipeline = ProcessingPipeline(mock_config, job_manager=mock_job_manager_class.return_value)
+    pipeline.run_stage = MagicMock(return_value=True)
+    stop = iter([False, False, True])
+
+    assert pipeline.execute_job(job, should_stop=lambda: next(stop)) is False
+    assert [c[0][0] for c in pipeline.run_stage.call_args_list] == ["download", "audio"]
+
+@patch('src.pipeline.download_audio')
+@patch('src.pipeline.AudioProcessor')
+@patch('src.pipeline.GeminiAPIWrapper')
+@patch('src.pipeline.os')
+@patch('src.pipeline.JobManager')
+def test_stale_resolved_url_is_persisted(mock_job_manager_class, mock_os, mock_api, mock_audio, mock_down, mock_config, job):
+    """Test that a link replaced during download is written back to the job record."""
+    job['resolved_url'] = "https://player.vimeo.com/video/old"
+    mock_os.path.exists.return_value = False
+
+    def download(job, on_progress=None):
+        job.pop('resolved_url')
+        raise Exception("No media link found")
+    mock_down.side_effect = download
+    mock_manager = mock_job_manager_class.return_value
+
+    pipeline = ProcessingPipeline(mock_config, job_manager=mock_manager)
+    assert pipeline.run_stage("download", job, pipeline.new_context()) is False
+    mock_manager.update_job_fields.assert_called_once_with('123', {'resolved_url': None})
@@ -0,0 +1,169 @@
+import os
+import sys
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.pipeline_executor import StagedPipelineExecutor
+from src.sqlite_job_manager import LeaseLostError
+
+@pytest.fixture
+def jobs():
+    return [{"id": str(i), "name": f"Job {i}", "status": "queue"} for i in range(4)]
+
+def test_resolve_concurrency():
+    config = MagicMock()
+    config.get.side_effect = lambda k, d=None: {"performance_profile": "high"}.get(k, d)
+    assert StagedPipelineExecutor.resolve_concurrency(config) == 3
+
+    config.get.side_effect = lambda k, d=None: {"max_concurrent_jobs": 5, "performance_profile": "low"}.get(k, d)
+    assert StagedPipelineExecutor.resolve_concurrency(config) == 5
+
+class FakeStagedPipeline:
+    """Pipeline stub whose stages record when each job enters and leaves them."""
+    STAGES = [("download", "d"), ("audio", "a"), ("transcribe", "t"), ("notes", "n")]
+
+    def __init__(self, fail=None, delays=None):
+        self.fail = fail or set()
+        self.delays = delays or {}
+        self.events = []
+        self.lock = threading.Lock()
+
+    def new_context(self):
+        return {}
+
+    def run_stage(self, stage_name, job, ctx):
+        with self.lock:
+            self.events.append(("start", stage_name, job['id']))
+        time.sleep(self.delays.get(stage_name, 0))
+        with self.lock:
+            self.events.append(("end", stage_name, job['id']))
+        return (stage_name, job['id']) not in self.fail
+
+def test_staged_executor_runs_all_stages_in_order(jobs):
+    pipeline = FakeStagedPipeline()
+    results = StagedPipelineExecutor(pipeline, MagicMock(), max_workers=2).run(jobs)
+
+    assert results == {j['id']: True for j in jobs}
+    for job in jobs:
+        stages = [e[1] for e in pipeline.events if e[0] == "start" and e[2] == job['id']]
+        assert stages == ["download", "audio", "transcribe", "notes"]
+
+def test_staged_executor_overlaps_download_with_notes(jobs):
+    """Test that a job's download does not wait for the previous job's notes."""
+    pipeline = FakeStagedPipeline(delays={"notes": 0.2})
+    StagedPipelineExecutor(pipeline, MagicMock(), max_workers=4).run(jobs[:2])
+
+    events = pipeline.events
+    notes_end_job0 = events.index(("end", "notes", "0"))
+    download_start_job1 = events.index(("start", "download", "1"))
+    assert download_start_job1 < notes_end_job0
+
+def test_staged_executor_isolates_stage_failures(jobs):
+    pipeline = FakeStagedPipeline(fail={("audio", "1")})
+    manager = MagicMock()
+    results = StagedPipelineExecutor(pipeline, manager, max_workers=2).run(jobs)
+
+    assert results["1"] is False
+    assert all(results[j] for j in ["0", "2", "3"])
+    # A failed job never reaches later stages
+    assert ("start", "transcribe", "1") not in pipeline.events
+
+def test_staged_executor_marks_unhandled_exceptions_failed(jobs):
+    """Test that an exception escaping a stage only fails that job."""
+    pipeline = FakeStagedPipeline()
+    original = pipeline.run_stage
+
+    def run_stage(stage_name, job, ctx):
+        if (stage_name, job['id']) == ("download", "0"):
+            raise RuntimeError("boom")
+        return original(stage_name, job, ctx)
+    pipeline.run_stage = run_stage
+    manager = MagicMock()
+
+    results = StagedPipelineExecutor(pipeline, manager, max_workers=2).run(jobs)
+
+    assert results == {"0": False, "1": True, "2": True, "3": True}
+    manager.update_job_status.assert_called_once_with("0", "failed")
+
+def test_staged_executor_respects_admission_limit(jobs):
+    in_flight = set()
+    peak = 0
+    pipeline = FakeStagedPipeline(delays={"download": 0.01, "notes": 0.02})
+    original = pipeline.run_stage
+
+    def tracking_run_stage(stage_name, job, ctx):
+        nonlocal peak
+        with pipeline.lock:
+            in_flight.add(job['id'])
+            peak = max(peak, len(in_flight))
+        result = original(stage_name, job, ctx)
+        if stage_name == "notes":
+            with pipeline.lock:
+                in_flight.discard(job['id'])
+        return result
+
+    pipeline.run_stage = tracking_run_stage
+    StagedPipelineExecutor(pipeline, MagicMock(), max_workers=1).run(jobs)
+    assert peak == 1
+
+def test_staged_executor_from_config_overlaps_on_low_profile(jobs):
+    """Test that the default in-flight cap lets a download run during notes."""
+    config = MagicMock()
+    config.get.side_effect = lambda k, d=None: {"performance_profile": "low"}.get(k, d)
+    pipeline = FakeStagedPipeline(delays={"notes": 0.2})
+    executor = StagedPipelineExecutor.from_config(pipeline, MagicMock(), config)
+    assert executor.max_workers == len(FakeStagedPipeline.STAGES)
+
+    executor.run(jobs[:2])
+
+    events = pipeline.events
+    assert events.index(("start", "download", "1")) < events.index(("end", "notes", "0"))
+
+def test_staged_executor_survives_manager_errors(jobs):
+    """Test that failing history writes do not hang the batch."""
+    pipeline = FakeStagedPipeline(fail={("audio", "1")})
+    pipeline_run_stage = pipeline.run_stage
+
+    def run_stage(stage_name, job, ctx):
+        if (stage_name, job['id']) == ("transcribe", "2"):
+            raise RuntimeError("boom")
+        return pipeline_run_stage(stage_name, job, ctx)
+    pipeline.run_stage = run_stage
+
+    manager = MagicMock()
+    manager.checkpoint.side_effect = OSError("disk full")
+    manager.update_job_status.side_effect = OSError("disk full")
+
+    results = {}
+    runner = threading.Thread(target=lambda: results.update(
+        StagedPipelineExecutor(pipeline, manager, max_workers=2).run(jobs)))
+    runner.start()
+    runner.join(timeout=5)
+
+    assert not runner.is_alive()
+    assert results == {"0": True, "1": False, "2": False, "3": True}
+
+def test_staged_executor_stops_jobs_on_lost_lease(jobs):
+    """Test that jobs whose lease is gone stop without their status being touched."""
+    pipeline = FakeStagedPipeline()
+    original = pipeline.run_stage
+
+    def run_stage(stage_name, job, ctx):
+        if (stage_name, job['id']) == ("audio", "2"):
+            raise LeaseLostError("Job 2 is now leased by other")
+        return original(stage_name, job, ctx)
+    pipeline.run_stage = run_stage
+    manager = MagicMock()
+
+    lost = {"1"}
+    results = StagedPipelineExecutor(pipeline, manager, max_workers=2).run(jobs, should_stop=lambda job: job['id'] in lost)
+
+    assert results == {"0": True, "1": False, "2": False, "3": True}
+    assert ("start", "download", "1") not in pipeline.events
+    assert ("start", "transcribe", "2") not in pipeline.events
+    manager.update_job_status.assert_not_called()
@@ -0,0 +1,53 @@
+import os
+import sys
+import pytest
+from unittest.mock import MagicMock, patch
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.rate_limiter import RateLimiter, TokenBucket
+
+def test_requests_per_minute_bucket():
+    limiter = RateLimiter({"model-a": {"rpm": 3}})
+    assert [limiter.try_acquire("acc", "model-a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    # The fourth request has to wait for a third of the refill period
+    assert limiter.try_acquire("acc", "model-a") == pytest.approx(20.0, abs=0.1)
+    # Buckets are per account and per model
+    assert limiter.try_acquire("other", "model-a") == 0.0
+    assert limiter.try_acquire("acc", "unlimited-model") == 0.0
+
+def test_tokens_per_minute_and_settle():
+    limiter = RateLimiter({"default": {"tpm": 1000}})
+    assert limiter.try_acquire("acc", "m", tokens=800) == 0.0
+    assert limiter.try_acquire("acc", "m", tokens=800) > 0
+    # The request used fewer tokens than estimated; the difference is returned
+    limiter.settle("acc", "m", estimated_tokens=800, actual_tokens=200)
+    assert limiter.try_acquire("acc", "m", tokens=800) == 0.0
+
+def test_oversized_request_only_needs_full_bucket():
+    bucket = TokenBucket(100)
+    assert bucket.wait_time(500, bucket.updated) == 0.0
+
+def test_estimate_tokens():
+    # 6000 bytes is one second of 48 kbit/s audio
+    assert RateLimiter.estimate_tokens(text_chars=400, audio_bytes=6000 * 10) == 100 + 320
+
+@pytest.mark.anyio
+async def test_acquire_waits_for_refill():
+    limiter = RateLimiter({"default": {"rpm": 1}})
+    await limiter.acquire("acc", "m")
+    with patch("src.rate_limiter.asyncio.sleep") as mock_sleep:
+        async def fake_sleep(delay):
+            # Simulate the time passing
+            for bucket in limiter._buckets.values():
+                bucket.updated -= delay
+        mock_sleep.side_effect = fake_sleep
+        await limiter.acquire("acc", "m")
+        assert mock_sleep.call_count == 1
+        assert mock_sleep.call_args[0][0] == pytest.approx(60.0, abs=0.1)
+
+def test_from_config_ignores_invalid_values():
+    config = MagicMock()
+    config.get.return_value = "not-a-dict"
+    assert RateLimiter.from_config(config).limits == {}
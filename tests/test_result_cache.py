@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import pytest
+from unittest.mock import MagicMock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.result_cache import ResultCache
+from src.pipeline import ProcessingPipeline
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"), max_size_mb=1)
+
+def test_get_put_and_stats(cache):
+    key = ResultCache.make_key("hash", "model", "prompt")
+    assert cache.get(key) is None
+    cache.put(key, "transcript")
+    assert cache.get(key) == "transcript"
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+    assert stats["size_bytes"] == len("transcript")
+
+def test_key_depends_on_every_part():
+    assert ResultCache.make_key("a", "b") != ResultCache.make_key("a", "c")
+    # Parts are delimited, so shifting characters between parts changes the key
+    assert ResultCache.make_key("ab", "c") != ResultCache.make_key("a", "bc")
+
+def test_lru_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_size_mb=2.5 / 1024)  # 2.5 KiB
+    value = "x" * 1024
+    cache.put("a" * 64, value)
+    time.sleep(0.01)
+    cache.put("b" * 64, value)
+    time.sleep(0.01)
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a" * 64) == value
+    time.sleep(0.01)
+    cache.put("c" * 64, value)
+
+    assert cache.get("b" * 64) is None
+    assert cache.get("a" * 64) == value
+    assert cache.get("c" * 64) == value
+    assert cache.stats()["entries"] == 2
+
+def test_pipeline_serves_identical_chunks_from_cache(tmp_path):
+    config = MagicMock()
+    config.get.side_effect = lambda k, d=None: {
+        "transcript_cache_dir": str(tmp_path / "cache"),
+    }.get(k, d)
+    api = MagicMock()
+    api.generate_content_with_file.return_value = "hello"
+    api.model_for.return_value = "model-trans"
+    pipeline = ProcessingPipeline(config, api_wrapper=api, job_manager=MagicMock())
+
+    first = tmp_path / "job_a_chunk_001.mp3"
+    second = tmp_path / "job_b_chunk_001.mp3"
+    first.write_bytes(b"same audio")
+    second.write_bytes(b"same audio")
+
+    assert pipeline._transcribe_chunk(str(first)) == "hello"
+    assert pipeline._transcribe_chunk(str(second)) == "hello"
+    api.generate_content_with_file.assert_called_once()
+    assert pipeline.transcript_cache.stats()["hits"] == 1
+    # The key names the model the request actually uses, including its default
+    api.model_for.assert_called_with("transcription")
+
+    # A different model is a different cache entry
+    api.model_for.return_value = "other-model"
+    pipeline._transcribe_chunk(str(second))
+    assert api.generate_content_with_file.call_count == 2
+
+def test_ttl_expiry_and_invalidate(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), ttl_seconds=60)
+    cache.put("k" * 64, "notes")
+    assert cache.get("k" * 64) == "notes"
+
+    # Reads do not extend an entry's lifetime; age is measured from the write
+    path = cache._path("k" * 64)
+    old = time.time() - 120
+    os.utime(path, (time.time(), old))
+    assert cache.get("k" * 64) is None
+    assert not os.path.exists(path)
+
+    cache.put("k" * 64, "notes")
+    cache.invalidate("k" * 64)
+    assert cache.get("k" * 64) is None
+    cache.invalidate("missing")
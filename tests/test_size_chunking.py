@@ -35,3 +35,18 @@ def test_encode_to_base64(setup_teardown):
     
     encoded = AudioProcessor.encode_to_base64(test_file)
     assert encoded == "aGVsbG8=" # base64 for 'hello'
+
+def test_iter_base64_chunks(setup_teardown):
+    test_file = os.path.join(TEST_TEMP_DIR, "test.bin")
+    create_dummy_file(test_file, 0.5)
+
+    blocks = list(AudioProcessor.iter_base64_chunks(test_file, block_size=1000))
+    assert len(blocks) > 1
+    # Block size is rounded down to a multiple of 3, so blocks join without padding
+    joined = b"".join(blocks).decode("utf-8")
+    assert joined == AudioProcessor.encode_to_base64(test_file)
+    assert len(joined) == AudioProcessor.base64_size(os.path.getsize(test_file))
+
+    empty_file = os.path.join(TEST_TEMP_DIR, "empty.bin")
+    open(empty_file, "wb").close()
+    assert list(AudioProcessor.iter_base64_chunks(empty_file)) == []
@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import threading
+import pytest
+from unittest.mock import MagicMock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.job_manager import JobManager, HISTORY_FILE
+from src.sqlite_job_manager import SqliteJobManager, LeaseHeartbeat, LeaseLostError, DB_FILE
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def manager(workdir):
+    m = SqliteJobManager()
+    yield m
+    m.close()
+
+def test_add_and_update_jobs(manager):
+    jobs = manager.add_jobs("Lecture", "(http://a, http://b)")
+    assert [j["name"] for j in manager.history] == ["Lecture 1", "Lecture 2"]
+
+    manager.update_job_status(jobs[0]["id"], "CHUNKED")
+    manager.update_job_status(jobs[0]["id"], "failed")
+    job = manager.get_job(jobs[0]["id"])
+    assert job["status"] == "failed"
+    assert job["last_granular_state"] == "CHUNKED"
+    assert manager.update_job_status("missing", "failed") is False
+
+    assert manager.update_job_fields(jobs[1]["id"], {"resolved_url": "https://player.vimeo.com/video/1"})
+
+    # Changes are persisted immediately
+    reopened = SqliteJobManager()
+    assert reopened.get_job(jobs[0]["id"])["status"] == "failed"
+    assert reopened.get_job(jobs[1]["id"])["resolved_url"] == "https://player.vimeo.com/video/1"
+    reopened.close()
+
+def test_pending_queries_use_indexes(manager):
+    manager.history = [
+        {"id": "1", "status": "queue"},
+        {"id": "2", "status": "no_link_found"},
+        {"id": "3", "status": "TRANSCRIBING_CHUNK_4"},
+        {"id": "4", "status": "completed"},
+        {"id": "5", "status": "TRANSCRIBING_CHUNK"},
+    ]
+    assert [j["id"] for j in manager.get_pending_from_last_150()] == ["1", "3"]
+
+    plan = manager._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT data FROM jobs WHERE status IN ('queue') OR (status >= ? AND status < ?)",
+        ("TRANSCRIBING_CHUNK_", "TRANSCRIBING_CHUNK`"),
+    ).fetchall()
+    assert any("idx_jobs_status" in row[-1] for row in plan)
+
+def test_cancel_and_fail_pending(manager):
+    manager.history = [
+        {"id": "1", "status": "queue"},
+        {"id": "2", "status": "TRANSCRIBING_CHUNK_2"},
+        {"id": "3", "status": "completed"},
+        {"id": "4", "status": "failed"},
+    ]
+    manager.fail_pending()
+    assert [j["status"] for j in manager.history] == ["failed", "failed", "completed", "failed"]
+    assert manager.get_job("2")["last_granular_state"] == "TRANSCRIBING_CHUNK_2"
+
+    manager.cancel_pending()
+    assert [j["status"] for j in manager.history] == ["cancelled", "cancelled", "completed", "cancelled"]
+
+def test_migrates_history_json_once(workdir):
+    json_manager = JobManager()
+    json_manager.history = [{"id": "1", "name": "Old", "status": "completed"}]
+    json_manager.save_history()
+    json_manager.update_job_status("1", "queue")
+
+    manager = SqliteJobManager()
+    assert manager.get_job("1")["status"] == "queue"
+    assert not os.path.exists(HISTORY_FILE)
+    assert os.path.exists(HISTORY_FILE + ".migrated")
+    manager.close()
+
+    # A second start does not import again
+    with open(HISTORY_FILE, 'w') as f:
+        json.dump([{"id": "2", "status": "queue"}], f)
+    manager = SqliteJobManager()
+    assert manager.get_job("2") is None
+    manager.close()
+
+def test_from_config(workdir):
+    config = MagicMock()
+    config.get.side_effect = lambda k, d=None: {"job_store": "sqlite"}.get(k, d)
+    manager = JobManager.from_config(config)
+    assert isinstance(manager, SqliteJobManager)
+    assert os.path.exists(DB_FILE)
+    manager.close()
+
+    config.get.side_effect = lambda k, d=None: d
+    assert type(JobManager.from_config(config)) is JobManager
+
+def test_claims_are_exclusive_across_connections(manager):
+    """Test that concurrent workers (separate connections) never claim the same job."""
+    manager.history = [{"id": str(i), "status": "queue"} for i in range(20)]
+    workers = [SqliteJobManager() for _ in range(4)]
+    claimed = []
+    lock = threading.Lock()
+
+    def work(worker, owner):
+        while True:
+            job = worker.claim_next_job(owner)
+            if job is None:
+                return
+            with lock:
+                claimed.append(job["id"])
+
+    threads = [threading.Thread(target=work, args=(w, f"w{i}")) for i, w in enumerate(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for w in workers:
+        w.close()
+
+    assert sorted(claimed, key=int) == [str(i) for i in range(20)]
+
+def test_expired_lease_is_reclaimed(manager):
+    manager.history = [
+        {"id": "1", "status": "failed"},
+        {"id": "2", "status": "TRANSCRIBING_CHUNK_3"},
+    ]
+    # Failed jobs are not claimed automatically
+    job = manager.claim_next_job("crashed", lease_seconds=0.05)
+    assert job["id"] == "2"
+    assert manager.claim_next_job("other") is None
+    assert [j["id"] for j in manager.get_pending_from_last_150()] == ["1"]
+
+    time.sleep(0.1)
+    job = manager.claim_next_job("other")
+    # The new worker resumes from the granular state
+    assert job["id"] == "2"
+    assert job["status"] == "TRANSCRIBING_CHUNK_3"
+    assert manager.renew_lease("2", "crashed") is False
+    assert manager.renew_lease("2", "other") is True
+
+def test_heartbeat_keeps_lease_alive(manager):
+    manager.history = [{"id": "1", "status": "queue"}]
+    job = manager.claim_next_job("w1", lease_seconds=0.1)
+
+    with LeaseHeartbeat(manager, job["id"], "w1", lease_seconds=0.1, interval=0.02) as heartbeat:
+        time.sleep(0.25)
+        assert manager.claim_next_job("w2") is None
+    assert heartbeat.lost is False
+
+    # Leaving the heartbeat releases the lease
+    assert manager.claim_next_job("w2")["id"] == "1"
+
+def test_lost_lease_blocks_writes(manager):
+    manager.history = [{"id": "1", "status": "queue"}]
+    manager.claim_next_job("crashed", lease_seconds=0.05)
+    time.sleep(0.1)
+
+    other = SqliteJobManager()
+    assert other.claim_next_job("other")["id"] == "1"
+    other.update_job_status("1", "DOWNLOADED")
+
+    # The old owner can no longer overwrite the new owner's progress
+    with pytest.raises(LeaseLostError):
+        manager.update_job_status("1", "failed")
+    with pytest.raises(LeaseLostError):
+        manager.update_job_fields("1", {"resolved_url": "stale"})
+    job = other.get_job("1")
+    assert job["status"] == "DOWNLOADED"
+    assert "resolved_url" not in job
+    other.close()
+
+def test_claim_job_skips_jobs_held_by_workers(manager):
+    manager.history = [{"id": "1", "status": "queue"}, {"id": "2", "status": "failed"}]
+    worker = SqliteJobManager()
+    worker.claim_next_job("worker")
+
+    assert manager.claim_job("1", "batch") is None
+    assert manager.claim_job("2", "batch")["id"] == "2"
+    assert worker.claim_next_job("worker2") is None
+    worker.close()
+
+def test_cancel_pending_skips_leased_jobs(manager):
+    manager.history = [{"id": "1", "status": "queue"}, {"id": "2", "status": "queue"}]
+    worker = SqliteJobManager()
+    worker.claim_next_job("worker")
+
+    manager.cancel_pending()
+
+    assert manager.get_job("1")["status"] == "queue"
+    assert manager.get_job("2")["status"] == "cancelled"
+    worker.close()
+
+def test_fail_pending_skips_leased_jobs(manager):
+    manager.history = [{"id": "1", "status": "CHUNKED"}, {"id": "2", "status": "CHUNKED"}]
+    worker = SqliteJobManager()
+    worker.claim_next_job("worker")
+
+    manager.fail_pending()
+
+    assert manager.get_job("1")["status"] == "CHUNKED"
+    job = manager.get_job("2")
+    assert job["status"] == "failed"
+    assert job["last_granular_state"] == "CHUNKED"
+    worker.close()
@@ -1,23 +1,29 @@
 import os
 import json
 import sys
+import time
 import pytest
 
 # Add project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.usage_tracker import UsageTracker
+from src.usage_tracker import UsageTracker, get_shared_tracker
 
 TEST_USAGE_FILE = "test_usage_stats.json"
+TEST_METRICS_FILE = "test_usage_stats.metrics.json"
+
+def remove_usage_files():
+    for path in (TEST_USAGE_FILE, TEST_USAGE_FILE + ".lock", TEST_METRICS_FILE, TEST_METRICS_FILE + ".lock"):
+        if os.path.exists(path):
+            os.remove(path)
 
 @pytest.fixture
 def usage_tracker():
-    if os.path.exists(TEST_USAGE_FILE):
-        os.remove(TEST_USAGE_FILE)
+    remove_usage_files()
     tracker = UsageTracker(usage_file=TEST_USAGE_FILE)
     yield tracker
-    if os.path.exists(TEST_USAGE_FILE):
-        os.remove(TEST_USAGE_FILE)
+    tracker.flush()
+    remove_usage_files()
 
 def test_record_usage(usage_tracker):
     usage_tracker.record_usage("user@example.com", "gemini-2.0-flash")
@@ -33,7 +39,70 @@ def test_record_usage(usage_tracker):
 
 def test_persistence(usage_tracker):
     usage_tracker.record_usage("user@example.com", "gemini-2.0-flash")
+    usage_tracker.flush()
     
     # New instance loading from same file
     new_tracker = UsageTracker(usage_file=TEST_USAGE_FILE)
     assert new_tracker.get_usage_report()["user@example.com"]["gemini-2.0-flash"] == 1
+
+def test_increments_are_batched(usage_tracker):
+    for _ in range(5):
+        usage_tracker.record_usage("user@example.com", "gemini-2.0-flash")
+    # Nothing is written until the debounce timer fires or flush() is called
+    assert not os.path.exists(TEST_USAGE_FILE)
+
+    usage_tracker.flush()
+    with open(TEST_USAGE_FILE) as f:
+        assert json.load(f) == {"user@example.com": {"gemini-2.0-flash": 5}}
+
+def test_timer_flushes_pending_increments(usage_tracker):
+    usage_tracker.flush_interval = 0.05
+    usage_tracker.record_usage("user@example.com", "gemini-2.0-flash")
+    time.sleep(0.2)
+    with open(TEST_USAGE_FILE) as f:
+        assert json.load(f)["user@example.com"]["gemini-2.0-flash"] == 1
+
+def test_instances_merge_instead_of_overwriting(usage_tracker):
+    other = UsageTracker(usage_file=TEST_USAGE_FILE)
+    usage_tracker.record_usage("user@example.com", "gemini-2.0-flash")
+    other.record_usage("user@example.com", "gemini-2.0-flash")
+    other.record_usage("other@example.com", "gemini-2.0-flash")
+    usage_tracker.flush()
+    other.flush()
+
+    with open(TEST_USAGE_FILE) as f:
+        data = json.load(f)
+    assert data["user@example.com"]["gemini-2.0-flash"] == 2
+    assert data["other@example.com"]["gemini-2.0-flash"] == 1
+    # Reports include counts flushed by other trackers
+    assert usage_tracker.get_usage_report()["other@example.com"]["gemini-2.0-flash"] == 1
+
+def test_shared_tracker_is_reused():
+    assert get_shared_tracker(TEST_USAGE_FILE) is get_shared_tracker(TEST_USAGE_FILE)
+
+def test_metrics_summary(usage_tracker):
+    for duration in [1.0, 2.0, 3.0, 4.0, 10.0]:
+        usage_tracker.record_call(
+            "user@example.com", "gemini-2.5-flash", duration, ttfb=0.5, request_bytes=1000,
+            usage_metadata={
+                "promptTokenCount": 3300,
+                "candidatesTokenCount": 200,
+                "promptTokensDetails": [{"modality": "AUDIO", "tokenCount": 3200}, {"modality": "TEXT", "tokenCount": 100}],
+            },
+        )
+    usage_tracker.record_call("other@example.com", "gemini-2.5-flash", 1.0)
+    usage_tracker.flush()
+
+    # A fresh tracker reads the flushed metrics
+    summary = UsageTracker(usage_file=TEST_USAGE_FILE).get_metrics_summary()
+    stats = summary["gemini-2.5-flash"]["user@example.com"]
+    assert stats["calls"] == 5
+    assert stats["output_tokens"] == 1000
+    assert stats["audio_seconds"] == 500.0
+    assert stats["bytes_sent"] == 5000
+    assert stats["latency_p50"] == 3.0
+    assert stats["latency_p95"] == 10.0
+    assert stats["ttfb_p50"] == 0.5
+    assert stats["tokens_per_second"] == 1000 / 20.0
+
+    assert summary["gemini-2.5-flash"]["other@example.com"]["ttfb_p50"] is None
@@ -9,16 +9,19 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.gemini_api_wrapper import GeminiAPIWrapper
+from src.audio_processor import AudioProcessor
+from conftest import FakeStreamResponse
 
 @pytest.fixture
 def mock_auth_service():
     service = MagicMock()
-    service.get_next_account.return_value = {
+    service.accounts = [{
         "email": "test@example.com",
         "projectId": "test-proj",
         "access": "test-access",
         "status": "valid"
-    }
+    }]
+    service.get_next_account.return_value = service.accounts[0]
     service.get_valid_account = AsyncMock(side_effect=lambda x: x)
     return service
 
@@ -33,14 +36,12 @@ def wrapper(mock_auth_service, mock_usage_tracker):
 @pytest.mark.anyio
 async def test_generate_content_async_success(wrapper, mock_auth_service, mock_usage_tracker):
     # Mock httpx response
-    mock_resp = MagicMock()
-    mock_resp.status_code = 200
-    mock_resp.iter_lines.return_value = [
-        b'data: {"response": {"candidates": [{"content": {"parts": [{"text": "Hello"}]}}]}}',
-        b'data: {"response": {"candidates": [{"content": {"parts": [{"text": " World"}]}}]}}'
-    ]
+    mock_resp = FakeStreamResponse(lines=[
+        'data: {"response": {"candidates": [{"content": {"parts": [{"text": "Hello"}]}}]}}',
+        'data: {"response": {"candidates": [{"content": {"parts": [{"text": " World"}]}}]}}'
+    ])
     
-    with patch('httpx.AsyncClient.post', return_value=mock_resp):
+    with patch('httpx.AsyncClient.stream', return_value=mock_resp):
         result = await wrapper.generate_content_async("Test prompt")
         
         assert result == "Hello World"
@@ -50,6 +51,78 @@ async def test_generate_content_async_success(wrapper, mock_auth_service, mock_u
         # Let's match the actual value observed in the failure.
         mock_usage_tracker.record_usage.assert_called_once_with("test@example.com", "gemini-3-pro-preview")
 
+@pytest.mark.anyio
+async def test_usage_metadata_is_recorded(wrapper, mock_usage_tracker):
+    lines = [
+        'data: {"response": {"candidates": [{"content": {"parts": [{"text": "Hi"}]}}], "usageMetadata": {"promptTokenCount": 10}}}',
+        'data: {"response": {"candidates": [{"content": {"parts": [{"text": "!"}]}}], "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": 2}}}',
+    ]
+    with patch('httpx.AsyncClient.stream', return_value=FakeStreamResponse(lines=lines)):
+        assert await wrapper.generate_content_async("Test prompt") == "Hi!"
+
+    args, kwargs = mock_usage_tracker.record_call.call_args
+    assert args[0] == "test@example.com"
+    assert kwargs["usage_metadata"] == {"promptTokenCount": 10, "candidatesTokenCount": 2}
+    assert kwargs["request_bytes"] > len("Test prompt")
+    assert 0 <= kwargs["ttfb"] <= args[2]
+
+@pytest.mark.anyio
+async def test_stream_delivers_text_incrementally(wrapper):
+    received = []
+    lines = [
+        ': keep-alive',
+        'data: {"response": {"candidates": [{"content": {"parts": [{"text": "Hel"}]}}]}}',
+        '',
+        'data: {"response": {"candidates": [{"content": {"parts": [{"text": "lo"}, {"text": "!"}]}}]}}',
+        'data: {"response": {"usageMetadata": {}}}',
+    ]
+
+    with patch('httpx.AsyncClient.stream', return_value=FakeStreamResponse(lines=lines)):
+        result = await wrapper.generate_content_async("Test prompt", on_text=received.append)
+
+    assert result == "Hello!"
+    assert received == ["Hel", "lo", "!"]
+
+@pytest.mark.anyio
+async def test_stream_discards_partial_text_on_retry(wrapper):
+    received = []
+    wrapper.backoff_manager.max_delay = 0
+    responses = [
+        FakeStreamResponse(lines=['data: {"response": {"candidates": [{"content": {"parts": [{"text": "  "}]}}]}}']),
+        FakeStreamResponse(lines=['data: {"response": {"candidates": [{"content": {"parts": [{"text": "Done"}]}}]}}']),
+    ]
+
+    with patch('httpx.AsyncClient.stream', side_effect=responses):
+        result = await wrapper.generate_content_async("Test prompt", on_text=received.append)
+
+    assert result == "Done"
+    # None tells the consumer to drop what it received from the empty attempt
+    assert received == ["  ", None, "Done"]
+
+@pytest.mark.anyio
+async def test_audio_file_is_streamed_into_request_body(wrapper, tmp_path):
+    audio = tmp_path / "chunk.mp3"
+    audio.write_bytes(os.urandom(300_001))
+    sent = []
+
+    async def consume(body):
+        return b"".join([block async for block in body])
+
+    def fake_stream(method, url, headers=None, content=None, json=None):
+        sent.append((headers, content))
+        return FakeStreamResponse(lines=['data: {"response": {"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}}'])
+
+    with patch('httpx.AsyncClient.stream', side_effect=fake_stream):
+        assert await wrapper.generate_content_async("Transcribe", model_type="transcription", audio_path=str(audio)) == "ok"
+
+    headers, content = sent[0]
+    raw = await consume(content)
+    assert int(headers["Content-Length"]) == len(raw)
+    body = json.loads(raw)
+    parts = body["request"]["contents"][0]["parts"]
+    assert parts[0]["inline_data"]["data"] == AudioProcessor.encode_to_base64(str(audio))
+    assert parts[1] == {"text": "Transcribe"}
+
 def test_sync_wrappers(wrapper):
     with patch.object(wrapper, 'generate_content_async', new_callable=AsyncMock) as mock_async:
         mock_async.return_value = "Mocked Response"
@@ -57,3 +130,63 @@ def test_sync_wrappers(wrapper):
         res = wrapper.generate_content("Prompt", system_instruction="System")
         assert res == "Mocked Response"
         mock_async.assert_called_once()
+
+@pytest.mark.anyio
+async def test_client_is_pooled_and_shared(wrapper, mock_auth_service):
+    client = wrapper.get_client()
+    assert wrapper.get_client() is client
+    # The auth service borrows the same pool for token refreshes
+    assert mock_auth_service.client_provider() is client
+
+    await wrapper.aclose()
+    assert client.is_closed
+    assert wrapper.get_client() is not client
+    await wrapper.aclose()
+
+def test_sync_wrappers_reuse_pool_across_calls(wrapper):
+    clients = []
+    loops = []
+
+    async def fake_generate(*args, **kwargs):
+        clients.append(wrapper.get_client())
+        loops.append(asyncio.get_running_loop())
+        return "ok"
+
+    with patch.object(wrapper, 'generate_content_async', side_effect=fake_generate):
+        assert wrapper.generate_content("Prompt") == "ok"
+        assert wrapper.generate_content("Prompt") == "ok"
+
+    # Both calls ran on the same persistent loop and shared one pool
+    assert loops[0] is loops[1]
+    assert clients[0] is clients[1]
+    assert not clients[0].is_closed
+
+    wrapper.close()
+    assert clients[0].is_closed
+
+@pytest.mark.anyio
+async def test_missing_audio_file_fails_immediately(wrapper, tmp_path):
+    with patch('httpx.AsyncClient.stream') as mock_stream:
+        with pytest.raises(FileNotFoundError):
+            await wrapper.generate_content_async("Transcribe", model_type="transcription", audio_path=str(tmp_path / "missing.mp3"))
+    mock_stream.assert_not_called()
+
+@pytest.mark.anyio
+async def test_backoff_sleep_releases_account_slot(wrapper, tmp_path):
+    wrapper.error_file = str(tmp_path / "error.json")
+    responses = [
+        FakeStreamResponse(status_code=503, text='{"error": {"code": 503}}'),
+        FakeStreamResponse(lines=['data: {"response": {"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}}']),
+    ]
+    seen = []
+
+    async def sleep(*args, **kwargs):
+        slot = wrapper._get_account_slot("test@example.com")
+        seen.append((slot._value, wrapper.scheduler.snapshot()["test@example.com"]["inflight"]))
+
+    with patch('httpx.AsyncClient.stream', side_effect=responses), \
+         patch.object(wrapper.backoff_manager, 'async_sleep', side_effect=sleep):
+        assert await wrapper.generate_content_async("Test prompt") == "ok"
+
+    # Every slot is free and nothing counts as in flight while backing off
+    assert seen == [(wrapper.max_inflight_per_account, 0)]
@@ -0,0 +1,113 @@
+import os
+import sys
+import pytest
+from unittest.mock import MagicMock, patch
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.ytdlp_engine import YtDlpEngine
+
+def make_args(name, url, referer=None):
+    args = ["-N", "16", "--no-playlist", "-o", f"{name}.%(ext)s", "-x", "--audio-format", "mp3"]
+    if referer:
+        args += ["--referer", referer]
+    return args + [url]
+
+@pytest.fixture
+def mock_ydl_class():
+    with patch('src.ytdlp_engine.YoutubeDL') as mock:
+        def create(opts):
+            ydl = MagicMock()
+            ydl.params = {"outtmpl": dict(opts["outtmpl"]), "http_headers": dict(opts.get("http_headers") or {})}
+            ydl.opts = opts
+            ydl.download.return_value = 0
+            return ydl
+        mock.side_effect = create
+        yield mock
+
+def test_instance_is_reused_per_profile(mock_ydl_class):
+    engine = YtDlpEngine()
+    engine.run(make_args("One", "https://vimeo.com/1", referer="https://a.com/1"), "vimeo")
+    engine.run(make_args("Two", "https://vimeo.com/2", referer="https://a.com/2"), "vimeo")
+
+    mock_ydl_class.assert_called_once()
+    opts = mock_ydl_class.call_args[0][0]
+    assert opts["concurrent_fragment_downloads"] == 16
+    assert opts["quiet"] is True
+
+    # Per-job options are applied to the reused instance
+    instance = engine._idle[next(iter(engine._idle))][0].ydl
+    assert instance.params["outtmpl"]["default"] == "Two.%(ext)s"
+    assert instance.params["http_headers"]["Referer"] == "https://a.com/2"
+    assert instance.download.call_args[0][0] == ["https://vimeo.com/2"]
+
+    # A different profile or option set gets its own instance
+    engine.run(make_args("Three", "https://youtube.com/watch?v=3"), "youtube")
+    assert mock_ydl_class.call_count == 2
+
+def test_failed_instance_is_discarded(mock_ydl_class):
+    engine = YtDlpEngine()
+    first = []
+
+    def create(opts):
+        ydl = MagicMock()
+        ydl.params = {"outtmpl": {}, "http_headers": {}}
+        ydl.download.side_effect = Exception("ERROR: HTTP Error 403") if not first else None
+        ydl.download.return_value = 0
+        first.append(ydl)
+        return ydl
+    mock_ydl_class.side_effect = create
+
+    with pytest.raises(Exception, match="HTTP Error 403"):
+        engine.run(make_args("One", "https://vimeo.com/1"), "vimeo")
+    first[0].close.assert_called_once()
+
+    engine.run(make_args("One", "https://vimeo.com/1"), "vimeo")
+    assert mock_ydl_class.call_count == 2
+
+def test_progress_is_forwarded(mock_ydl_class):
+    engine = YtDlpEngine()
+    updates = []
+
+    def download(urls):
+        hook = mock_ydl_class.call_args[0][0]["progress_hooks"][0]
+        hook({"status": "downloading", "downloaded_bytes": 50, "total_bytes_estimate": 100, "speed": 10.0, "eta": 5})
+        return 0
+
+    def create(opts):
+        ydl = MagicMock()
+        ydl.params = {"outtmpl": {}, "http_headers": {}}
+        ydl.download.side_effect = download
+        return ydl
+    mock_ydl_class.side_effect = create
+
+    engine.run(make_args("One", "https://vimeo.com/1"), "vimeo", on_progress=updates.append)
+
+    assert updates[0]["status"] == "downloading"
+    assert updates[0]["downloaded_bytes"] == 50
+    assert updates[0]["total_bytes"] == 100
+
+def test_cookie_change_replaces_pooled_instance(mock_ydl_class, tmp_path):
+    cookie_file = tmp_path / "cookies.txt"
+    cookie_file.write_text("# Netscape HTTP Cookie File\n")
+    args = ["--cookies", str(cookie_file)] + make_args("One", "https://vimeo.com/1")
+    engine = YtDlpEngine()
+
+    engine.run(args, "vimeo")
+    first = engine._idle[next(iter(engine._idle))][0].ydl
+    # Cookies are saved after a successful download, as the CLI does
+    first.save_cookies.assert_called_once()
+
+    engine.run(args, "vimeo")
+    assert mock_ydl_class.call_count == 1
+
+    # Refreshed cookies on disk get a fresh instance
+    cookie_file.write_text("# Netscape HTTP Cookie File\n# refreshed\n")
+    os.utime(cookie_file, (1, 1))
+    engine.run(args, "vimeo")
+    assert mock_ydl_class.call_count == 2
+    first.close.assert_called_once()
+
+    engine.close()
+    assert engine._idle == {}
@@ -4,6 +4,7 @@ import sys
 import shutil
 import logging
 import json
+from contextlib import ExitStack
 from src.job_manager import JobManager
 
 # Configure logging to show INFO level and above on terminal
@@ -20,6 +21,10 @@ from src.rclone_config_manager import RcloneConfigManager
 from src.rclone_service import RcloneService
 from src.config_manager import ConfigManager
 from src.pipeline import ProcessingPipeline
+from src.pipeline_executor import StagedPipelineExecutor
+from src.downloader import prefetch_media_urls
+from src.ytdlp_engine import get_shared_engine
+from src.sqlite_job_manager import SqliteJobManager, LeaseHeartbeat, LeaseLostError
 from src.cleanup_service import FileCleanupService
 from src.gemini_auth_service import GeminiAuthService
 from src.gemini_creds_helper import main as run_creds_helper
@@ -229,7 +234,7 @@ def cleanup_stranded_chunks():
     print("5. Back")
     
     choice = input("Enter your choice (1-5): ").strip()
-    manager = JobManager()
+    manager = JobManager.from_config(ConfigManager())
     
     if choice == '1':
         print("\n🧹 Cleaning up ALL intermediate files (excluding uploads)...")
@@ -262,29 +267,87 @@ def run_processing_pipeline(manager, jobs_to_run=None):
     pipeline = ProcessingPipeline(config, job_manager=manager)
     
     pending_jobs = jobs_to_run if jobs_to_run is not None else manager.get_pending_from_last_150()
-    if not pending_jobs:
-        print("No pending jobs to process.")
-        return
+    should_stop = None
+    with ExitStack() as leases:
+        if isinstance(manager, SqliteJobManager):
+            # Lease the batch like a worker would, so no --worker process runs the same jobs
+            owner = SqliteJobManager.default_owner()
+            claimed = []
+            heartbeats = {}
+            for job in pending_jobs:
+                leased = manager.claim_job(job['id'], owner)
+                if leased is None:
+                    print(f"⏩ Skipping '{job['name']}': it is being processed by a worker.")
+                    continue
+                heartbeats[job['id']] = leases.enter_context(LeaseHeartbeat(manager, job['id'], owner))
+                claimed.append(leased)
+            pending_jobs = claimed
+            # Stop a job once another worker has taken its lease over
+            should_stop = lambda job: heartbeats[job['id']].lost
 
-    print(f"\n🚀 Starting pipeline for {len(pending_jobs)} jobs...")
-    
-    for job in pending_jobs:
-        print(f"\n--- Processing Job: {job['name']} ---")
-        success = pipeline.execute_job(job)
-        
-        # Save progress after each job
-        manager.save_history()
-        
-        if not success:
-            print(f"⚠️ Job '{job['name']}' failed. Failing all remaining jobs in batch...")
-            # Only fail the remaining jobs in THIS specific batch
-            remaining = pending_jobs[pending_jobs.index(job)+1:]
-            for r_job in remaining:
-                manager.update_job_status(r_job['id'], 'failed')
-            break
+        if not pending_jobs:
+            print("No pending jobs to process.")
+            return
+
+        # Resolve scraper pages for the whole batch now, so downloads never wait on a browser
+        prefetch_media_urls(pending_jobs, manager, config)
+
+        executor = StagedPipelineExecutor.from_config(pipeline, manager, config)
+        print(f"\n🚀 Starting pipeline for {len(pending_jobs)} jobs ({executor.max_workers} concurrent)...")
+
+        try:
+            results = executor.run(pending_jobs, should_stop=should_stop)
+        finally:
+            pipeline.api.close()
+            # Saves cookies and releases the pooled yt-dlp instances
+            get_shared_engine().close()
     
+    failed = [job_id for job_id, success in results.items() if not success]
+    if failed:
+        print(f"\n⚠️ {len(failed)}/{len(results)} jobs failed. Use 'Process Queued Jobs' to retry them.")
     print("\n🏁 Pipeline execution finished.")
 
+def run_worker():
+    """
+    Pulls jobs one at a time from the shared SQLite queue until none are left.
+    Several workers may run at once; each job is leased to a single worker.
+    """
+    config = ConfigManager()
+    manager = JobManager.from_config(config)
+    if not isinstance(manager, SqliteJobManager):
+        print("❌ Worker mode needs a shared job store. Set \"job_store\": \"sqlite\" in config.json.")
+        return
+
+    owner = SqliteJobManager.default_owner()
+    pipeline = ProcessingPipeline(config, job_manager=manager)
+    print(f"👷 Worker {owner} started.")
+    processed = 0
+    try:
+        while True:
+            job = manager.claim_next_job(owner)
+            if job is None:
+                break
+            print(f"\n--- Processing Job: {job['name']} ---")
+            with LeaseHeartbeat(manager, job['id'], owner) as heartbeat:
+                try:
+                    success = pipeline.execute_job(job, should_stop=lambda: heartbeat.lost)
+                except LeaseLostError as e:
+                    # Another worker owns the job now; leave its status to them
+                    print(f"⚠️ Stopped job '{job['name']}': {e}")
+                    success = False
+                except Exception as e:
+                    print(f"❌ Unhandled exception for job '{job['name']}': {e}")
+                    manager.update_job_status(job['id'], 'failed')
+                    success = False
+            if not success:
+                print(f"⚠️ Job '{job['name']}' failed. Continuing with remaining jobs...")
+            processed += 1
+    finally:
+        pipeline.api.close()
+        get_shared_engine().close()
+        manager.close()
+    print(f"\n🏁 Worker {owner} finished after {processed} jobs. No more claimable jobs.")
+
 def process_old_notes():
     config = ConfigManager()
     if not config.get("notion_integration_enabled", False):
@@ -337,7 +400,7 @@ def process_old_notes():
         print(f"❌ Failed to initialize Notion service: {e}")
 
 def process_local_media(names_input: str = None):
-    manager = JobManager()
+    manager = JobManager.from_config(ConfigManager())
     local_manager = LocalMediaManager()
     
     # Process names if provided
@@ -367,14 +430,13 @@ def process_local_media(names_input: str = None):
         }
         new_jobs.append(new_job)
     
-    manager.history.extend(new_jobs)
-    manager.save_history()
+    manager.add_job_records(new_jobs)
     
     # Run pipeline ONLY for these local jobs
     run_processing_pipeline(manager, jobs_to_run=new_jobs)
 
 def start_note_generation():
-    manager = JobManager()
+    manager = JobManager.from_config(ConfigManager())
     
     while True:
         print("\n--- Note Generation Sub-Menu ---")
@@ -530,12 +592,15 @@ from src.local_media_manager import LocalMediaManager
 def main():
     parser = argparse.ArgumentParser(description="Zaknotes: Automated Class Note Generation")
     parser.add_argument("--local", nargs="*", help="Process local media files in uploads/ folder. Can take optional class names.")
+    parser.add_argument("--worker", action="store_true", help="Process queued jobs from the shared SQLite job store; run several for parallel workers.")
     # Future flag for cleanup (Phase 4)
     # parser.add_argument("--cleanup-uploads", action="store_true", help="Purge the uploads/ folder.")
     
     args, unknown = parser.parse_known_args()
     
-    if args.local is not None:
+    if args.worker:
+        run_worker()
+    elif args.local is not None:
         names_input = "|".join(args.local) if args.local else None
         process_local_media(names_input)
     else: